@@ -0,0 +1,353 @@
+"""
+Offline throughput benchmarks for the mapping engines.
+
+Runs the real XTouchMappingEngine and EOSMappingEngine, wired as in main.py, against in-memory
+stand-ins for the mido ports and the UDP client, and replays synthetic workloads:
+- faders: the 8 faders touched and swept together, as when riding all faders at once.
+- jog: the jog wheel spinning back and forth.
+- page_change: fader page keys, followed by the names, levels and page text EOS sends back.
+- cue_fade: EOS fading 10 fader levels during a cue, with the active cue text updates.
+- fader_echo: a fader ridden while EOS reports the levels back late, then moved on the console
+  while the motor reports its travel. Echoes move no motor and send nothing to EOS.
+
+For each workload it reports events/s, per-event CPU time, the memory still allocated after the
+run per event and the peak traced memory, and compares them with benchmarks/baselines.json.
+The messages sent and echoes suppressed do not depend on the machine: the script fails when
+they differ from the baselines. Throughput does, and varies from run to run on a loaded machine,
+so a drop only fails the script with --check. Save new baselines before comparing on another machine.
+
+Usage (from the repository root):
+    python benchmarks/bench_mapping.py                 # run and compare with the baselines
+    python benchmarks/bench_mapping.py --check         # also fail when a workload got slower
+    python benchmarks/bench_mapping.py --save          # run and save the results as new baselines
+    python benchmarks/bench_mapping.py -w faders -n 5  # one workload, best of 5 runs
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from unittest.mock import patch
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(REPO_ROOT, "src"))
+os.chdir(REPO_ROOT)  # the mapping files are loaded relative to the repository root
+
+import mido
+from communication.midi_comm import MIDIClient
+from communication.osc_comm import OSCClient
+from mapping.eos_mapping_engine import EOSMappingEngine
+from mapping.xtouch_mapping_engine import XTouchMappingEngine
+from state.state_manager import StateManager
+from pythonosc.osc_message_builder import OscMessageBuilder
+from pythonosc.osc_message import OscMessage
+
+BASELINES_FILE = os.path.join(REPO_ROOT, "benchmarks", "baselines.json")
+DEVICE_NAME = "X-Touch"
+
+
+class FakeOutputPort:
+    """Stand-in for a mido output port, counting the messages and bytes sent."""
+
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+
+    def send(self, message):
+        self.messages += 1
+        self.bytes += len(message.bytes())
+
+    def close(self):
+        pass
+
+
+class FakeInputPort:
+    """Stand-in for a mido input port, the workloads call the callback directly."""
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def close(self):
+        pass
+
+
+class FakeUDPClient:
+    """Stand-in for pythonosc's SimpleUDPClient, counting the datagrams sent."""
+
+    def __init__(self):
+        self.datagrams = 0
+        self.bytes = 0
+
+    def send(self, content):
+        self.datagrams += 1
+        self.bytes += len(content.dgram)
+
+    def send_message(self, address, value):
+        builder = OscMessageBuilder(address=address)
+        if value is not None:
+            builder.add_arg(value)
+        self.send(builder.build())
+
+
+class Rig:
+    """The engines wired as in main.py, with in-memory MIDI ports and UDP client."""
+
+    def __init__(self):
+        logger = logging.getLogger("X-EOS-bench")
+        logger.setLevel(logging.ERROR)
+        logger.propagate = False
+        logger.addHandler(logging.NullHandler())
+
+        self.state_manager = StateManager(logger)
+        self.osc = OSCClient(logger)
+        self.udp = self.osc._client = FakeUDPClient()
+        self.xtouch = XTouchMappingEngine(logger, self.state_manager, schedule=lambda delay, callback: None)
+        self.output_port = FakeOutputPort()
+        with patch("mido.get_input_names", return_value=[DEVICE_NAME]), \
+             patch("mido.get_output_names", return_value=[DEVICE_NAME]), \
+             patch("mido.open_input", side_effect=lambda name, callback: FakeInputPort(callback)), \
+             patch("mido.open_output", return_value=self.output_port):
+            self.midi = MIDIClient(logger, "config/settings.json", self.xtouch.handle_midi_message)
+        self.xtouch._midi_comm = self.midi
+        self.eos = EOSMappingEngine(logger, osc_client=self.osc, state_manager=self.state_manager,
+                                    schedule=lambda delay, callback: None)
+        self.eos.subscribe_to(self.state_manager)
+        self.eos.compile_key_actions(self.xtouch.commands.commands())
+        self.state_manager.eos = self.eos
+        self.state_manager.xtouch = self.xtouch
+        self.xtouch.init_xtouch()
+
+    def midi_in(self, message):
+        self.midi.input_port.callback(message)
+
+    def osc_in(self, dgram):
+        message = OscMessage(dgram)
+        self.eos.eos_osc_handler(message.address, *message.params)
+
+    def flush_surface(self):
+        # The surface flush and the wheel output tick
+        self.xtouch.surface.flush()
+        self.eos.wheels.flush()
+
+
+def _osc(address, value):
+    builder = OscMessageBuilder(address=address)
+    builder.add_arg(value)
+    return builder.build().dgram
+
+
+def _midi(hex_string):
+    return mido.Message.from_hex(hex_string)
+
+
+def workload_faders(steps=256):
+    """8 faders touched, swept from bottom to top together, then released."""
+    events = []
+    for fader in range(8):
+        events.append(("midi", _midi(f"90 {0x68 + fader:02X} 7F")))
+    for step in range(steps):
+        value = step * 16383 // (steps - 1)
+        for fader in range(8):
+            events.append(("midi", mido.Message("pitchwheel", channel=fader, pitch=value - 8192)))
+    for fader in range(8):
+        events.append(("midi", _midi(f"90 {0x68 + fader:02X} 00")))
+    return events
+
+
+def workload_jog(detents=2000, per_tick=20):
+    """The jog wheel spun clockwise then counter-clockwise, with an output tick every `per_tick` detents."""
+    events = []
+    for i in range(detents):
+        events.append(("midi", _midi("B0 3C 01" if i < detents // 2 else "B0 3C 41")))
+        if i % per_tick == per_tick - 1:
+            events.append(("flush", None))
+    return events
+
+
+def workload_page_change(changes=64):
+    """Page keys pressed and released, each followed by the page, names and levels EOS sends back."""
+    events = []
+    for change in range(changes):
+        page = change % 8 + 1
+        events.append(("midi", _midi(f"90 {page - 1:02X} 7F")))
+        events.append(("midi", _midi(f"90 {page - 1:02X} 00")))
+        events.append(("osc", _osc("/eos/out/fader/1", str(page))))
+        for fader in range(1, 11):
+            events.append(("osc", _osc(f"/eos/out/fader/1/{fader}/name", f"S {page * 10 + fader} Sub {fader}")))
+            events.append(("osc", _osc(f"/eos/fader/1/{fader}", (page * fader % 10) / 10)))
+        events.append(("flush", None))
+    return events
+
+
+def workload_cue_fade(steps=200):
+    """EOS fading 10 faders during a cue, with the active cue text every 10 steps."""
+    events = []
+    for step in range(steps):
+        for fader in range(1, 11):
+            events.append(("osc", _osc(f"/eos/fader/1/{fader}", step / (steps - 1))))
+        if step % 10 == 0:
+            events.append(("osc", _osc("/eos/out/active/cue/text", f"1/{step // 10} Fade {(steps - step) / 10:.1f} 50%")))
+            events.append(("flush", None))
+    return events
+
+
+def workload_fader_echo(steps=128, travel=16):
+    """Fader 1 swept while EOS reports each level one step late, then moved back to 0 on the console."""
+    events = [("midi", _midi("90 68 7F"))]
+    previous = None
+    for step in range(steps):
+        value = step * 16383 // (steps - 1)
+        events.append(("midi", mido.Message("pitchwheel", channel=0, pitch=value - 8192)))
+        if previous is not None:
+            events.append(("osc", _osc("/eos/fader/1/1", previous / 16383)))
+        previous = value
+    events.append(("midi", _midi("90 68 00")))
+    events.append(("osc", _osc("/eos/fader/1/1", previous / 16383)))
+    # The console pulls the fader down, the untouched X-Touch fader reports the motor travel
+    events.append(("osc", _osc("/eos/fader/1/1", 0.0)))
+    for step in range(travel, -1, -1):
+        events.append(("midi", mido.Message("pitchwheel", channel=0, pitch=step * 16383 // travel - 8192)))
+    events.append(("flush", None))
+    return events
+
+
+WORKLOADS = {
+    "faders": workload_faders,
+    "jog": workload_jog,
+    "page_change": workload_page_change,
+    "cue_fade": workload_cue_fade,
+    "fader_echo": workload_fader_echo,
+}
+
+
+def replay(rig, events):
+    for kind, payload in events:
+        if kind == "midi":
+            rig.midi_in(payload)
+        elif kind == "osc":
+            rig.osc_in(payload)
+        else:
+            rig.flush_surface()
+
+
+def run_workload(name, repeat=5):
+    """
+    Run a workload on fresh engines and keep the best of `repeat` runs.
+
+    Returns:
+    - dict: {"events", "events_per_s", "cpu_us_per_event", "midi_out", "osc_out", "echoes", "retained_bytes_per_event", "peak_kib"}.
+      "echoes" are the EOS levels and motor positions recognised as echoes and suppressed.
+    """
+    events = WORKLOADS[name]()
+    best = None
+    for _ in range(repeat):
+        rig = Rig()
+        midi_before, osc_before = rig.output_port.messages, rig.udp.datagrams
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        replay(rig, events)
+        cpu = time.process_time() - cpu
+        wall = time.perf_counter() - wall
+        result = {"events": len(events), "events_per_s": len(events) / wall,
+                  "cpu_us_per_event": cpu / len(events) * 1e6,
+                  "midi_out": rig.output_port.messages - midi_before, "osc_out": rig.udp.datagrams - osc_before}
+        echoes = rig.xtouch.ownership.stats()
+        result["echoes"] = echoes["eos_echoes"] + echoes["motor_echoes"]
+        if best is None or result["events_per_s"] > best["events_per_s"]:
+            best = result
+
+    # Allocations are measured on a separate run, tracemalloc slows everything down
+    rig = Rig()
+    tracemalloc.start()
+    replay(rig, events)
+    _, peak = tracemalloc.get_traced_memory()
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    retained = sum(stat.size for stat in snapshot.statistics("filename"))
+    best["retained_bytes_per_event"] = retained / len(events)
+    best["peak_kib"] = peak / 1024
+    return best
+
+
+# Counted, not timed: the same on every machine and every run
+DETERMINISTIC = ("events", "midi_out", "osc_out", "echoes")
+
+
+def compare(results, baselines, tolerance):
+    """
+    Returns the names of the workloads whose events/s dropped more than `tolerance` below the baseline.
+    """
+    regressions = []
+    for name, result in results.items():
+        baseline = baselines.get(name)
+        if not isinstance(baseline, dict):
+            continue
+        ratio = result["events_per_s"] / baseline["events_per_s"]
+        result["vs_baseline"] = ratio
+        if ratio < 1 - tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def compare_counters(results, baselines):
+    """
+    Returns the differences of the deterministic counters with the baselines, as "workload counter: baseline -> result".
+    """
+    changes = []
+    for name, result in results.items():
+        baseline = baselines.get(name)
+        if not isinstance(baseline, dict):
+            continue
+        for counter in DETERMINISTIC:
+            if counter in baseline and baseline[counter] != result[counter]:
+                changes.append(f"{name} {counter}: {baseline[counter]} -> {result[counter]}")
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput benchmarks for the X-EOS mapping engines")
+    parser.add_argument("-w", "--workload", action="append", choices=sorted(WORKLOADS), help="Workload to run (default: all)")
+    parser.add_argument("-n", "--repeat", type=int, default=5, help="Runs per workload, the best one is kept")
+    parser.add_argument("--save", action="store_true", help="Save the results as the new baselines")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed events/s drop before reporting a regression")
+    parser.add_argument("--check", action="store_true", help="Fail when events/s dropped more than the tolerance")
+    args = parser.parse_args()
+
+    results = {name: run_workload(name, args.repeat) for name in (args.workload or WORKLOADS)}
+
+    baselines = {}
+    if os.path.exists(BASELINES_FILE):
+        with open(BASELINES_FILE) as f:
+            baselines = json.load(f)
+    regressions = compare(results, baselines, args.tolerance)
+    changes = compare_counters(results, baselines)
+
+    print(f"{'workload':<12} {'events':>7} {'events/s':>10} {'cpu us/ev':>10} {'kept B/ev':>10} {'peak KiB':>9} {'midi out':>9} {'osc out':>8} {'echoes':>7} {'vs base':>8}")
+    for name, r in results.items():
+        vs = f"{r['vs_baseline']:.2f}x" if "vs_baseline" in r else "-"
+        print(f"{name:<12} {r['events']:>7} {r['events_per_s']:>10.0f} {r['cpu_us_per_event']:>10.1f} "
+              f"{r['retained_bytes_per_event']:>10.0f} {r['peak_kib']:>9.0f} {r['midi_out']:>9} {r['osc_out']:>8} {r['echoes']:>7} {vs:>8}")
+
+    if args.save:
+        baselines["_machine"] = f"{platform.python_implementation()} {platform.python_version()} on {platform.machine()} {platform.system()}"
+        baselines.update({name: {key: round(value, 1) if isinstance(value, float) else value
+                                 for key, value in r.items() if key != "vs_baseline"}
+                          for name, r in results.items()})
+        with open(BASELINES_FILE, "w") as f:
+            json.dump(baselines, f, indent=4)
+        print(f"Baselines saved to {BASELINES_FILE}")
+        return
+    if regressions:
+        print(f"Slower (more than {args.tolerance:.0%} below baseline): {', '.join(regressions)}")
+    if changes:
+        print(f"Output differs from the baselines: {'; '.join(changes)}")
+    if changes or (args.check and regressions):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,31 @@
 """
 Handles communication protocols used in the X-EOS project, including OSC and MIDI.
+
+The classes are imported on first access (PEP 562), so importing e.g. the OSC router does
+not load mido or the python-osc servers.
 """
 
-from .osc_comm import OSCClient
-from .midi_comm import MIDIClient
+import importlib
+
+_EXPORTS = {
+    "OSCClient": ".osc_comm",
+    "MIDIClient": ".midi_comm",
+    "OSCRateLimiter": ".osc_rate_limiter",
+    "OSCReceiver": ".osc_receiver",
+    "OSCRouter": ".osc_router",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
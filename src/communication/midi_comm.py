@@ -4,12 +4,16 @@ Handles all MIDI communications related to the X-Touch using the mido library.
 
 Classes:
 - MIDIClient: Establishes and manages a MIDI client for communication with X-Touch.
+
+An X-Touch chained with X-Touch Extenders uses one MIDIClient per device, each with its own
+output scheduler and writer thread, so a slow port cannot stall the others.
 """
 
 import mido
 import re
-from mido import MidiFile, MidiTrack
+from communication.midi_scheduler import MIDIOutputScheduler, classify_mcu
 from utils import read_json
+from utils.session_log import MIDI_IN, MIDI_OUT
 import time
 
 
@@ -31,6 +35,11 @@ class MIDIClient:
     - device_name: The MIDI device name.
     - input_port: The input MIDI port.
     - output_port: The output MIDI port.
+    - input_name, output_name: The names of the opened ports.
+    - recorder: The SessionRecorder logging the messages in and out, or None.
+    - port_index: The index of the device, recorded with its messages.
+    - messages_sent: The number of messages written to the output port.
+    - scheduler: The MIDIOutputScheduler of the output, None when messages are written by the caller.
     
     Methods:
     - get_available_midi_ports(): Retrieve available MIDI ports.
@@ -38,7 +47,8 @@ class MIDIClient:
     - send_midi_message(): Send a MIDI message to X-Touch.
     """
 
-    def __init__(self, logger, config_file, message_callback=example_callback):
+    def __init__(self, logger, config_file, message_callback=example_callback, recorder=None,
+                 device=None, port_index=0, output_queue_size=0, exclude_ports=(), byte_rate=None):
         """
         Initializes the MIDIClient.
 
@@ -46,14 +56,37 @@ class MIDIClient:
         - logger: Logger - The logger object for logging messages.
         - config_file: str - The path to the configuration file.
         - message_callback: function - The callback function for handling received MIDI messages.
+        - recorder: SessionRecorder - Logs the messages in and out. Defaults to None.
+        - device: dict - An entry of settings.json->MIDI->devices, whose "input_device_pattern",
+          "output_device_pattern" and "sysex_id" override the MIDI settings. Defaults to None.
+        - port_index: int - The index of the device, recorded with its messages. Defaults to 0.
+        - output_queue_size: int - When not 0, messages are written by a MIDIOutputScheduler thread,
+          by priority, from a queue of this size. Defaults to 0 (written by the caller).
+        - exclude_ports: iterable - Port names already used by other devices. Defaults to ().
+        - byte_rate: int - The output budget of the scheduler in bytes per second, None for no limit,
+          e.g. 3125 for DIN MIDI. Overridden by the "byte_rate" of device. Defaults to None.
         """
         self.config = read_json(config_file)
-        self.input_device_patterns = self.config.get("MIDI", {}).get("input_device_pattern", ".*")
-        self.output_device_patterns = self.config.get("MIDI", {}).get("output_device_pattern", ".*")
+        device = device or {}
+        midi_settings = self.config.get("MIDI", {})
+        self.input_device_patterns = device.get("input_device_pattern", midi_settings.get("input_device_pattern", ".*"))
+        self.output_device_patterns = device.get("output_device_pattern", midi_settings.get("output_device_pattern", ".*"))
+        self.sysex_id = device.get("sysex_id", "14")
+        self.exclude_ports = set(exclude_ports)
         self.input_port = None
         self.output_port = None
+        self._send_raw = None
+        self.input_name = None
+        self.output_name = None
         self.message_callback = message_callback
+        self.recorder = recorder
+        self.port_index = port_index
         self.logger = logger
+        self.messages_sent = 0
+        self.scheduler = None
+        if output_queue_size:
+            self.scheduler = MIDIOutputScheduler(self._write_item, byte_rate=device.get("byte_rate", byte_rate),
+                                                 max_queued=output_queue_size, logger=logger)
 
         self.initialize_midi_ports()
 
@@ -64,11 +97,13 @@ class MIDIClient:
         
         # Initialize input port
         for pattern in self.input_device_patterns:
-            matching_input_ports = [port for port in input_ports if re.match(pattern, port)]
+            matching_input_ports = [port for port in input_ports if re.match(pattern, port) and port not in self.exclude_ports]
             if matching_input_ports:
                 try:
                     self.logger.info(f"Trying MIDI input port: {matching_input_ports[0]}.")
-                    self.input_port = mido.open_input(matching_input_ports[0], callback=self.message_callback)
+                    callback = self._record_and_callback if self.recorder else self.message_callback
+                    self.input_port = mido.open_input(matching_input_ports[0], callback=callback)
+                    self.input_name = matching_input_ports[0]
                     self.logger.info(f"Initialized MIDI input port: {matching_input_ports[0]}.")
                     break
                 except IOError as e:
@@ -78,19 +113,30 @@ class MIDIClient:
 
         # Initialize output port
         for pattern in self.output_device_patterns:
-            matching_output_ports = [port for port in output_ports if re.match(pattern, port)]
+            matching_output_ports = [port for port in output_ports if re.match(pattern, port) and port not in self.exclude_ports]
             if matching_output_ports:
                 try:
                     self.logger.info(f"Trying MIDI output port: {matching_output_ports[0]}.")
                     self.output_port = mido.open_output(matching_output_ports[0])
+                    self.output_name = matching_output_ports[0]
+                    # mido's rtmidi ports wrap a rtmidi.MidiOut, which takes the raw bytes without
+                    # building, copying and encoding a mido.Message. Other backends get a Message.
+                    self._send_raw = getattr(getattr(self.output_port, "_rt", None), "send_message", None)
                     self.logger.info(f"Initialized MIDI output port: {matching_output_ports[0]}.")
-                    self.send_midi_hex("F0 00 00 66 14 13 00 F7")
+                    self._write(bytes.fromhex(f"F0 00 00 66 {self.sysex_id} 13 00 F7"))
                     break
                 except IOError as e:
                     self.logger.warning(f"Error opening MIDI output port: {e}. Trying next available port...")
         else:
             raise ValueError("No MIDI output ports match the given patterns or all ports are in use.")
 
+        if self.scheduler is not None:
+            self.scheduler.start(f"midi-out-{self.port_index}")
+
+
+    def _record_and_callback(self, message):
+        self.recorder.record(MIDI_IN, message.bin(), self.port_index)
+        self.message_callback(message)
 
     @staticmethod
     def get_available_midi_ports():
@@ -113,13 +159,81 @@ class MIDIClient:
         Parameters:
         - message: MidiMessage - A mido.MidiMessage object to be sent.
         """
-        self.output_port.send(message)
+        self.send_midi_bytes(message.bin())
+
+    def send_midi_bytes(self, data):
+        """
+        Send a raw MIDI message to X-Touch.
+
+        Parameters:
+        - data: bytes - The MIDI message, e.g. b"\xe0\x00\x40".
+        """
+        if self.scheduler is None:
+            self._write(data)
+            return
+        priority, key = classify_mcu(data)
+        self.scheduler.submit(data, len(data), priority, key)
+
+    def send_midi_batch(self, messages):
+        """
+        Send raw MIDI messages to X-Touch, queued as one item, e.g. a frame of meter levels.
+
+        Parameters:
+        - messages: list of bytes - The MIDI messages, of the same priority class.
+        """
+        if self.scheduler is None:
+            for data in messages:
+                self._write(data)
+            return
+        priority, key = classify_mcu(messages[0])
+        self.scheduler.submit(tuple(messages), sum(map(len, messages)), priority, key)
 
     def send_midi_hex(self, message):
         """
-        Send a MIDI message to X-Touch.
+        Send a MIDI message to X-Touch, for debugging.
 
         Parameters:
-        - message: bytes - A bytes object to be sent.
+        - message: str - The MIDI message as a hex string, e.g. "E0 00 40".
+        """
+        self.send_midi_bytes(bytes.fromhex(message))
+
+    def close(self):
+        """
+        Write the queued messages, then close the MIDI ports. Messages still queued when the
+        scheduler times out are discarded, never written to a closing port.
+        """
+        if self.scheduler is not None:
+            self.scheduler.stop()
+        if self.input_port:
+            self.input_port.close()
+        if self.output_port:
+            self.output_port.close()
+
+    def stats(self):
         """
-        self.send_midi_message(mido.Message.from_hex(message))
+        Returns the output metrics of the device.
+
+        Returns:
+        - dict: {"sent": int}, plus the MIDIOutputScheduler.stats() when the output is scheduled.
+        """
+        stats = {"sent": self.messages_sent}
+        if self.scheduler is not None:
+            stats.update(self.scheduler.stats())
+        return stats
+
+    def _write_item(self, item):
+        # A scheduler item is a message, or the tuple of messages of a batch
+        if type(item) is tuple:
+            for data in item:
+                self._write(data)
+        else:
+            self._write(item)
+
+    def _write(self, data):
+        if self._send_raw is not None:
+            self._send_raw(data)
+        else:
+            self.output_port.send(mido.Message.from_bytes(data))
+        self.messages_sent += 1
+        if self.recorder:
+            self.recorder.record(MIDI_OUT, data, self.port_index)
@@ -0,0 +1,277 @@
+"""
+Prioritised, bandwidth-aware output queue of a MIDI port.
+
+Messages are sent by priority class, motor faders first, then button LEDs, the 7-segment
+display, the scribble strips and the level meters, so a burst of display updates never delays a fader. A
+queued message is replaced in place by a newer message for the same control (the same fader,
+LED, digit or strip range), and a byte-rate budget paces the output on slow links such as DIN
+MIDI or RTP-MIDI.
+
+Classes:
+- MIDIOutputScheduler: Sends queued messages from a writer thread, by priority and within a byte rate.
+"""
+
+import collections
+import threading
+import time
+
+# Priority classes, the lowest value is sent first
+SYSTEM = 0    # Device sysex: reset, firmware version request...
+MOTOR = 1     # Fader motors
+LED = 2       # Button LEDs and V-Pot rings
+SEGMENT = 3   # 7-segment display
+SCRIBBLE = 4  # Scribble strip text and colors
+METER = 5     # Level meters
+CLASS_NAMES = ("system", "motor", "led", "segment", "scribble", "meter")
+
+
+def classify_mcu(data):
+    """
+    Returns the priority class of a Mackie Control message, and the key of the control it sets.
+
+    Parameters:
+    - data: bytes or list of int. The MIDI message.
+
+    Returns:
+    - tuple: (priority class, key). Messages with the same key supersede each other, None never does.
+    """
+    status = data[0]
+    if 0xE0 <= status <= 0xEF:
+        return MOTOR, status
+    if status == 0xB0 and 0x40 <= data[1] <= 0x4B:
+        return SEGMENT, (status, data[1])
+    if status == 0xF0:
+        # F0 00 00 66 <device> <command> ...
+        command = data[5] if len(data) > 5 else None
+        if command == 0x12:
+            # Scribble text, only the same strip range is superseded
+            return SCRIBBLE, (command, data[6], len(data))
+        if command == 0x72:
+            return SCRIBBLE, command
+        return SYSTEM, None
+    if status == 0xD0:
+        # A meter frame only holds the strips that changed, it never supersedes another one
+        return METER, None
+    if status in (0x90, 0xB0):
+        return LED, (status, data[1])
+    return SYSTEM, None
+
+
+class _Entry:
+    __slots__ = ("item", "size", "queued_at", "key")
+
+    def __init__(self, item, size, queued_at, key):
+        self.item = item
+        self.size = size
+        self.queued_at = queued_at
+        self.key = key
+
+
+class MIDIOutputScheduler:
+    """
+    Sends queued messages from a writer thread, by priority and within a byte rate.
+
+    Usage:
+        scheduler = MIDIOutputScheduler(output_port.send, byte_rate=3125)
+        scheduler.start()
+        scheduler.submit(message, len(message.bytes()), MOTOR, key=0xE0)
+        ...
+        scheduler.stop()
+    """
+
+    def __init__(self, write, byte_rate=None, max_queued=1024, burst=0.02, clock=time.monotonic, logger=None):
+        """
+        Args:
+        - write: function(item). Writes a message to the port, called on the writer thread.
+        - byte_rate: The maximum output rate in bytes per second, None for no limit. Defaults to None.
+        - max_queued: The maximum number of queued messages. When full, the oldest message of a lower
+          class is dropped to make room, or else the new message. Defaults to 1024.
+        - burst: The time in seconds of output that may be sent at once after an idle period. Defaults to 0.02.
+        - clock: function() -> float. The monotonic clock in seconds. Defaults to time.monotonic.
+        - logger: The logger of write errors. Defaults to None.
+        """
+        self._write = write
+        self.byte_rate = byte_rate
+        self.max_queued = max_queued
+        self._capacity = byte_rate * burst if byte_rate else 0
+        self._tokens = self._capacity
+        self._refilled_at = clock()
+        self._clock = clock
+        self.logger = logger
+
+        self._queues = [collections.deque() for _ in CLASS_NAMES]
+        self._pending = {}  # (class, key) -> queued _Entry
+        self._queued = 0
+        self._condition = threading.Condition()
+        self._stopping = False
+        # Set when stopping timed out, the writer then leaves the queued messages
+        self._discarding = False
+        self._thread = None
+
+        self._sent = [0] * len(CLASS_NAMES)
+        self._merged = [0] * len(CLASS_NAMES)
+        self._dropped = [0] * len(CLASS_NAMES)
+        self._delay = [0.0] * len(CLASS_NAMES)
+        self._max_delay = [0.0] * len(CLASS_NAMES)
+        self.max_queued_seen = 0
+
+    def start(self, name="midi-out"):
+        """
+        Start the writer thread.
+
+        Args:
+        - name: The name of the thread. Defaults to "midi-out".
+        """
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=1):
+        """
+        Send the queued messages, then stop the writer thread. The messages still queued after
+        the timeout are discarded, so the port can be closed once stop() returns.
+
+        Args:
+        - timeout: The maximum time in seconds to wait for the queue to drain. Defaults to 1.
+
+        Returns:
+        - int: The number of queued messages discarded.
+        """
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        discarded = 0
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                with self._condition:
+                    self._discarding = True
+                    for priority, queue in enumerate(self._queues):
+                        self._dropped[priority] += len(queue)
+                        discarded += len(queue)
+                        queue.clear()
+                    self._pending.clear()
+                    self._queued = 0
+                    self._condition.notify()
+                # The writer finishes the message being written, if any
+                self._thread.join(timeout)
+                if self.logger:
+                    self.logger.warning(f"MIDI output stopped after {timeout} s, {discarded} queued messages discarded")
+            self._thread = None
+        return discarded
+
+    def submit(self, item, size, priority, key=None):
+        """
+        Queue a message. Never blocks.
+
+        Args:
+        - item: The message, passed to write().
+        - size: The size of the message in bytes.
+        - priority: The priority class, SYSTEM to METER.
+        - key: The control the message sets, a queued message with the same class and key is
+          replaced by this one. Defaults to None (never replaced).
+
+        Returns:
+        - bool: False if the message was dropped.
+        """
+        with self._condition:
+            if key is not None:
+                entry = self._pending.get((priority, key))
+                if entry is not None:
+                    entry.item = item
+                    entry.size = size
+                    self._merged[priority] += 1
+                    return True
+            if self._queued >= self.max_queued and not self._make_room(priority):
+                self._dropped[priority] += 1
+                return False
+            entry = _Entry(item, size, self._clock(), key)
+            self._queues[priority].append(entry)
+            if key is not None:
+                self._pending[(priority, key)] = entry
+            self._queued += 1
+            if self._queued > self.max_queued_seen:
+                self.max_queued_seen = self._queued
+            self._condition.notify()
+        return True
+
+    def _make_room(self, priority):
+        for lower in range(len(self._queues) - 1, priority, -1):
+            queue = self._queues[lower]
+            if queue:
+                self._forget(lower, queue.popleft())
+                self._dropped[lower] += 1
+                return True
+        return False
+
+    def _forget(self, priority, entry):
+        if entry.key is not None:
+            del self._pending[(priority, entry.key)]
+        self._queued -= 1
+
+    def _next(self):
+        # Called with the condition held, returns the next entry to write or None once stopped
+        while True:
+            if self._discarding:
+                return None, None
+            for priority, queue in enumerate(self._queues):
+                if queue:
+                    break
+            else:
+                if self._stopping:
+                    return None, None
+                self._condition.wait()
+                continue
+            entry = queue[0]
+            wait = self._reserve(entry.size)
+            if wait > 0:
+                # Over budget, a more urgent message may come in the meantime
+                self._condition.wait(wait)
+                continue
+            queue.popleft()
+            self._forget(priority, entry)
+            return priority, entry
+
+    def _reserve(self, size):
+        if not self.byte_rate:
+            return 0
+        now = self._clock()
+        self._tokens = min(self._capacity, self._tokens + (now - self._refilled_at) * self.byte_rate)
+        self._refilled_at = now
+        # A message larger than the burst is sent once the bucket is full
+        needed = min(size, self._capacity)
+        if self._tokens < needed:
+            return (needed - self._tokens) / self.byte_rate
+        self._tokens -= size
+        return 0
+
+    def _run(self):
+        while True:
+            with self._condition:
+                priority, entry = self._next()
+            if entry is None:
+                return
+            delay = self._clock() - entry.queued_at
+            self._delay[priority] += delay
+            if delay > self._max_delay[priority]:
+                self._max_delay[priority] = delay
+            try:
+                self._write(entry.item)
+                self._sent[priority] += 1
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f"Error writing MIDI message {entry.item}: {e}")
+
+    def stats(self):
+        """
+        Returns the output metrics of each priority class.
+
+        Returns:
+        - dict: {"queued": int, "max_queued": int, class name: {"sent", "merged", "dropped", "avg_delay_ms", "max_delay_ms"}}.
+        """
+        stats = {"queued": self._queued, "max_queued": self.max_queued_seen}
+        for priority, name in enumerate(CLASS_NAMES):
+            sent = self._sent[priority]
+            stats[name] = {"sent": sent, "merged": self._merged[priority], "dropped": self._dropped[priority],
+                           "avg_delay_ms": round(self._delay[priority] / sent * 1000, 3) if sent else 0.0,
+                           "max_delay_ms": round(self._max_delay[priority] * 1000, 3)}
+        return stats
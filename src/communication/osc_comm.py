@@ -1,11 +1,42 @@
 """
 Handles all OSC communications related to EOS.
 Uses the python-osc library for communication.
+
+Only the python-osc message builders are imported with the module, the servers (which pull
+in asyncio) are imported by start_server.
 """
 
-from pythonosc import udp_client, dispatcher, osc_server
+from pythonosc.osc_bundle_builder import OscBundleBuilder, IMMEDIATELY
+from pythonosc.osc_message_builder import OscMessageBuilder
+from contextlib import contextmanager
+from utils.latency import tracker
+from utils.session_log import OSC_IN, OSC_OUT
 import socket
 import logging
+import threading
+
+# "#bundle\0" + time tag
+BUNDLE_HEADER_SIZE = 16
+
+
+class _UDPSender:
+    """
+    Sends OSC messages and bundles to a host, as pythonosc's UDPClient does.
+    """
+
+    def __init__(self, host, port):
+        for family, _, _, _, address in socket.getaddrinfo(host, port, type=socket.SOCK_DGRAM):
+            if family in (socket.AF_INET, socket.AF_INET6):
+                break
+        else:
+            raise OSError(f"Cannot resolve OSC host {host}")
+        self._socket = socket.socket(family, socket.SOCK_DGRAM)
+        self._socket.setblocking(False)
+        self._address = address
+
+    def send(self, content):
+        self._socket.sendto(content.dgram, self._address)
+
 
 class OSCClient:
     """
@@ -14,18 +45,43 @@ class OSCClient:
     Attributes:
     - host: The hostname for OSC communication.
     - port: The port for OSC communication.
+    - bundle: Whether messages sent within a batch() are grouped in OSC bundles.
+    - max_bundle_size: The maximum size in bytes of a bundle datagram.
+    - server: The OSC server implementation, "threading" (one thread per datagram) or "single" (OSCReceiver).
+    - datagrams_sent: The number of UDP datagrams sent.
+    - messages_sent: The number of OSC messages sent.
+    - recorder: The SessionRecorder logging the datagrams in and out, or None.
+    - server_ready: threading.Event set once the OSC server is listening.
     """
 
-    def __init__(self, logger, host='127.0.0.1', port=8000):
+    def __init__(self, logger, host='127.0.0.1', port=8000, bundle=False, max_bundle_size=1400,
+                 server="threading", receive_queue_size=1024, recorder=None):
         """
         Constructor for OSCClient.
 
         Args:
         - host: The hostname for OSC communication. Defaults to 'localhost'.
         - port: The port for OSC communication. Defaults to 8000.
+        - bundle: Group the messages sent within a batch() in bundles. Defaults to False.
+        - max_bundle_size: The maximum size of a bundle datagram, kept under the MTU. Defaults to 1400.
+        - server: "threading" for ThreadingOSCUDPServer, "single" for the in-order OSCReceiver. Defaults to "threading".
+        - receive_queue_size: The size of the OSCReceiver dispatch queue. Defaults to 1024.
+        - recorder: SessionRecorder logging the datagrams in and out. Defaults to None.
         """
-        self._client = udp_client.SimpleUDPClient(host, port)
+        if server not in ("threading", "single"):
+            raise ValueError(f"Unknown OSC server type: {server}")
+        self._client = _UDPSender(host, port)
         self.logger = logger
+        self.bundle = bundle
+        self.max_bundle_size = max_bundle_size
+        self.datagrams_sent = 0
+        self.messages_sent = 0
+        self._batch = threading.local()
+        self.server = server
+        self.receive_queue_size = receive_queue_size
+        self._server = None
+        self.recorder = recorder
+        self.server_ready = threading.Event()
 
     def dummy_callback(self, unused_addr, *args):
         """
@@ -41,22 +97,56 @@ class OSCClient:
         - callback: The callback function to be called when a message is received.
         - port: The port to start the server on. Defaults to 8001.
         """
-        self._dispatcher = dispatcher.Dispatcher()
-        #self._dispatcher.map(root, callback)
-        self._dispatcher.set_default_handler(callback)
+        if self.server == "single":
+            from .osc_receiver import OSCReceiver
+        else:
+            from pythonosc import dispatcher, osc_server
+            self._dispatcher = dispatcher.Dispatcher()
+            #self._dispatcher.map(root, callback)
+            self._dispatcher.set_default_handler(callback)
+            if self.recorder:
+                handle_packet = self._dispatcher.call_handlers_for_packet
+                def record_and_handle(data, client_address):
+                    self.recorder.record(OSC_IN, data)
+                    return handle_packet(data, client_address)
+                self._dispatcher.call_handlers_for_packet = record_and_handle
         port = initial_port
         while True:
+            # Only binding falls back to the next port, errors while serving never move the server
             try:
-                self._server = osc_server.ThreadingOSCUDPServer(
-                    ('127.0.0.1', port), self._dispatcher
-                )
-                self.logger.info(f"UDP OSC Server started at {self._server.server_address}")
-                self.logger.info(f"This is the values for OSC UDP TX in EOS. ")
-                self._server.serve_forever()
-                break  # Exit the loop if server starts successfully
+                if self.server == "single":
+                    self._server = OSCReceiver(('127.0.0.1', port), callback, self.logger, self.receive_queue_size,
+                                               recorder=self.recorder)
+                else:
+                    self._server = osc_server.ThreadingOSCUDPServer(
+                        ('127.0.0.1', port), self._dispatcher
+                    )
+                break
             except (socket.error, OSError) as e:
                 self.logger.warning(f"Port {port} is in use, trying {port + 1}...")
                 port += 1  # Increment port and try again
+        self.logger.info(f"UDP OSC Server started at {self._server.server_address}")
+        self.logger.info(f"This is the values for OSC UDP TX in EOS. ")
+        self.server_ready.set()
+        self._server.serve_forever()
+
+    def stop_server(self):
+        """
+        Stops the OSC server started by start_server.
+        """
+        if self._server is not None:
+            self._server.shutdown()
+
+    def server_stats(self):
+        """
+        Returns the receive metrics of the OSC server, only available with the "single" server.
+
+        Returns:
+        - dict: The OSCReceiver.stats() metrics, or None.
+        """
+        if self.server == "single" and self._server is not None:
+            return self._server.stats()
+        return None
 
     def send_message(self, address, value=None):
         """
@@ -66,7 +156,72 @@ class OSCClient:
         - address: The OSC address pattern string.
         - value: The value to send. Defaults to None.
         """
+        builder = OscMessageBuilder(address=address)
         if value is not None:
-            self._client.send_message(address, value)
+            builder.add_arg(value)
+        message = builder.build()
+        tracker.mark("encode")
+        pending = getattr(self._batch, "messages", None)
+        if pending is not None:
+            pending.append(message)
+            return
+        self._client.send(message)
+        tracker.mark("send")
+        if self.recorder:
+            self.recorder.record(OSC_OUT, message.dgram)
+        self.datagrams_sent += 1
+        self.messages_sent += 1
+
+    @contextmanager
+    def batch(self):
+        """
+        Groups the messages sent by the current thread until the end of the block in OSC bundles.
+        Does nothing unless bundle mode is enabled. Batches can be nested, the bundles are sent
+        when the outermost block exits.
+
+        Usage:
+            with osc.batch():
+                osc.send_message("/eos/user/1/key/live", 1)
+                osc.send_message("/eos/user/1/key/live", 0)
+        """
+        if not self.bundle or getattr(self._batch, "messages", None) is not None:
+            yield
+            return
+        self._batch.messages = []
+        try:
+            yield
+        finally:
+            messages = self._batch.messages
+            self._batch.messages = None
+            self._send_bundles(messages)
+
+    def _send_bundles(self, messages):
+        """
+        Sends the messages in as few datagrams as possible, each under max_bundle_size.
+        """
+        chunk = []
+        size = BUNDLE_HEADER_SIZE
+        for message in messages:
+            message_size = 4 + message.size
+            if chunk and size + message_size > self.max_bundle_size:
+                self._send_chunk(chunk)
+                chunk = []
+                size = BUNDLE_HEADER_SIZE
+            chunk.append(message)
+            size += message_size
+        if chunk:
+            self._send_chunk(chunk)
+
+    def _send_chunk(self, messages):
+        if len(messages) == 1:
+            content = messages[0]
         else:
-            self._client.send_message(address)
+            builder = OscBundleBuilder(IMMEDIATELY)
+            for message in messages:
+                builder.add_content(message)
+            content = builder.build()
+        self._client.send(content)
+        if self.recorder:
+            self.recorder.record(OSC_OUT, content.dgram)
+        self.datagrams_sent += 1
+        self.messages_sent += len(messages)
@@ -0,0 +1,142 @@
+"""
+Rate limited output stage for OSC messages sent to EOS.
+Keeps only the latest value per address and sends it at most once per interval.
+
+Classes:
+- OSCRateLimiter: Latest-value-wins rate limiter wrapping an OSCClient.
+"""
+
+import threading
+import time
+
+
+class OSCRateLimiter:
+    """
+    Latest-value-wins rate limiter wrapping an OSCClient.
+
+    The first update of an address goes out immediately. Updates arriving before the
+    interval has elapsed replace each other and the newest one is sent when the interval
+    expires, so the final resting position of a fader is always sent.
+
+    Attributes:
+    - rate: The maximum number of messages per second for a single address.
+    - sent: The number of messages actually sent.
+    - coalesced: The number of updates replaced by a newer value before being sent.
+    """
+
+    def __init__(self, osc_client, rate=100, clock=time.monotonic):
+        """
+        Constructor for OSCRateLimiter.
+
+        Args:
+        - osc_client: The OSCClient used to send the messages.
+        - rate: The maximum number of messages per second for each address. Defaults to 100.
+        - clock: A function returning the current time in seconds. Defaults to time.monotonic.
+        """
+        if rate <= 0:
+            raise ValueError("Rate must be strictly positive")
+        self._osc_client = osc_client
+        self._clock = clock
+        self.rate = rate
+        self.interval = 1.0 / rate
+        self.sent = 0
+        self.coalesced = 0
+
+        self._pending = {}    # address -> latest value not sent yet
+        self._last_sent = {}  # address -> time of the last send
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = False
+
+    def send_message(self, address, value=None):
+        """
+        Sends the value now if the address is idle, otherwise keeps it until the interval expires.
+
+        Args:
+        - address: The OSC address pattern string.
+        - value: The value to send. Defaults to None.
+        """
+        now = self._clock()
+        with self._condition:
+            if address in self._pending:
+                self._pending[address] = value
+                self.coalesced += 1
+                return
+            last = self._last_sent.get(address)
+            if last is not None and now - last < self.interval:
+                self._pending[address] = value
+                self._start()
+                self._condition.notify()
+                return
+            self._last_sent[address] = now
+            self.sent += 1
+        self._osc_client.send_message(address, value)
+
+    def flush(self):
+        """
+        Sends all pending values immediately.
+        """
+        with self._condition:
+            pending = self._pending
+            self._pending = {}
+            now = self._clock()
+            for address in pending:
+                self._last_sent[address] = now
+            self.sent += len(pending)
+        with self._osc_client.batch():
+            for address, value in pending.items():
+                self._osc_client.send_message(address, value)
+
+    def stop(self):
+        """
+        Stops the output thread after sending the pending values.
+        """
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def stats(self):
+        """
+        Returns the counters of the rate limiter.
+
+        Returns:
+        - dict: {"sent": int, "coalesced": int, "pending": int}.
+        """
+        with self._condition:
+            return {"sent": self.sent, "coalesced": self.coalesced, "pending": len(self._pending)}
+
+    def _start(self):
+        # Called with the condition held
+        if self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="osc-rate-limiter", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            due = []
+            with self._condition:
+                while self._running:
+                    if self._pending:
+                        now = self._clock()
+                        next_due = min(self._last_sent[address] for address in self._pending) + self.interval
+                        if next_due <= now:
+                            break
+                        self._condition.wait(next_due - now)
+                    else:
+                        self._condition.wait()
+                if not self._running:
+                    return
+                now = self._clock()
+                for address in list(self._pending):
+                    if now - self._last_sent[address] >= self.interval:
+                        due.append((address, self._pending.pop(address)))
+                        self._last_sent[address] = now
+                self.sent += len(due)
+            with self._osc_client.batch():
+                for address, value in due:
+                    self._osc_client.send_message(address, value)
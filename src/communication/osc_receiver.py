@@ -0,0 +1,159 @@
+"""
+Single loop UDP OSC receiver.
+
+Datagrams are read by one thread and handed through a bounded queue to a single dispatch
+thread, so EOS messages are handled in arrival order without a thread per datagram.
+
+Classes:
+- OSCReceiver: Receives OSC datagrams and dispatches them in order to a callback.
+"""
+
+import queue
+import socket
+import threading
+import time
+from pythonosc.osc_packet import OscPacket, ParseError
+from utils.session_log import OSC_IN
+
+MAX_DATAGRAM_SIZE = 65535
+
+
+class OSCReceiver:
+    """
+    Receives OSC datagrams and dispatches them in order to a callback.
+
+    When the dispatch queue is full, the oldest queued datagram is dropped and counted, so the
+    latest levels and names sent by EOS are the ones kept. A receive error (e.g. the connection
+    reset Windows reports after an ICMP port unreachable) is logged and the receiver goes on.
+
+    Attributes:
+    - server_address: The (host, port) the receiver is bound to.
+    - received: The number of datagrams received.
+    - dropped: The number of queued datagrams dropped because the queue was full.
+    - errors: The number of receive errors.
+    - dispatched: The number of OSC messages passed to the callback.
+    """
+
+    def __init__(self, server_address, callback, logger, queue_size=1024, recorder=None):
+        """
+        Binds the receiver.
+
+        Args:
+        - server_address: The (host, port) to bind to.
+        - callback: The function called with (address, *args) for each OSC message.
+        - logger: The logger object for logging messages.
+        - queue_size: The maximum number of datagrams waiting to be dispatched. Defaults to 1024.
+        - recorder: SessionRecorder logging the datagrams as they are received, dropped ones included. Defaults to None.
+
+        Raises:
+        - OSError: If the address cannot be bound.
+        """
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            self._socket.bind(server_address)
+        except OSError:
+            self._socket.close()
+            raise
+        self.server_address = self._socket.getsockname()
+        self._callback = callback
+        self._recorder = recorder
+        self.logger = logger
+        self._queue = queue.Queue(queue_size)
+        # Set by shutdown(), possibly before serve_forever() runs
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._dispatch_thread = None
+
+        self.received = 0
+        self.dropped = 0
+        self.errors = 0
+        self.dispatched = 0
+        self._last_stats = (time.monotonic(), 0)
+
+    def serve_forever(self, poll_interval=0.5):
+        """
+        Receives datagrams until shutdown() is called. Blocks the calling thread.
+
+        Args:
+        - poll_interval: The time in seconds between checks for shutdown. Defaults to 0.5.
+        """
+        with self._lock:
+            if self._stopping.is_set():
+                return
+            self._dispatch_thread = threading.Thread(target=self._dispatch_loop, name="osc-dispatch", daemon=True)
+            self._dispatch_thread.start()
+        self._socket.settimeout(poll_interval)
+        try:
+            while not self._stopping.is_set():
+                try:
+                    dgram = self._socket.recv(MAX_DATAGRAM_SIZE)
+                except socket.timeout:
+                    continue
+                except OSError as e:
+                    if not self._stopping.is_set():
+                        self.errors += 1
+                        self.logger.warning(f"Error receiving OSC datagram: {e}")
+                    continue
+                self.received += 1
+                if self._recorder:
+                    self._recorder.record(OSC_IN, dgram)
+                try:
+                    self._queue.put_nowait(dgram)
+                except queue.Full:
+                    # The receive thread is the only producer, there is room once the oldest is dropped
+                    try:
+                        self._queue.get_nowait()
+                        self.dropped += 1
+                    except queue.Empty:
+                        pass
+                    self._queue.put_nowait(dgram)
+        finally:
+            self._socket.close()
+            self._queue.put(None)
+
+    def shutdown(self):
+        """
+        Stops receiving and waits for the dispatch thread to handle the queued datagrams.
+        """
+        with self._lock:
+            self._stopping.set()
+            dispatch_thread = self._dispatch_thread
+        if dispatch_thread is not None:
+            dispatch_thread.join()
+        else:
+            # serve_forever() has not started and will return at once
+            self._socket.close()
+        self.logger.info(f"OSC receiver stopped: {self.stats()}")
+
+    def stats(self):
+        """
+        Returns the receiver metrics. The rate is computed since the previous call.
+
+        Returns:
+        - dict: {"received": int, "dropped": int, "errors": int, "dispatched": int, "queued": int, "rate": float}.
+        """
+        now = time.monotonic()
+        last_time, last_received = self._last_stats
+        received = self.received
+        self._last_stats = (now, received)
+        rate = (received - last_received) / (now - last_time) if now > last_time else 0.0
+        return {"received": received, "dropped": self.dropped, "errors": self.errors, "dispatched": self.dispatched,
+                "queued": self._queue.qsize(), "rate": rate}
+
+    def _dispatch_loop(self):
+        while True:
+            dgram = self._queue.get()
+            if dgram is None:
+                return
+            try:
+                messages = OscPacket(dgram).messages
+            except ParseError as e:
+                self.logger.warning(f"Invalid OSC datagram: {e}")
+                continue
+            for timed_message in messages:
+                message = timed_message.message
+                self.dispatched += 1
+                try:
+                    self._callback(message.address, *message.params)
+                except Exception as e:
+                    self.logger.error(f"Error handling OSC message {message.address}: {e}")
@@ -0,0 +1,116 @@
+"""
+Precompiled OSC address router.
+
+Routes are patterns like "/eos/fader/{bank}/{n}" where each {name} segment captures an
+integer. Addresses without parameters are matched with a single dict lookup, the others
+walk a tree of address segments and stop at the first segment no route subscribed to.
+
+Classes:
+- OSCRouter: Dispatches OSC messages to the handler of the matching route.
+"""
+
+
+class _Route:
+    __slots__ = ("pattern", "handler", "hits")
+
+    def __init__(self, pattern, handler):
+        self.pattern = pattern
+        self.handler = handler
+        self.hits = 0
+
+
+class _Node:
+    __slots__ = ("children", "param", "route")
+
+    def __init__(self):
+        self.children = {}  # static segment -> _Node
+        self.param = None   # _Node for an integer parameter segment
+        self.route = None
+
+
+class OSCRouter:
+    """
+    Dispatches OSC messages to the handler of the matching route.
+
+    Handlers are called with the captured integers followed by the tuple of OSC arguments,
+    e.g. handler(bank, n, args) for "/eos/fader/{bank}/{n}" and handler(args) for "/eos/out/cmd".
+    A static segment takes precedence over a parameter at the same position.
+
+    Attributes:
+    - misses: The number of messages that matched no route.
+    """
+
+    def __init__(self):
+        self._exact = {}
+        self._root = _Node()
+        self._routes = []
+        self.misses = 0
+
+    def add_route(self, pattern, handler):
+        """
+        Register a handler for an address pattern.
+
+        Args:
+        - pattern: The address pattern, parameters written as {name}.
+        - handler: The function called with the captured integers and the arguments tuple.
+        """
+        route = _Route(pattern, handler)
+        self._routes.append(route)
+        segments = pattern.split("/")
+        if not any(segment.startswith("{") for segment in segments):
+            self._exact[pattern] = route
+            return
+        node = self._root
+        for segment in segments:
+            if segment.startswith("{") and segment.endswith("}"):
+                if node.param is None:
+                    node.param = _Node()
+                node = node.param
+            else:
+                node = node.children.setdefault(segment, _Node())
+        node.route = route
+
+    def dispatch(self, address, *args):
+        """
+        Call the handler of the route matching the address.
+
+        Args:
+        - address: The OSC address of the message.
+        - args: The OSC arguments of the message.
+
+        Returns:
+        - bool: True if a route matched.
+        """
+        route = self._exact.get(address)
+        if route is not None:
+            route.hits += 1
+            route.handler(args)
+            return True
+
+        node = self._root
+        params = []
+        for segment in address.split("/"):
+            child = node.children.get(segment)
+            if child is None:
+                if node.param is None or not segment.isdigit():
+                    self.misses += 1
+                    return False
+                params.append(int(segment))
+                child = node.param
+            node = child
+        route = node.route
+        if route is None:
+            self.misses += 1
+            return False
+        route.hits += 1
+        route.handler(*params, args)
+        return True
+
+    def stats(self):
+        """
+        Returns the hit counter of each route and the number of unrouted messages.
+
+        Returns:
+        - dict: {"hits": {pattern: int}, "misses": int}.
+        """
+        return {"hits": {route.pattern: route.hits for route in self._routes}, "misses": self.misses}
@@ -4,32 +4,67 @@ import ctypes
 import platform
 import logging
 import threading
+from utils.log_pipeline import RingBufferHandler
 
-class GUIHandler(logging.Handler):
-    def __init__(self, text_widget):
-        super().__init__()
+class GUIHandler(RingBufferHandler):
+    """
+    Shows the log in a text widget. Records are buffered by the handler, and the widget is
+    only updated from the Tk thread, at most `fps` times per second.
+    """
+    def __init__(self, text_widget, capacity=1000, max_lines=1000, fps=20):
+        super().__init__(capacity)
         self.text_widget = text_widget
+        self.max_lines = max_lines
+        self.interval_ms = max(1, int(1000 / fps))
 
-    def emit(self, record):
-        msg = self.format(record)
-        self.text_widget.insert(tk.END, msg + "\n")
-        self.text_widget.see(tk.END)
+    def start(self):
+        self.text_widget.after(self.interval_ms, self._refresh)
+
+    def _refresh(self):
+        lines = self.drain()
+        if lines:
+            widget = self.text_widget
+            widget.insert(tk.END, "\n".join(lines) + "\n")
+            # Garder au plus max_lines lignes dans la fenêtre
+            excess = int(widget.index("end-1c").split(".")[0]) - 1 - self.max_lines
+            if excess > 0:
+                widget.delete("1.0", f"{excess + 1}.0")
+            widget.see(tk.END)
+        self.text_widget.after(self.interval_ms, self._refresh)
 
 # Assurez-vous d'initialiser votre GUI avant d'ajouter le GUIHandler
-def run_gui(logger):
+def run_gui(logger, log_pipeline=None, settings=None):
+    """
+    Run the GUI until its window is closed.
+
+    Args:
+    - logger: The logger shown in the window.
+    - log_pipeline: The LogPipeline of the logger, the GUI handler is run by its listener. Defaults to None.
+    - settings: The "GUI" entry of settings.json, {"log_lines", "log_fps"}. Defaults to None.
+    """
+    settings = settings or {}
     root = tk.Tk()
     root.title("X-EOS GUI")
     log_area = scrolledtext.ScrolledText(root, width=40, height=10)
     log_area.grid(row=0, column=0, columnspan=2, padx=10, pady=10)
 
     # Création et ajout du GUIHandler au logger
-    gui_handler = GUIHandler(log_area)
+    gui_handler = GUIHandler(log_area, max_lines=settings.get("log_lines", 1000), fps=settings.get("log_fps", 20))
     try:
         gui_handler.setFormatter(formatter)  # Utiliser le même formatteur que la console
     except NameError:
         formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
         gui_handler.setFormatter(formatter)
-    logger.addHandler(gui_handler)
+    if log_pipeline is not None:
+        log_pipeline.add_handler(gui_handler)
+    else:
+        logger.addHandler(gui_handler)
+    gui_handler.start()
 
-    
-    root.mainloop()
+    try:
+        root.mainloop()
+    finally:
+        if log_pipeline is not None:
+            log_pipeline.remove_handler(gui_handler)
+        else:
+            logger.removeHandler(gui_handler)
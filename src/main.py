@@ -1,21 +1,36 @@
 """
 Main execution script for the X-EOS system.
 Initializes and runs the system.
+
+Usage (from the repository root):
+    python src/main.py             # with the GUI
+    python src/main.py --headless  # without display, until SIGTERM or Ctrl+C
+
+The X-Touch is initialized before the OSC side is set up, and the time from start to
+"surface ready" is logged. The headless mode never imports tkinter.
 """
 
-from communication.osc_comm import OSCClient
-from state.state_manager import StateManager
-from mapping.eos_mapping_engine import EOSMappingEngine
-from communication.midi_comm import MIDIClient
-from mapping.xtouch_mapping_engine import XTouchMappingEngine
 import time
+STARTED = time.perf_counter()
+
+from communication.midi_comm import MIDIClient
+from state.state_manager import StateManager
+from state.reactor import Reactor
+from mapping.xtouch_mapping_engine import XTouchMappingEngine, DEVICE_SYSEX_IDS
+from mapping.xtouch_config import load_config, ConfigWatcher
+from utils import read_json
+from utils.latency import tracker
+from utils.session_log import SessionRecorder
+from utils.log_pipeline import LogPipeline
+import argparse
+import os
 import logging
-from gui import run_gui
 import threading
+import signal
 
-def start_osc_server(osc):
+def start_osc_server(osc, handler):
     try:
-        osc.start_server("/eos", eos_mapping.eos_osc_handler)
+        osc.start_server("/eos", handler)
         while True:
             time.sleep(1)  # Maintient le serveur actif sans surcharger le processeur
     except Exception as e:
@@ -23,10 +38,22 @@ def start_osc_server(osc):
     finally:
         logger.info("OSC Server stopped.")
 
+def terminate(signum, frame):
+    # Stops the GUI main loop as well as the headless wait, the cleanup is done by the finally block
+    raise SystemExit(0)
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="X-EOS: Behringer X-Touch control surface for ETC EOS")
+    parser.add_argument("--headless", action="store_true", help="Run without GUI, until SIGTERM or Ctrl+C")
+    args = parser.parse_args()
+    imported = time.perf_counter()
+
+    settings = read_json("config/settings.json")
+    log_settings = settings.get("logging", {})
+
     # Configuration du logger
     logger = logging.getLogger('X-EOS')
-    logger.setLevel(logging.DEBUG)  # Définir le niveau de log le plus bas ici
+    logger.setLevel(log_settings.get("level", "INFO"))  # Définir le niveau de log le plus bas ici
 
     # Handler de console (sortie standard)
     console_handler = logging.StreamHandler()
@@ -36,29 +63,99 @@ if __name__ == "__main__":
     formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     console_handler.setFormatter(formatter)
 
-    # Ajouter le handler de console par défaut
-    logger.addHandler(console_handler)
+    # Les handlers tournent sur le thread du LogPipeline, logger ne bloque jamais les threads MIDI/OSC
+    log_pipeline = LogPipeline(logger, [console_handler], queue_size=log_settings.get("queue_size", 10000),
+                               repeat_interval=log_settings.get("repeat_interval", 1.0))
+    log_pipeline.start()
 
 
+    midi_ports = []
+    osc = None
+    xtouch_mapping = None
+    config_watcher = None
+    eos_mapping = None
+    recorder = None
+    # All MIDI, OSC and GUI events are processed in order on the reactor thread
+    reactor = Reactor(logger)
+    reactor.start()
+    signal.signal(signal.SIGTERM, terminate)
     try:
         # Initialization
+        metrics_settings = settings.get("metrics", {})
+        # Latency is measured from the time the I/O thread posted the event to the reactor
+        tracker.enabled = metrics_settings.get("latency", True)
+        tracker.ingress = lambda: reactor.event_posted_ns
+        if metrics_settings.get("summary_interval"):
+            reactor.call_every(metrics_settings["summary_interval"], tracker.log_summary, logger)
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, lambda signum, frame: tracker.log_summary(logger))
+        recording_settings = settings.get("recording", {})
+        if recording_settings.get("enabled", False):
+            # Replay with: python src/replay.py <log>
+            recorder = SessionRecorder(os.path.join(recording_settings.get("directory", "recordings"),
+                                                    time.strftime("session-%Y%m%d-%H%M%S.xlog")))
+            reactor.call_every(recording_settings.get("flush_interval", 1.0), recorder.flush)
+            logger.info(f"Recording the session to {recorder.path}")
         state_manager = StateManager(logger)
-        osc = OSCClient(logger)
-        xtouch_mapping = XTouchMappingEngine(logger, state_manager)
-        midi = MIDIClient(logger, "config/settings.json", xtouch_mapping.handle_midi_message)
-        xtouch_mapping._midi_comm = midi
-        xtouch_mapping.init_xtouch()
-        eos_mapping = EOSMappingEngine(logger, osc_client=osc, state_manager=state_manager)
-        state_manager.add_observer(eos_mapping)
-        state_manager.add_observer(xtouch_mapping)
+        # X-Touch first: the surface comes up while the OSC side is being set up
+        # X-Touch Extenders are chained after the X-Touch, each device has its own MIDI ports
+        midi_settings = settings.get("MIDI", {})
+        devices = midi_settings.get("devices", [{"type": "xtouch"}])
+        meter_settings = settings.get("meters", {})
+        mapping_settings = settings.get("mapping", {})
+        # The mapping files are compiled once, then loaded from the cache until they change
+        cache_path = None if mapping_settings.get("cache", True) else False
+        xtouch_config = load_config([device["type"] for device in devices], cache_path=cache_path, logger=logger)
+        xtouch_mapping = XTouchMappingEngine(logger, state_manager, schedule=reactor.call_later,
+                                             meters=meter_settings, config=xtouch_config)
+        if mapping_settings.get("reload_interval"):
+            # Rebuilt on the watcher thread, swapped on the reactor between two MIDI events
+            config_watcher = ConfigWatcher(xtouch_config.devices,
+                                           lambda config: reactor.post("config", xtouch_mapping.apply_config, config), logger,
+                                           cache_path=cache_path, interval=mapping_settings["reload_interval"],
+                                           digest=xtouch_config.digest)
+            config_watcher.start()
+        for index, device in enumerate(devices):
+            used_ports = {name for port in midi_ports for name in (port.input_name, port.output_name)}
+            midi = MIDIClient(logger, "config/settings.json",
+                              reactor.wrap("midi", tracker.traced("midi2osc", xtouch_mapping.midi_handler(index))),
+                              recorder=recorder, device={**device, "sysex_id": DEVICE_SYSEX_IDS[device["type"]]},
+                              port_index=index, output_queue_size=midi_settings.get("output_queue_size", 1024),
+                              exclude_ports=used_ports, byte_rate=midi_settings.get("byte_rate"))
+            midi_ports.append(midi)
+            xtouch_mapping.midi_ports[index] = midi
+        reactor.post("main", xtouch_mapping.init_xtouch)
+        if meter_settings.get("rate"):
+            reactor.call_every(1 / meter_settings["rate"], xtouch_mapping.meters.frame)
+        reactor.post("main", lambda: logger.info(f"Surface ready {(time.perf_counter() - STARTED) * 1000:.0f} ms after start "
+                                                 f"(imports {(imported - STARTED) * 1000:.0f} ms)"))
+
+        from communication.osc_comm import OSCClient
+        from mapping.eos_mapping_engine import EOSMappingEngine
+        osc_settings = settings.get("OSC", {})
+        osc = OSCClient(logger, bundle=osc_settings.get("bundle", False),
+                        server=osc_settings.get("server", "threading"),
+                        receive_queue_size=osc_settings.get("receive_queue_size", 1024), recorder=recorder)
+        eos_settings = settings.get("EOS", {})
+        fader_banks = [dict(bank) for bank in eos_settings.get("fader_banks", [{"id": 1, "width": 10}])]
+        # The first bank follows the X-Touch, it covers all the strips
+        fader_banks[0]["width"] = max(fader_banks[0]["width"], xtouch_mapping.strips)
+        eos_mapping = EOSMappingEngine(logger, osc_client=osc, state_manager=state_manager,
+                                       fader_rate=osc_settings.get("fader_rate"),
+                                       user=eos_settings.get("user", 1), fader_banks=fader_banks,
+                                       wheels=eos_settings.get("wheels"), schedule=reactor.call_later,
+                                       encoders=eos_settings.get("encoders"))
+        eos_mapping.subscribe_to(state_manager)
+        eos_mapping.compile_key_actions(xtouch_mapping.commands.commands())
         state_manager.eos = eos_mapping
         state_manager.xtouch = xtouch_mapping
-        logger.info(f"State Manager initialized with {len(state_manager._observers)} observers.")
+        logger.info(f"State Manager initialized with {sum(map(len, state_manager._subscribers.values()))} subscribers.")
        # osc.start_server("/eos", eos_mapping.eos_osc_handler)
-        osc_thread = threading.Thread(target=lambda: start_osc_server(osc), daemon=True)
+        osc_thread = threading.Thread(target=lambda: start_osc_server(osc, reactor.wrap("osc", tracker.traced("osc2midi", eos_mapping.eos_osc_handler))), daemon=True)
         osc_thread.start()
-        time.sleep(1)
-        state_manager.setFaderPage(1)
+        # EOS answers the page change on the OSC server, wait until it listens
+        osc.server_ready.wait(timeout=1)
+        reactor.post("main", eos_mapping.init_fader_banks)
 
         # Simulating a key press
         #state_manager.key_pressed("LIVE")
@@ -67,15 +164,41 @@ if __name__ == "__main__":
         logger.info("Waiting for MIDI messages. ")
 
         # Import et exécution de la GUI ici, si pas en mode headless
-        run_gui(logger)
+        if args.headless:
+            while True:
+                time.sleep(1)
+        else:
+            from gui import run_gui
+            run_gui(logger, log_pipeline, settings.get("GUI", {}))
 
     except ValueError as e:
         logger.error(e)
-    except KeyboardInterrupt:
+    except (KeyboardInterrupt, SystemExit):
         logger.info("Exiting.")
     finally:
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        if config_watcher:
+            config_watcher.stop()
+        if osc:
+            osc.stop_server()
+        reactor.stop(timeout=1)
+        logger.info(f"Reactor: {reactor.stats()}")
+        tracker.log_summary(logger)
+        if eos_mapping and eos_mapping.fader_limiter:
+            eos_mapping.fader_limiter.stop()
+            logger.info(f"Fader OSC output: {eos_mapping.fader_limiter.stats()}")
+        if eos_mapping:
+            logger.info(f"Fader page cache: {eos_mapping.eos_fader_bank.page_cache.stats()}")
+            logger.info(f"Wheels: {eos_mapping.wheels.stats()}")
+        if xtouch_mapping:
+            logger.info(f"Meters: {xtouch_mapping.meters.stats()}")
+            logger.info(f"Fader echoes: {xtouch_mapping.ownership.stats()}")
         # Cleanup: Ensure to close MIDI ports properly to free up resources.
-        if midi and midi.input_port:
-            midi.input_port.close()
-        if midi and midi.output_port:
-            midi.output_port.close()
\ No newline at end of file
+        for midi in midi_ports:
+            midi.close()
+            logger.info(f"MIDI output {midi.output_name}: {midi.stats()}")
+        if recorder:
+            recorder.close()
+            logger.info(f"Recorded {recorder.records} records to {recorder.path}")
+        logger.info(f"Log pipeline: {log_pipeline.stats()}")
+        log_pipeline.stop()
\ No newline at end of file
@@ -0,0 +1,128 @@
+"""
+Compiled, layered command table built from xtouch_cmds.json.
+
+The top level of xtouch_cmds.json maps MCU control ids to semantic commands and forms the
+base layer. An optional "layers" entry holds overlays, e.g. {"SHIFT": {"Fader Bank Left": "FADER_PAGE_1"}},
+which are merged over the base layer at load time. A "LAYER_<NAME>" command switches to that
+layer while its button is held.
+
+Classes:
+- CommandTable: Maps MCU control ids to ready-to-call actions for the active layer.
+"""
+
+from functools import partial
+
+BASE_LAYER = "BASE"
+LAYER_PREFIX = "LAYER_"
+
+
+class CommandTable:
+    """
+    Maps MCU control ids to ready-to-call actions for the active layer.
+
+    Attributes:
+    - layer: The name of the active layer.
+    - layers: {layer name: {MCU id: action}}.
+    """
+
+    def __init__(self, commands, compile_action):
+        """
+        Compile the commands of every layer.
+
+        Parameters:
+        - commands: dict. The content of xtouch_cmds.json.
+        - compile_action: function(command) -> function(value). Returns the action of a semantic
+          command, called with 1 on press and 0 on release, or None if the command is not handled.
+        """
+        base = {mcu: command for mcu, command in commands.items() if mcu != "layers"}
+        overlays = commands.get("layers", {})
+
+        actions = {}
+        for command in set(base.values()).union(*(overlay.values() for overlay in overlays.values())):
+            if not command:
+                continue
+            if command.startswith(LAYER_PREFIX):
+                name = command[len(LAYER_PREFIX):]
+                if name not in overlays:
+                    raise ValueError(f"Unknown command layer: {name}")
+                action = partial(self._momentary_layer, name)
+            else:
+                action = compile_action(command)
+            if action is not None:
+                actions[command] = action
+
+        self._commands = sorted(actions)
+        self.layers = {}
+        for name, overlay in [(BASE_LAYER, {})] + list(overlays.items()):
+            merged = {**base, **overlay}
+            self.layers[name] = {mcu: actions[command] for mcu, command in merged.items() if command in actions}
+
+        self.layer = BASE_LAYER
+        self._active = self.layers[BASE_LAYER]
+        # MCU id -> action used on press, so the release goes to the same action after a layer change
+        self._held = {}
+
+    def commands(self):
+        """
+        Returns:
+        - list: The semantic commands used in any layer, layer switches excluded.
+        """
+        return [command for command in self._commands if not command.startswith(LAYER_PREFIX)]
+
+    def set_layer(self, name):
+        """
+        Switch the active layer.
+
+        Parameters:
+        - name: str. The layer name, as found in xtouch_cmds.json->layers, or "BASE".
+        """
+        self._active = self.layers[name]
+        self.layer = name
+
+    def carry_over(self, previous):
+        """
+        Take over the state of the table this one replaces, e.g. after the commands were reloaded:
+        the active layer if it still exists, and the held controls, released through the actions they pressed.
+
+        Parameters:
+        - previous: CommandTable. The replaced table.
+        """
+        if previous.layer in self.layers:
+            self.set_layer(previous.layer)
+        self._held.update(previous._held)
+
+    def press(self, mcu_id):
+        """
+        Run the action mapped to a control in the active layer.
+
+        Parameters:
+        - mcu_id: str. The MCU control id (e.g. "Rec/Rdy 1").
+
+        Returns:
+        - bool: True if the control is mapped.
+        """
+        action = self._active.get(mcu_id)
+        if action is None:
+            return False
+        self._held[mcu_id] = action
+        action(1)
+        return True
+
+    def release(self, mcu_id):
+        """
+        Run the release of the action started by press().
+
+        Parameters:
+        - mcu_id: str. The MCU control id.
+
+        Returns:
+        - bool: True if the control is mapped.
+        """
+        action = self._held.pop(mcu_id, None) or self._active.get(mcu_id)
+        if action is None:
+            return False
+        action(0)
+        return True
+
+    def _momentary_layer(self, name, value):
+        self.set_layer(name if value else BASE_LAYER)
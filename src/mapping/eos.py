@@ -9,9 +9,10 @@ class EOS:
         self.faderBank.init_on_eos()
 
     def pressKey(self, key_name, hold=False):
-        self.send(f"key/{key_name}", 1)
-        if not hold:
-            self.releaseKey(key_name)
+        with self._osc_client.batch():
+            self.send(f"key/{key_name}", 1)
+            if not hold:
+                self.releaseKey(key_name)
     
     def releaseKey(self, key_name):
         self.send(f"key/{key_name}", 0)
@@ -1,8 +1,26 @@
 """
 Manages mapping of EOS data to internal states.
+
+Several EOS OSC fader banks can be open at once (e.g. one for subs, one for playbacks), each
+with its own page. The first bank follows the X-Touch faders, the others are driven by
+"FADERB<bank>_..." commands. All the addresses sent are under /eos/user/<user>/.
 """
 
-from observer import Observer
+from observer import Observer, KeyPress
+from communication.osc_rate_limiter import OSCRateLimiter
+from communication.osc_router import OSCRouter
+from state.fader_store import FaderStore, LEVEL_TOLERANCE
+from state.fader_page_cache import FaderPageCache
+from mapping.wheel_engine import WheelEngine, AccelerationCurve
+from functools import partial
+from utils.latency import tracker
+
+def _on_release(action):
+    """Wrap an action without argument so it only runs when the key is released."""
+    def on_release(value):
+        if value == 0:
+            action()
+    return on_release
 
 class EOSMappingEngine(Observer):
     """
@@ -10,92 +28,288 @@ class EOSMappingEngine(Observer):
 
     Attributes:
     - state_manager: A reference to the central State Manager instance.
+    - fader_limiter: The OSCRateLimiter used for fader levels, None when fader_rate is not set.
+    - osc_router: The OSCRouter dispatching the EOS OSC messages, with per-route hit counters.
+    - key_actions: Dictionary mapping semantic keys to their compiled action.
+    - user: The EOS user the commands are sent as.
+    - fader_banks: Dictionary mapping the EOS OSC bank ids to their EOSFaderBank.
+    - eos_fader_bank: The bank following the X-Touch faders, the first one.
+    - wheels: The WheelEngine sending the accelerated wheel turns, once per tick.
+    - encoders: Dictionary mapping the encoder (V-Pot) numbers to their settings {"wheel", "min", "max", "ring"}.
     """
 
-    def __init__(self, logger, osc_client, state_manager=None):
+    def __init__(self, logger, osc_client, state_manager=None, fader_rate=None, fader_bank_width=10,
+                 user=1, fader_banks=None, wheels=None, schedule=None, encoders=None):
+        """
+        Args:
+        - logger: The logger object for logging messages.
+        - osc_client: The OSCClient sending to EOS.
+        - state_manager: The central State Manager instance. Defaults to None.
+        - fader_rate: The maximum rate of fader levels sent, in messages per second per fader. Defaults to None (no limit).
+        - fader_bank_width: The number of faders of the default bank. Defaults to 10.
+        - user: The EOS user the commands are sent as. Defaults to 1.
+        - fader_banks: The banks to open, [{"id": int, "width": int}], the first one following the
+          X-Touch faders. Defaults to bank 1 with fader_bank_width faders.
+        - wheels: The wheel settings, {"tick": float, "smoothing": float, "jog": acceleration curve,
+          "encoders": acceleration curve}. Defaults to a 20 ms tick and the default curves.
+        - schedule: function(delay, callback). Runs the wheel output tick, e.g. Reactor.call_later.
+          Defaults to a threading.Timer.
+        - encoders: The EOS wheel turned by each encoder (V-Pot) from 1, [{"wheel": str, "min": float,
+          "max": float, "ring": str}], None for an unused encoder. min and max are the range shown
+          on the ring (defaults 0 and 100), ring the display mode (defaults "dot"). Defaults to None (no encoder).
+        """
         self._osc_client = osc_client
         self._state_manager = state_manager
         self.logger = logger
+        self.user = user
+
+        self.fader_limiter = OSCRateLimiter(osc_client, fader_rate) if fader_rate else None
+        self.fader_banks = {}
+        for bank in fader_banks or [{"id": 1, "width": fader_bank_width}]:
+            if bank["id"] in self.fader_banks:
+                raise ValueError(f"EOS fader bank {bank['id']} is configured twice")
+            self.fader_banks[bank["id"]] = EOSFaderBank(osc_client, bank["width"], state_manager, self.fader_limiter,
+                                                        eos_osc_id=bank["id"], user=user)
+        self.eos_fader_bank = next(iter(self.fader_banks.values()))
+        # The X-Touch shows the cached names and levels of a page while EOS sends them
+        self.eos_fader_bank.on_page_change = self._show_cached_page
+        self.osc_router = self.build_osc_router()
+        self.key_actions = {}
+
+        wheels = wheels or {}
+        options = {"schedule": schedule} if schedule is not None else {}
+        self.wheels = WheelEngine(osc_client, tick=wheels.get("tick", 0.02), smoothing=wheels.get("smoothing", 0.5), **options)
+        self.wheels.add_wheel("intens", f"/eos/user/{user}/wheel/intens", AccelerationCurve.from_settings(wheels.get("jog")))
+        self.encoders = {}
+        self._encoder_wheels = {}   # Encoder number -> name in the WheelEngine
+        self._encoders_by_wheel = {}  # EOS wheel -> encoder numbers, for the ring feedback
+        for n, encoder in enumerate(encoders or [], start=1):
+            if not encoder:
+                continue
+            self.encoders[n] = encoder = {"min": 0.0, "max": 100.0, "ring": "dot", **encoder}
+            if encoder["max"] == encoder["min"]:
+                raise ValueError(f"Encoder {n}: empty range for wheel {encoder['wheel']}")
+            self._encoder_wheels[n] = f"encoder {n}"
+            self._encoders_by_wheel.setdefault(encoder["wheel"], []).append(n)
+            self.wheels.add_wheel(f"encoder {n}", f"/eos/user/{user}/wheel/{encoder['wheel']}",
+                                  AccelerationCurve.from_settings(wheels.get("encoders")))
+
+    def subscribe_to(self, bus):
+        """
+        Subscribe the engine handlers to the events of the bus.
 
-        self.eos_fader_bank = EOSFaderBank(osc_client, 10, state_manager)
+        Args:
+        - bus: The Subject (usually the StateManager) publishing the events.
+        """
+        bus.subscribe(KeyPress, self.on_key_press)
 
     def update(self, message):
+        # Legacy dict messages, when registered with add_observer
         if message["type"] == "key_press":
-            if message["key"].startswith("EOS_"):
-                self.logger.info(f"Received EOS key press: {message}")
-                self._osc_client.send_message(f"/eos/user/1/key/{message['key'][4:]}", message["value"])
-                return
-            if message["key"] == "FADER_PAGE_NEXT" and message["value"] == 0:
-                self.eos_fader_bank.pageNext()
-                return
-            if message["key"] == "FADER_PAGE_PREV" and message["value"] == 0:
-                self.eos_fader_bank.pagePrev()
-                return
-            if message["key"].startswith("FADER_PAGE_") and message["value"] == 0:
-                self.eos_fader_bank.setPage(int(message["key"][-1:]))
-                return
-            if message["key"].startswith("FADERB"):
-                type, id, action = message["key"].split("_")
-                try: 
-                    actions = {"FIRE": self.eos_fader_bank.get(int(id)).fire, "STOP": self.eos_fader_bank.get(int(id)).stop, "LOAD": self.eos_fader_bank.get(int(id)).load}
-                except Exception as e:
-                    self.logger.error(f"Error processing fader action: {e}")
-                    return
-                actions[action](message["value"])
-                return
-            self.logger.info(f"Unknown key press: {message}")
-            return
+            self.on_key_press(KeyPress(message["key"], message["value"]))
+
+    def on_key_press(self, event):
+        action = self.key_actions.get(event.key)
+        if action is None:
+            action = self.key_actions[event.key] = self.compile_key_action(event.key)
+        # Messages produced by the same event go out in one bundle when bundle mode is enabled
+        with self._osc_client.batch():
+            action(event.value)
+
+    def compile_key_actions(self, keys):
+        """
+        Compile the actions of semantic keys ahead of the first press.
+
+        Args:
+        - keys: The semantic keys, e.g. the commands of xtouch_cmds.json.
+        """
+        for key in keys:
+            if key and key not in self.key_actions:
+                self.key_actions[key] = self.compile_key_action(key)
+
+    def compile_key_action(self, key):
+        """
+        Build the action of a semantic key, parsed once instead of on every press.
+
+        Args:
+        - key: The semantic key, e.g. "EOS_LIVE", "FADER_PAGE_3" or "FADERB_3_FIRE".
+
+        Returns:
+        - function(value): The action, called with 1 on press and 0 on release.
+        """
+        if key.startswith("EOS_"):
+            address = f"/eos/user/{self.user}/key/{key[4:]}"
+            def send_key(value):
+                self.logger.debug("EOS key press: %s=%s", key, value)
+                self._osc_client.send_message(address, value)
+            return send_key
+        if key == "FADER_PAGE_NEXT":
+            return _on_release(self.eos_fader_bank.pageNext)
+        if key == "FADER_PAGE_PREV":
+            return _on_release(self.eos_fader_bank.pagePrev)
+        if key.startswith("FADER_PAGE_") and key[len("FADER_PAGE_"):].isdigit():
+            return _on_release(partial(self.eos_fader_bank.setPage, int(key[len("FADER_PAGE_"):])))
+        if key.startswith("FADERB"):
+            # FADERB_3_FIRE on the X-Touch bank, FADERB2_3_FIRE or FADERB2_PAGE_NEXT on EOS bank 2
+            try:
+                type, id, action = key.split("_")
+                bank = self.fader_banks[int(type[len("FADERB"):])] if type != "FADERB" else self.eos_fader_bank
+                if id == "PAGE":
+                    if action == "NEXT":
+                        return _on_release(bank.pageNext)
+                    if action == "PREV":
+                        return _on_release(bank.pagePrev)
+                    return _on_release(partial(bank.setPage, int(action)))
+                fader = bank.get(int(id))
+                return {"FIRE": fader.fire, "STOP": fader.stop, "LOAD": fader.load}[action]
+            except (ValueError, IndexError, KeyError) as e:
+                self.logger.error(f"Error processing fader action {key}: {e}")
+        return lambda value: self.logger.info("Unknown key press: %s=%s", key, value)
+
+    def build_osc_router(self):
+        """
+        Build the router of the EOS OSC addresses handled by the engine.
+        Addresses not listed here are ignored.
+
+        Returns:
+        - OSCRouter: The router, with one handler per subscribed address.
+        """
+        router = OSCRouter()
+        router.add_route("/eos/out/cmd", self._on_cmd)
+        router.add_route("/eos/fader/{bank}/{n}", self._on_fader_level)
+        router.add_route("/eos/out/fader/{bank}", self._on_fader_bank)
+        router.add_route("/eos/out/fader/{bank}/{n}/name", self._on_fader_name)
+        router.add_route("/eos/out/active/cue/text", self._on_active_cue)
+        router.add_route("/eos/out/active/wheel/{n}", self._on_active_wheel)
+        return router
 
     def eos_osc_handler(self, unused_addr, *args):
         #self.logger.info(f"EOS OSC Handler received: '{unused_addr}' {args}")
-        if unused_addr == "/eos/out/cmd":
-            self.logger.info("received cmd")
-            if args[0].startswith("LIVE: "):
-                self._state_manager.goLive()
-            elif args[0].startswith("BLIND: "):
-                self._state_manager.goBlind()
-        elif unused_addr.startswith("/eos/fader/"):
-            #self.logger.debug(f"received fader message: {unused_addr.split('/')}={args[0]}")
-            fader_id = int(unused_addr.split("/")[4])
-            fader = self.eos_fader_bank.faders[fader_id - 1]
-            # Avoid rounding loops between EOS and the X-Touch
-            if abs(args[0] - fader.value) > 1/255.0:
-                fader.value=args[0]
-                self._state_manager.eosMovesFader(fader)
-        elif unused_addr.startswith("/eos/out/fader/"):
-            cmd=unused_addr.split('/')
-            if len(cmd) >=7 and cmd[6]=="name": 
-                #self.logger.debug(f"received fader name: {cmd}={args[0]}")
-                self._state_manager.namingfader(int(cmd[5]),args[0])
-                self.eos_fader_bank.faders[int(cmd[4])-1].name = args[0]
-                #self._state_manager.notify_observers({"type": "eosfadername", "id": int(cmd[4]), "name": args[0]})
-                self._state_manager.namingfader(int(cmd[5]),args[0])
-            elif cmd[4]=="range":
-                pass
-            elif cmd[4]==str(self.eos_fader_bank.eos_osc_id) and len(cmd) == 5:
-                # String argument with descriptive text for the OSC fader bank at <index>
-                self._state_manager.faderPageChanged(int(args[0]))
+        self.osc_router.dispatch(unused_addr, *args)
+
+    def _on_cmd(self, args):
+        self.logger.debug("received cmd: %s", args[0])
+        if args[0].startswith("LIVE: "):
+            self._state_manager.goLive()
+        elif args[0].startswith("BLIND: "):
+            self._state_manager.goBlind()
+
+    def init_fader_banks(self):
+        """
+        Open page 1 of every fader bank on EOS.
+        """
+        for bank in self.fader_banks.values():
+            if bank is self.eos_fader_bank:
+                self._state_manager.setFaderPage(1)
             else:
-                self.logger.info(f"received unknown fader message ({len(cmd)}): {cmd}={args}")
-        elif unused_addr.startswith("/eos/out/active/cue/text"):
-            self.logger.debug(f"received active cue: {args[0]}")
-            self.logger.debug(f"received remaining time: {args[0].split(' ')[-2]}")
-            text_arr = args[0].split(' ')
-            self._state_manager.cue_playing(text_arr[0], ' '.join(text_arr[1:-2]), text_arr[-2])
-
-    def intens_wheel(self, value):
-        self._osc_client.send_message("/eos/user/1/wheel/intens", value)
-        
+                bank.setPage(1)
+
+    def _on_fader_level(self, bank_id, n, args):
+        tracker.mark("decode")
+        bank = self.fader_banks.get(bank_id)
+        if bank is None or not 0 < n <= bank.width:
+            return
+        store = bank.store
+        if bank.eos_page:
+            bank.page_cache.store_level(bank.eos_page, n, args[0])
+        if bank is self.eos_fader_bank and self._state_manager.isFaderEcho(n, args[0]):
+            # EOS reports a level sent by the X-Touch, never moved back to it
+            return
+        if abs(args[0] - store.value[n]) > LEVEL_TOLERANCE:
+            store.value[n] = store.sent[n] = args[0]
+            store.page[n] = bank.eos_page
+            if bank is self.eos_fader_bank:
+                self._state_manager.eosMovesFader(bank.faders[n - 1])
+
+    def _on_fader_bank(self, bank_id, args):
+        # String argument with descriptive text for the OSC fader bank at <index>
+        bank = self.fader_banks.get(bank_id)
+        if bank is None:
+            return
+        bank.eos_page = int(args[0])
+        if bank is self.eos_fader_bank:
+            self._state_manager.faderPageChanged(bank.eos_page)
+
+    def _on_fader_name(self, bank_id, n, args):
+        bank = self.fader_banks.get(bank_id)
+        if bank is None or not 0 < n <= bank.width:
+            return
+        #self.logger.debug(f"received fader name: {bank}/{n}={args[0]}")
+        bank.faders[n - 1].name = args[0]
+        if bank.eos_page:
+            bank.page_cache.store_name(bank.eos_page, n, args[0])
+        if bank is self.eos_fader_bank:
+            self._state_manager.namingfader(n, args[0])
+
+    def _on_active_cue(self, args):
+        self.logger.debug("received active cue: %s", args[0])
+        text_arr = args[0].split(' ')
+        self._state_manager.cue_playing(text_arr[0], ' '.join(text_arr[1:-2]), text_arr[-2])
+
+    def _on_active_wheel(self, n, args):
+        # Label like "Pan  [-12.50]", category, value. Only shown on the rings, never sent back to EOS
+        label = args[0]
+        wheel = label.split("[", 1)[0].strip().lower().replace(" ", "_")
+        encoders = self._encoders_by_wheel.get(wheel)
+        if not encoders:
+            return
+        try:
+            value = float(args[2]) if len(args) > 2 else float(label.split("[", 1)[1].rstrip("] "))
+        except (IndexError, ValueError):
+            self.logger.debug("Unreadable wheel value: %s", args)
+            return
+        for encoder in encoders:
+            settings = self.encoders[encoder]
+            position = (value - settings["min"]) / (settings["max"] - settings["min"])
+            self._state_manager.encoderValue(encoder, wheel, value, position, settings["ring"])
+
+    def _show_cached_page(self, bank, page, cached):
+        """
+        Draw the cached names and levels of the page opened on the X-Touch bank, only the faders
+        that differ from the current page are updated. EOS corrections are applied as they arrive.
+        """
+        self._state_manager.faderPageChanged(page)
+        if cached is None:
+            return
+        for id in range(1, bank.width + 1):
+            name = cached.names[id]
+            if name is not None and name != bank.faders[id - 1].name:
+                bank.faders[id - 1].name = name
+                self._state_manager.namingfader(id, name)
+        store = bank.store
+        levels = [level if known else current for level, known, current in zip(cached.levels, cached.known, store.value)]
+        for id in store.update(levels, page):
+            self._state_manager.eosMovesFader(bank.faders[id - 1])
+
+    def intens_wheel(self, detents):
+        self.wheels.turn("intens", detents)
+
+    def turn_encoder(self, encoder, detents):
+        name = self._encoder_wheels.get(encoder)
+        if name is not None:
+            self.wheels.turn(name, detents)
+
 class EOSFader:
+    # The level is kept in the FaderStore of the bank
+    __slots__ = ("_osc_client", "id", "name", "type", "bank", "fired", "_levels")
+
     def __init__(self, osc_client, bank, id, name):
         self._osc_client = osc_client
         self.id = id
         self.name = name
         self.type = None # Sub, Global FX, Inibit, etc.
-        self.value = 0.0
         self.bank = bank
+        self._levels = bank.store.value
         self.fired = False
 
+    @property
+    def value(self):
+        return self._levels[self.id]
+
+    @value.setter
+    def value(self, value):
+        self._levels[self.id] = value
+
     def fire(self, value):
         self.fired = value
         self._action("fire", value)
@@ -103,28 +317,36 @@ class EOSFader:
     def stop(self, value):
         self._action("stop", value)
 
-    def load(self, fader_id, value):
+    def load(self, value):
         self._action("load", value)
 
     def _action(self, action, value):
         #/eos/user/1/fader/1/10/fire
-        self._osc_client.send_message(f"/eos/user/1/fader/{self.bank.eos_osc_id}/{self.id}/{action}", value)
+        self._osc_client.send_message(f"{self.bank.address}/{self.id}/{action}", value)
 
     def setValue(self, value):
-        # Avoid rounding loops between EOS and the X-Touch
-        if abs(value - self.value) < 1/255.0:
-            return
+        """
+        Set the level and send it to EOS, unless it is the same 8-bit EOS level.
+
+        Returns:
+        - bool: True if the level was sent.
+        """
+        if abs(value - self.value) < LEVEL_TOLERANCE:
+            return False
         self.value = value
         self.sync_value()
+        return True
 
     def sync_value(self):    
-        self._osc_client.send_message(f"/eos/user/1/fader/1/{self.id}", self.value)
+        value = self._levels[self.id]
+        self.bank.fader_output.send_message(f"{self.bank.address}/{self.id}", value)
+        self.bank.store.sent[self.id] = value
 
     def setName(self, name):
         if name == self.name:
             return
         self.name = name
-        self._osc_client.send_message(f"/eos/user/1/fader/1/{self.id}/name", name)
+        self._osc_client.send_message(f"{self.bank.address}/{self.id}/name", name)
 
     def __str__(self):
         return f"Fader {self.id} ({self.name})"
@@ -133,11 +355,22 @@ class EOSFader:
         return f"Fader {self.id} ({self.name})"
     
 class EOSFaderBank:
-    def __init__(self, osc_client, width, state_manager):
+    def __init__(self, osc_client, width, state_manager, fader_output=None, eos_osc_id=1, user=1):
         self._osc_client = osc_client
+        # Fader levels may go through a rate limiter, other messages are sent directly
+        self.fader_output = fader_output if fader_output is not None else osc_client
         self.width = width
         self.active_page = 0
-        self.eos_osc_id = 1
+        self.eos_osc_id = eos_osc_id
+        # The page EOS last reported for the bank, 0 until then
+        self.eos_page = 0
+        self.page_cache = FaderPageCache(width)
+        # function(bank, page, CachedPage or None), called when a page is requested
+        self.on_page_change = None
+        # /eos/user/<user>/fader/<bank>, the prefix of all the messages of the bank
+        self.address = f"/eos/user/{user}/fader/{eos_osc_id}"
+        # Indexed by fader id, index 0 is not used
+        self.store = FaderStore(width + 1)
         self.faders = [EOSFader(osc_client, self, i, f"Fader {i}") for i in range(1, width + 1)]
         self.initialized = False
         self.state_manager = state_manager
@@ -148,7 +381,7 @@ class EOSFaderBank:
     def init_on_eos(self):
         if self.initialized:
             return
-        self._osc_client.send_message(f"/eos/user/1/fader/{self.eos_osc_id}/config/{self.width}", 1)
+        self._osc_client.send_message(f"{self.address}/config/{self.width}", 1)
         self.initialized = True
 
     def pageNext(self):
@@ -162,9 +395,11 @@ class EOSFaderBank:
         if self.eos_osc_id is None: 
             raise AssertionError("EOS OSC ID is not set")
         self.active_page = page
-        self._osc_client.send_message(f"/eos/user/1/fader/{self.eos_osc_id}/config/{self.active_page}/{self.width}", 1)
+        self._osc_client.send_message(f"{self.address}/config/{self.active_page}/{self.width}", 1)
+        if self.on_page_change is not None:
+            self.on_page_change(self, page, self.page_cache.open(page))
         #self.state_manager.faderPageChanged(page)
-        self.state_manager.logger.debug(f"Fader page {self.active_page}")
+        self.state_manager.logger.debug("Fader page %s", self.active_page)
 
     def __str__(self):
         return f"EOS OSC Fader Bank {self.eos_osc_id} (Current page {self.active_page}): {self.faders}"
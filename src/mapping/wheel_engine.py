@@ -0,0 +1,173 @@
+"""
+Accelerated, coalesced output of wheel turns to EOS.
+
+Detents from the jog wheel (or any encoder) are scaled by an acceleration curve of the wheel
+speed, added up, and sent as one combined value per wheel and per output tick, so a fast spin
+is a handful of OSC messages instead of one per MIDI event.
+
+The speed is an exponential moving average of the detent rate, updated in constant time on
+each event. It is reset when the direction changes, so reversing never carries the acceleration.
+
+Classes:
+- AccelerationCurve: Multiplier applied to the detents as a function of the wheel speed.
+- WheelEngine: Accumulates the turns of named wheels and sends them once per tick.
+"""
+
+import threading
+import time
+
+
+def _timer_schedule(delay, callback):
+    timer = threading.Timer(delay, callback)
+    timer.daemon = True
+    timer.start()
+
+
+class AccelerationCurve:
+    """
+    Multiplier applied to the detents as a function of the wheel speed:
+    1 + gain * (speed - threshold) ** exponent, between 1 and max, speed in detents per second.
+
+    The defaults reproduce the former jog wheel handler, 1 up to 10 detents/s then +1 every 100 detents/s.
+    """
+
+    __slots__ = ("threshold", "gain", "exponent", "max")
+
+    def __init__(self, threshold=10.0, gain=0.01, exponent=1.0, max=20.0):
+        """
+        Parameters:
+        - threshold: float. The speed below which detents are not accelerated. Defaults to 10.
+        - gain: float. The acceleration above the threshold. Defaults to 0.01.
+        - exponent: float. 1 for a linear curve, more to accelerate fast spins harder. Defaults to 1.
+        - max: float. The maximum multiplier. Defaults to 20.
+        """
+        self.threshold = threshold
+        self.gain = gain
+        self.exponent = exponent
+        self.max = max
+
+    @classmethod
+    def from_settings(cls, settings):
+        """
+        Parameters:
+        - settings: dict. {"threshold", "gain", "exponent", "max"}, missing entries take the defaults.
+
+        Returns:
+        - AccelerationCurve: The curve.
+        """
+        return cls(**(settings or {}))
+
+    def __call__(self, speed):
+        excess = speed - self.threshold
+        if excess <= 0:
+            return 1.0
+        return min(1.0 + self.gain * excess ** self.exponent, self.max)
+
+
+class _Wheel:
+    __slots__ = ("address", "curve", "speed", "last_time", "direction", "pending", "events", "sent")
+
+    def __init__(self, address, curve):
+        self.address = address
+        self.curve = curve
+        self.speed = 0.0
+        self.last_time = None
+        self.direction = 0
+        self.pending = 0.0
+        self.events = 0
+        self.sent = 0
+
+
+class WheelEngine:
+    """
+    Accumulates the turns of named wheels and sends them once per tick.
+
+    Usage:
+        wheels = WheelEngine(osc_client, schedule=reactor.call_later)
+        wheels.add_wheel("intens", "/eos/user/1/wheel/intens")
+        wheels.turn("intens", 1)  # From the MIDI handler, sent at the next tick
+    """
+
+    def __init__(self, osc_client, schedule=_timer_schedule, tick=0.02, smoothing=0.5, clock=time.monotonic):
+        """
+        Parameters:
+        - osc_client: The OSCClient sending to EOS.
+        - schedule: function(delay, callback). Runs the tick, e.g. Reactor.call_later. Defaults to a threading.Timer.
+        - tick: float. The output period in seconds. Defaults to 0.02.
+        - smoothing: float. The weight of the latest detent rate in the speed estimate, 0 to 1. Defaults to 0.5.
+        - clock: function() -> float. The monotonic clock in seconds. Defaults to time.monotonic.
+        """
+        self._osc_client = osc_client
+        self._schedule = schedule
+        self.tick = tick
+        self.smoothing = smoothing
+        self._clock = clock
+        self._wheels = {}
+        self._lock = threading.Lock()
+        self._tick_scheduled = False
+
+    def add_wheel(self, name, address, curve=None):
+        """
+        Register a wheel.
+
+        Parameters:
+        - name: str. The name used by turn().
+        - address: str. The OSC address the combined value is sent to.
+        - curve: AccelerationCurve. Defaults to no acceleration.
+        """
+        self._wheels[name] = _Wheel(address, curve or AccelerationCurve(threshold=float("inf")))
+
+    def turn(self, name, detents):
+        """
+        Add detents to a wheel, the accelerated total is sent at the next tick.
+
+        Parameters:
+        - name: str. The wheel name.
+        - detents: int. The detents turned, negative counter-clockwise.
+        """
+        if not detents:
+            return
+        wheel = self._wheels[name]
+        now = self._clock()
+        direction = 1 if detents > 0 else -1
+        if wheel.last_time is None or direction != wheel.direction:
+            wheel.speed = 0.0
+        else:
+            rate = abs(detents) / max(now - wheel.last_time, 1e-3)
+            wheel.speed += self.smoothing * (rate - wheel.speed)
+        wheel.last_time = now
+        wheel.direction = direction
+        wheel.events += 1
+        with self._lock:
+            wheel.pending += detents * wheel.curve(wheel.speed)
+            if self._tick_scheduled:
+                return
+            self._tick_scheduled = True
+        self._schedule(self.tick, self.flush)
+
+    def flush(self):
+        """
+        Send the accumulated value of each wheel turned since the last tick.
+
+        Returns:
+        - int: The number of messages sent.
+        """
+        with self._lock:
+            self._tick_scheduled = False
+            pending = [(wheel, wheel.pending) for wheel in self._wheels.values() if wheel.pending]
+            for wheel, _ in pending:
+                wheel.pending = 0.0
+        if not pending:
+            return 0
+        with self._osc_client.batch():
+            for wheel, value in pending:
+                self._osc_client.send_message(wheel.address, value)
+                wheel.sent += 1
+        return len(pending)
+
+    def stats(self):
+        """
+        Returns:
+        - dict: {wheel name: {"events": int, "sent": int}}. The MIDI events turning each wheel, and the messages sent.
+        """
+        return {name: {"events": wheel.events, "sent": wheel.sent} for name, wheel in self._wheels.items()}
@@ -0,0 +1,394 @@
+"""
+Compiled X-Touch mapping configuration, cached on disk and rebuilt when the files change.
+
+xtouch_midi_map.json and xtouch_cmds.json are read once, validated and compiled into an
+XTouchConfig holding every lookup table of the mapping engine for a given chain of devices.
+The result is cached on disk with the modification times and the content hash of the files,
+so the next start loads the tables without parsing the JSON. ConfigWatcher polls the files
+and builds a new XTouchConfig in the background when they change, for the engine to swap in.
+
+Classes:
+- XTouchConfig: The compiled lookup tables of the X-Touch mapping.
+- ConfigWatcher: Rebuilds the XTouchConfig in the background when the files change.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import re
+import threading
+from functools import partial
+
+CONFIG_DIRECTORY = "config"
+MIDI_MAP_FILE = "xtouch_midi_map.json"
+COMMANDS_FILE = "xtouch_cmds.json"
+CACHE_FILE = ".xtouch_config.cache"
+# Bump when XTouchConfig changes, older caches are then rebuilt
+CACHE_VERSION = 1
+
+# MCU sysex device ids
+DEVICE_SYSEX_IDS = {"xtouch": "14", "extender": "15"}
+STRIPS_PER_DEVICE = 8
+# Per-strip controls, e.g. "Solo 3" or fader "3", renumbered on chained devices
+_STRIP_CONTROL = re.compile(r"^((?:Rec/Rdy|Solo|Mute|Select|V-Select) )?([1-8])$")
+_STRIP_NUMBER = re.compile(r"^((?:Rec/Rdy|Solo|Mute|Select|V-Select) )?(\d+)$")
+
+
+def _strip_id(name, offset):
+    """Returns the id of a per-strip control on a device whose first strip is offset + 1, None for other controls."""
+    match = _STRIP_CONTROL.match(name)
+    if match is None:
+        return None
+    return f"{match.group(1) or ''}{int(match.group(2)) + offset}"
+
+def _decode_label(labels, data, start):
+    """Decode a single data byte through a value map (e.g. 0x7F -> "Pressed")."""
+    return labels.get(data[start]) if len(data) == start + 1 else None
+
+def _decode_14bits(data, start):
+    """Decode a "ll hh" 14-bit fader position to a float, like f14bitsToFloat."""
+    return ((data[start + 1] << 7) + data[start]) / 16380.0
+
+def _decode_raw(data, start):
+    """Return the data byte as an int, or a tuple of ints for longer payloads."""
+    return data[start] if len(data) == start + 1 else tuple(data[start:])
+
+def _hex_bytes(path, text, lengths):
+    try:
+        data = bytes.fromhex(text)
+    except ValueError:
+        data = b""
+    if len(data) not in lengths:
+        raise ValueError(f"{path}: invalid MIDI bytes '{text}'")
+    return data
+
+
+class XTouchConfig:
+    """
+    The compiled lookup tables of the X-Touch mapping, for a chain of devices.
+
+    Attributes:
+    - devices: The device types, in strip order.
+    - strips: The total number of strips.
+    - midi_id_map: Dictionary mapping MIDI ids to (id_name, element_type).
+    - midi_value_map: Dictionary mapping element_type to {hexvalue: value}.
+    - midi_decode_tables: Per device, dictionary mapping raw MIDI id bytes to (element_type, id_name, decoder, payload_start).
+    - mcu2midi: {type: {id_name: MIDI id}}, as in xtouch_midi_map.json.
+    - midi_out: Dictionary mapping element_type to {id_name: (device index, MIDI id bytes)}, for all the devices.
+    - commands: The content of xtouch_cmds.json, without the strips beyond the devices.
+    - digest: The SHA-256 of the configuration files.
+    - warnings: The entries kept although they look wrong, e.g. commands of unknown controls.
+    """
+
+    def __init__(self, devices, midi_map, commands, digest="", path=CONFIG_DIRECTORY):
+        """
+        Validate and compile the configuration.
+
+        Parameters:
+        - devices: The device types, "xtouch" or "extender", in strip order.
+        - midi_map: dict. The content of xtouch_midi_map.json.
+        - commands: dict. The content of xtouch_cmds.json.
+        - digest: str. The SHA-256 of the files. Defaults to "".
+        - path: str. The directory of the files, for the error messages. Defaults to "config".
+
+        Raises:
+        - ValueError: If a device type or an entry of the files is invalid.
+        """
+        for device in devices:
+            if device not in DEVICE_SYSEX_IDS:
+                raise ValueError(f"Unknown X-Touch device type: {device}")
+        self.devices = tuple(devices)
+        self.strips = STRIPS_PER_DEVICE * len(self.devices)
+        self.digest = digest
+        self.warnings = []
+        midi_path = os.path.join(path, MIDI_MAP_FILE)
+        self.midi_id_map, self.midi_value_map = self._load_midi2mcu_map(midi_path, midi_map)
+        self.midi_decode_tables = [self._compile_midi2mcu_table(STRIPS_PER_DEVICE * device)
+                                   for device in range(len(self.devices))]
+        self.mcu2midi = self._load_mcu2midi_map(midi_map)
+        self.midi_out = self._compile_midi_out()
+        self.commands = self._load_mcu2semantic_map(os.path.join(path, COMMANDS_FILE), commands)
+
+    @staticmethod
+    def _load_midi2mcu_map(path, filetree):
+        # from type->coding->name to coding->(name,type)
+        idmapping = {}
+        valuespace = {}
+        for type, codname in filetree.items():
+            if not isinstance(codname, dict):
+                raise ValueError(f"{path}: '{type}' is not an object")
+            for coding, name in codname.items():
+                if coding in ("values", "outvalues"):
+                    for hexvalue in name:
+                        _hex_bytes(path, hexvalue, (1,))
+                    if coding == "values":
+                        valuespace[type] = name
+                    continue
+                id_bytes = _hex_bytes(path, coding, (1, 2))
+                if id_bytes[0] < 0x80:
+                    raise ValueError(f"{path}: '{coding}' does not start with a status byte")
+                if coding in idmapping:
+                    raise ValueError(f"{path}: '{coding}' is mapped twice, to {idmapping[coding][0]} and {name}")
+                idmapping[coding] = (name, type)
+        return idmapping, valuespace
+
+    @staticmethod
+    def _load_mcu2midi_map(filetree):
+        # {"type": {"MCU": "MIDI"}}, value maps reversed, e.g. mapping["fader"]["1"] == "E0"
+        mapping = {}
+        for type, midi2mcu in filetree.items():
+            mapping[type] = {}
+            for midi, mcu in midi2mcu.items():
+                if isinstance(mcu, dict):
+                    mapping[type][midi] = {value: key for key, value in mcu.items()}
+                else:
+                    mapping[type][mcu] = midi
+        return mapping
+
+    def _compile_midi2mcu_table(self, strip_offset=0):
+        # One-byte ids (e.g. "E0" for a fader) are keyed on the status byte, two-byte ids
+        # (e.g. "90 68" for a fader touch) on (status << 8) | data1, so both fit in the same dict.
+        # Each entry carries the decoder for the remaining bytes, selected once at load time.
+        table = {}
+        for coding, (name, type) in self.midi_id_map.items():
+            if strip_offset:
+                name = _strip_id(name, strip_offset) or name
+            id_bytes = bytes.fromhex(coding)
+            key = id_bytes[0] if len(id_bytes) == 1 else (id_bytes[0] << 8) | id_bytes[1]
+            if type in self.midi_value_map:
+                labels = {int(hexvalue, 16): value for hexvalue, value in self.midi_value_map[type].items()}
+                decoder = partial(_decode_label, labels)
+            elif type == "fader":
+                decoder = _decode_14bits
+            else:
+                decoder = _decode_raw
+            table[key] = (type, name, decoder, len(id_bytes))
+        return table
+
+    def _compile_midi_out(self):
+        # Per-strip controls are renumbered on chained devices, the other controls (transport,
+        # jog wheel...) are only addressed on the first device.
+        midi_out = {}
+        for type, mcu2id in self.mcu2midi.items():
+            out = midi_out[type] = {}
+            for device in range(len(self.devices)):
+                for name, midi in mcu2id.items():
+                    if isinstance(midi, dict):
+                        continue
+                    if device:
+                        name = _strip_id(name, STRIPS_PER_DEVICE * device)
+                        if name is None:
+                            continue
+                    out[name] = (device, bytes.fromhex(midi))
+        return midi_out
+
+    def _load_mcu2semantic_map(self, path, commands):
+        # Pairs like "Rec/Rdy 1": "EOS_MACRO_1", plus the optional "layers" overlays (see CommandTable).
+        # The commands of strips beyond the connected devices (e.g. "Select 12" without Extender) are left out.
+        controls = {name for name, _ in self.midi_id_map.values()}
+
+        def on_surface(mcu, command):
+            match = _STRIP_NUMBER.match(mcu)
+            if match is not None and f"{match.group(1) or ''}1" in controls:
+                return int(match.group(2)) <= self.strips
+            # Empty commands are placeholders
+            if mcu not in controls and command:
+                self.warnings.append(f"{path}: unknown X-Touch control '{mcu}'")
+            return True
+
+        def checked(overlay):
+            for mcu, command in overlay.items():
+                if not isinstance(command, str):
+                    raise ValueError(f"{path}: the command of '{mcu}' is not a string")
+            return {mcu: command for mcu, command in overlay.items() if on_surface(mcu, command)}
+
+        layers = {name: checked(overlay) for name, overlay in commands.get("layers", {}).items()}
+        compiled = checked({mcu: command for mcu, command in commands.items() if mcu != "layers"})
+        if layers:
+            compiled["layers"] = layers
+        return compiled
+
+
+def _read_files(directory):
+    # Returns the raw content of the configuration files, and their stamps (mtime, size)
+    contents = {}
+    stamps = {}
+    for name in (MIDI_MAP_FILE, COMMANDS_FILE):
+        path = os.path.join(directory, name)
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            contents[name] = f.read()
+        stamps[name] = (stat.st_mtime_ns, stat.st_size)
+    return contents, stamps
+
+def _stamps(directory):
+    stamps = {}
+    for name in (MIDI_MAP_FILE, COMMANDS_FILE):
+        stat = os.stat(os.path.join(directory, name))
+        stamps[name] = (stat.st_mtime_ns, stat.st_size)
+    return stamps
+
+def _digest(contents):
+    digest = hashlib.sha256()
+    for name in (MIDI_MAP_FILE, COMMANDS_FILE):
+        digest.update(contents[name])
+    return digest.hexdigest()
+
+def _read_cache(cache_path, devices):
+    try:
+        with open(cache_path, "rb") as f:
+            cached = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, IndexError, TypeError):
+        return None
+    if not isinstance(cached, dict) or cached.get("version") != CACHE_VERSION or cached.get("devices") != tuple(devices):
+        return None
+    return cached
+
+def _write_cache(cache_path, devices, stamps, config, logger=None):
+    # Written aside then renamed, a concurrent start never reads half a cache
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "wb") as f:
+            pickle.dump({"version": CACHE_VERSION, "devices": tuple(devices), "stamps": stamps, "config": config}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        if logger:
+            logger.warning(f"Could not write the X-Touch configuration cache {cache_path}: {e}")
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+
+def load_config(devices=("xtouch",), directory=CONFIG_DIRECTORY, cache_path=None, logger=None):
+    """
+    Load the compiled X-Touch configuration, from the cache when the files did not change.
+
+    The cache is used as is when the modification times and sizes of the files match. Otherwise
+    the files are read and the cache is still used if their content hash did not change.
+
+    Parameters:
+    - devices: The device types, in strip order. Defaults to a single X-Touch.
+    - directory: str. The directory of the configuration files. Defaults to "config".
+    - cache_path: str. The cache file, False for no cache. Defaults to CACHE_FILE in directory.
+    - logger: The logger of the cache errors. Defaults to None.
+
+    Returns:
+    - XTouchConfig: The compiled configuration.
+
+    Raises:
+    - ValueError: If the files are invalid.
+    """
+    if cache_path is None:
+        cache_path = os.path.join(directory, CACHE_FILE)
+    cached = _read_cache(cache_path, devices) if cache_path else None
+    if cached is not None and cached["stamps"] == _stamps(directory):
+        return cached["config"]
+
+    contents, stamps = _read_files(directory)
+    digest = _digest(contents)
+    if cached is not None and cached["config"].digest == digest:
+        config = cached["config"]
+    else:
+        try:
+            midi_map = json.loads(contents[MIDI_MAP_FILE])
+            commands = json.loads(contents[COMMANDS_FILE])
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid X-Touch configuration in {directory}: {e}") from e
+        config = XTouchConfig(devices, midi_map, commands, digest, directory)
+        if logger:
+            for warning in config.warnings:
+                logger.warning(warning)
+    if cache_path:
+        _write_cache(cache_path, devices, stamps, config, logger)
+    return config
+
+
+class ConfigWatcher:
+    """
+    Rebuilds the XTouchConfig in the background when the files change.
+
+    The new configuration is built and validated on the watcher thread, then handed to
+    on_change, e.g. posting XTouchMappingEngine.apply_config to the reactor so the tables
+    are swapped between two MIDI events. An invalid file is logged and the current
+    configuration is kept.
+
+    Usage:
+        watcher = ConfigWatcher(devices, lambda config: reactor.post("config", engine.apply_config, config), logger)
+        watcher.start()
+    """
+
+    def __init__(self, devices, on_change, logger, directory=CONFIG_DIRECTORY, cache_path=None, interval=1.0, digest=None):
+        """
+        Parameters:
+        - devices: The device types, in strip order.
+        - on_change: function(XTouchConfig). Called on the watcher thread with each new configuration.
+        - logger: The logger object for logging messages.
+        - directory: str. The directory of the configuration files. Defaults to "config".
+        - cache_path: str. The cache file, see load_config(). Defaults to CACHE_FILE in directory.
+        - interval: float. The time in seconds between two checks of the files. Defaults to 1.0.
+        - digest: str. The digest of the configuration in use, the same content is not handed over again. Defaults to None.
+        """
+        self.devices = tuple(devices)
+        self.on_change = on_change
+        self.logger = logger
+        self.directory = directory
+        self.cache_path = cache_path
+        self.interval = interval
+        self.digest = digest
+        self.reloads = 0
+        self.errors = 0
+        self._stamps = _stamps(directory)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Start the watcher thread.
+        """
+        self._thread = threading.Thread(target=self._run, name="config-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the watcher thread.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def check(self):
+        """
+        Rebuild the configuration if the files changed since the last check.
+
+        Returns:
+        - XTouchConfig: The new configuration, None if the content did not change or is invalid.
+        """
+        try:
+            stamps = _stamps(self.directory)
+        except OSError as e:
+            # Saved by an editor in several steps, the next check will see the final file
+            self.logger.debug(f"X-Touch configuration not readable: {e}")
+            return None
+        if stamps == self._stamps:
+            return None
+        self._stamps = stamps
+        try:
+            config = load_config(self.devices, self.directory, self.cache_path, self.logger)
+        except (OSError, ValueError) as e:
+            self.errors += 1
+            self.logger.error(f"X-Touch configuration not reloaded: {e}")
+            return None
+        if config.digest == self.digest:
+            return None
+        self.digest = config.digest
+        self.reloads += 1
+        self.on_change(config)
+        return config
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
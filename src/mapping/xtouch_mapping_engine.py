@@ -1,12 +1,24 @@
 """
 Manages mapping of X-Touch data to internal states.
+
+An X-Touch can be chained with X-Touch Extenders, the devices then form one logical fader
+strip: the strips of the second device are numbered 9 to 16 (fader "9", "Select 9"...), and so on.
 """
 
-import os
 import time
-from utils.json_handler import read_json
+from functools import partial
+from utils.latency import tracker
 from observer import Observer
-from mapping.xtouch_jogwheel import JogWheelHandler
+from mapping.xtouch_surface import XTouchSurface
+from mapping.xtouch_meters import XTouchMeters
+from mapping.command_table import CommandTable
+from mapping.xtouch_config import load_config, DEVICE_SYSEX_IDS, STRIPS_PER_DEVICE
+from state.fader_store import FaderStore
+from state.fader_ownership import FaderOwnership
+
+# V-Pot ring display modes, bits 4-5 of the ring LED value, the position being bits 0-3 (1-11, 0 for off)
+VPOT_RING_MODES = {"dot": 0x00, "boost": 0x10, "wrap": 0x20, "spread": 0x30}
+
 
 class XTouchMappingEngine(Observer):
     """
@@ -16,38 +28,126 @@ class XTouchMappingEngine(Observer):
     - state_manager: A reference to the central State Manager instance.
     - midi_id_map: Dictionary mapping MCU identifiers to (id_name, element_type).
     - midi_value_map: Dictionary mapping element_type to {hexvalue: value}.
+    - midi_decode_tables: Per device, dictionary mapping raw MIDI id bytes to (element_type, id_name, decoder, payload_start).
+    - midi_out: Dictionary mapping element_type to {id_name: (device index, MIDI id bytes)}, for all the devices.
+    - devices: The device types, "xtouch" or "extender", in strip order.
+    - strips: The total number of strips.
+    - surfaces: The XTouchSurface of each device, surface being the first one.
+    - midi_ports: The MIDIClient of each device, to be set before init_xtouch().
+    - meters: The XTouchMeters of the strips, whose frame() is to be called at meters.rate.
     """
 
-    def __init__(self, logger, state_manager):
+    def __init__(self, logger, state_manager, schedule=None, devices=("xtouch",), meters=None, config=None):
+        """
+        Parameters:
+        - logger: The logger object for logging messages.
+        - state_manager: The central State Manager instance.
+        - schedule: function(delay, callback). Runs the delayed surface flushes, e.g. Reactor.call_later. Defaults to a threading.Timer.
+        - devices: The device types, "xtouch" or "extender", in strip order. Defaults to a single X-Touch.
+        - meters: The meter settings, {"rate": float, "decay": float, "keepalive": float}, see XTouchMeters. Defaults to None.
+        - config: The compiled XTouchConfig of the devices. Defaults to the configuration files compiled
+          without the cache, main.py passes the cached one.
+        """
+        config = config or load_config(devices, cache_path=False, logger=logger)
+        self.devices = list(config.devices)
+        self.strips = config.strips
         self.state_manager = state_manager
-        self.midi_id_map, self.midi_value_map = self.load_midi2mcu_map()
-        self.mcu2midi = self.load_mcu2midi_map()
-        self.mcu2semantic_map = self.load_mcu2semantic_map()
-        self._midi_comm = None
         self.logger = logger
+        self.commands = None
+        self.apply_config(config)
+        self.midi_ports = [None] * len(self.devices)
 
-        self.jogWheelHandler = JogWheelHandler()
-
-        self.hdr = "F0 00 00 66 14"
+        self.sysex_headers = [f"F0 00 00 66 {DEVICE_SYSEX_IDS[device]}" for device in self.devices]
+        self.hdr = self.sysex_headers[0]
         self.ftr = "F7"
+        # Messages are built from these templates, only the payload is added
+        self._sysex_headers = [bytes.fromhex(header) for header in self.sysex_headers]
 
         self.colors = ["off", "red", "green", "yellow", "blue", "magenta", "cyan", "white"]
-        self.hexColors = {name: "{:02x}".format(i) for i, name in enumerate(self.colors)}
-        self.scribbleColors = ["00" for i in range(8)]
+        self.colorIndexes = {name: i for i, name in enumerate(self.colors)}
+
+        # Scribble strips, 7-segment display and LEDs are written into the surface model,
+        # which only sends what changed
+        # schedule(delay, callback) runs the delayed flushes, e.g. Reactor.call_later
+        self.surfaces = []
+        for device, device_type in enumerate(self.devices):
+            options = {"schedule": schedule} if schedule is not None else {}
+            self.surfaces.append(XTouchSurface(partial(self.send_bytes, device=device), partial(self.send_sysex_bytes, device=device),
+                                               segment_display=device_type == "xtouch", **options))
+        self.surface = self.surfaces[0]
+
+        # Fader position, touch and last motor move, indexed by strip number, the Master fader at index 0
+        self.faders = FaderStore(self.strips + 1)
+        self.fader_index = {str(strip): strip for strip in range(1, self.strips + 1)}
+        self.fader_index["Master"] = 0
+        # Who moves each fader, the user or the motor, to recognise the echoes of both
+        self.ownership = FaderOwnership(self.strips + 1)
+        self.meters = XTouchMeters(self.send_batch, self.strips, STRIPS_PER_DEVICE, **(meters or {}))
+
+    def apply_config(self, config):
+        """
+        Swap in a compiled configuration, e.g. rebuilt by a ConfigWatcher after the files changed.
+
+        To be called on the thread handling the MIDI messages (the reactor), the tables are then
+        replaced between two messages. Held buttons are released through the actions they pressed.
 
-        self.fader_touched = {}
-        self.fader_values = {}
-        self.last_motor_movement_time = {}
+        Parameters:
+        - config: The XTouchConfig, for the same devices.
+        """
+        if list(config.devices) != self.devices:
+            raise ValueError(f"X-Touch configuration for {config.devices}, the devices are {self.devices}")
+        commands = CommandTable(config.commands, self._compile_command)
+        if self.commands is not None:
+            commands.carry_over(self.commands)
+            self.logger.info(f"X-Touch configuration reloaded ({config.digest[:12]})")
+        self.config = config
+        self.midi_id_map, self.midi_value_map = config.midi_id_map, config.midi_value_map
+        self.midi_decode_tables = config.midi_decode_tables
+        self.midi_decode_table = self.midi_decode_tables[0]
+        self.mcu2midi = config.mcu2midi
+        self.midi_out = config.midi_out
+        self._led_states = {state: int(value, 16) for state, value in self.mcu2midi["switch"]["outvalues"].items()}
+        self.mcu2semantic_map = config.commands
+        self.commands = commands
 
     def init_xtouch(self):
         """
         Initialize the X-Touch control surface.
         """
         self.logger.info("Initializing X-Touch control surface")
-        self.send_sysex("63") #Reset
-        self.send_sysex("13 00") #Firmware version request
+        for device, surface in enumerate(self.surfaces):
+            self.send_sysex("63", device) #Reset
+            surface.invalidate()
+            self.send_sysex("13 00", device) #Firmware version request
+        self.meters.invalidate()
+        self.ownership.reset()
         self.set7segment("X-EOS")
-        self.logger.info("X-Touch initialized")
+        for surface in self.surfaces:
+            surface.flush()
+        if self.state_manager is not None and self.state_manager.eos is not None:
+            # The motor positions are unknown after a reset
+            self.state_manager.resyncFaders(all=True)
+        self.logger.info(f"X-Touch initialized ({self.strips} strips)")
+
+    @property
+    def _midi_comm(self):
+        """The MIDIClient of the first device."""
+        return self.midi_ports[0]
+
+    @_midi_comm.setter
+    def _midi_comm(self, midi):
+        self.midi_ports[0] = midi
+
+    def midi_handler(self, device=0):
+        """
+        Returns the function handling the MIDI messages received from a device, to be used as MIDIClient callback.
+
+        Parameters:
+        - device: int. The index of the device. Defaults to 0.
+        """
+        if device == 0:
+            return self.handle_midi_message
+        return partial(self.handle_midi_message, device=device)
 
     def update(self, message):
         if message["type"] == "fader":
@@ -55,51 +155,79 @@ class XTouchMappingEngine(Observer):
             if (message["origin"]!=self): 
                 self.movefader(message["id"],message["value"])
 
-    def handle_midi_message(self, message):
+    def handle_midi_message(self, message, device=0):
         """
         Handles an incoming MIDI message, utilizing the mappings.
 
         Parameters:
         - message: str, The MIDI message received.
+        - device: int. The index of the device the message comes from. Defaults to 0.
         """
         try:
-            (type, id, value) = self.map_midi2mcu(message)
+            mapped = self.map_midi2mcu(message, device)
+            tracker.mark("decode")
+            if mapped is None:
+                return
+            (type, id, value) = mapped
             # print(f"MCU: {type} {id} {value}")
             if type == "switch":
-                if id in self.mcu2semantic_map and self.mcu2semantic_map[id] != "":
-                    if value == "Pressed":
-                        self.state_manager.key_pressed(self.mcu2semantic_map[id])
-                    elif value == "Released":
-                        self.state_manager.key_pressed(self.mcu2semantic_map[id], 0)
+                if value == "Pressed":
+                    self.commands.press(id)
+                elif value == "Released":
+                    self.commands.release(id)
             elif type == "fader":
-                if id in self.fader_touched and self.fader_touched[id]:
-                    self.fader_values[id] = self.f14bitsToFloat(value)
-                    self.state_manager.xtouchMovesFader(int(id), self.fader_values[id])
-                else:
-                    if id not in self.last_motor_movement_time or time.time() - self.last_motor_movement_time[id] > 0.5:
-                        self.logger.debug(f"last_motor_movement_time: {id} {self.last_motor_movement_time[id]} current time: {time.time()} delta: {time.time() - self.last_motor_movement_time[id]}")
-                        self.logger.warning(f"Fader {id} moved without being touched. Ignoring.")
+                index = self.fader_index[id]
+                faders = self.faders
+                if faders.touched[index]:
+                    faders.value[index] = value
+                    if index:
+                        self.state_manager.xtouchMovesFader(index, value)
+                elif not self.ownership.position_report(index, value):
+                    self.logger.warning("Fader %s moved without being touched. Ignoring.", id)
             elif type == "fader_touch": 
+                index = self.fader_index[id]
                 if value == "Pressed":
-                    self.fader_touched[id] = True
+                    self.faders.touched[index] = 1
+                    self.ownership.touch(index)
                 elif value == "Released":
-                    self.fader_touched[id] = False
+                    self.faders.touched[index] = 0
+                    self.ownership.release(index)
                     #send the last value to the controler to avoid "go back" mechanism
-                    self.moveFader(id, self.fader_values[id])
+                    self.moveFader(id, self.faders.value[index])
             elif type == "Jog-wheel":
-                jog_value = self.jogWheelHandler.handle(value)
-                self.state_manager.jogWheel(jog_value)
+                # Relative value: 1-63 detents clockwise, 65-127 counter-clockwise
+                self.state_manager.jogWheel((value & 0x3F) * (-1 if value & 0x40 else 1))
+            elif type == "Vpot":
+                # Relative value, like the jog wheel
+                self.state_manager.encoderTurned(int(id), (value & 0x3F) * (-1 if value & 0x40 else 1))
             else:
-                self.logger.info(f"No mapped action for {type} '{id}' '{value}'")
+                self.logger.info("No mapped action for %s '%s' '%s'", type, id, value)
         except ValueError as e:
             self.logger.error(e)
             
     
 
     def moveFader(self, id, value): 
+        """
+        Move a motor fader, unless the user holds it.
+
+        Parameters:
+        - id: int or string. The fader number, or "Master".
+        - value: float. The level, 0.0 to 1.0.
+        """
         try:
-            self.send(self.mcu2midi["fader"][str(id)]+" "+self.floatTo14bits(value))
-            self.last_motor_movement_time[id] =  time.time()
+            device, status = self.midi_out["fader"][str(id)]
+            if not 0 <= value <= 1:
+                raise ValueError("Value must be between 0 and 1")
+            index = self.fader_index[str(id)]
+            if not self.ownership.motor_move(index, value):
+                return
+            int_value = int(value * 16383)
+            message = bytes((status[0], int_value & 0x7F, int_value >> 7))
+            tracker.mark("encode")
+            self.send_bytes(message, device)
+            self.faders.value[index] = value
+            self.faders.motor_time[index] = time.time()
         except KeyError as e:
             #self.logger.warning(f"MCU fader {id} not found in mapping ({self.mcu2midi['fader'].keys()})")
             pass
@@ -110,31 +238,20 @@ class XTouchMappingEngine(Observer):
 
         Parameters:
         - row: int. The row number (0-1).
-        - col: int. The column number (0-7).
+        - col: int. The column number (0-7 on one X-Touch, up to strips - 1 with Extenders).
         - text: str. The text to display (max 7 char).
         """
         if row < 0 or row > 1:
             raise ValueError("Row must be between 0 and 3")
-        if col < 0 or col > 7:
-            raise ValueError("Column must be between 0 and 7")
+        if col < 0 or col >= self.strips:
+            raise ValueError(f"Column must be between 0 and {self.strips - 1}")
         if len(text) > 7:
             raise ValueError("Text must be 8 characters or less")
 
-        padded_text = text.ljust(8)
-        hex_string = self.ascii_to_hex(padded_text)
-        #self.logger.debug(f"setScribbleText: {row} {col} '{padded_text}' {hex_string}")
-        row_col_hex = "{:02x}".format(row*37+col*7)
-        message = f"12 {row_col_hex} {hex_string}"
-        #self.logger.debug("setScribbleText: "+message)
-        self.send_sysex(message)
-        pass
+        self.surfaces[col // STRIPS_PER_DEVICE].set_scribble_text(row, col % STRIPS_PER_DEVICE, text)
 
     def setScribbleColor(self, col, color): 
-        self.scribbleColors[col] = self.hexColors[color]
-        hex_string = " ".join(self.scribbleColors)
-        message = f"72 {hex_string}"
-        #self.logger.debug("setScribbleColor: "+message)
-        self.send_sysex(message) # colors
+        self.surfaces[col // STRIPS_PER_DEVICE].set_scribble_color(col % STRIPS_PER_DEVICE, self.colorIndexes[color])
 
     def set7segment(self, text): 
         mcu_text = ""
@@ -143,13 +260,8 @@ class XTouchMappingEngine(Observer):
         for c in text[:12].upper():
             mcu_text += chr(ord(c) - 0x40) if 0x40 <= ord(c) <= 0x5A else c
 
-        hex_string = self.ascii_to_hex(mcu_text)
-
-        for i in range(13):
-            col_hex = "{:01x}".format(12-i)
-            chr_hex = "{:02x}".format(ord(mcu_text[i+len(mcu_text)-13])) if 12-i < len(mcu_text) else "20"
-            message = f"B0 4{col_hex} {chr_hex}"
-            self.send(message)
+        # Right aligned, digit 0 being the rightmost one
+        self.surface.set_segments([ord(mcu_text[-1 - col]) if col < len(mcu_text) else 0x20 for col in range(13)])
 
     def setButtonLed(self, id, state="On"):
         """
@@ -159,123 +271,73 @@ class XTouchMappingEngine(Observer):
         - id: string. The button identifier as found in "xtouch_midi_map.json".
         - state: str. The state of the LED ("on", "off" or "flashing", as found in json->switch->outvalues).
         """
-        if id not in self.mcu2midi["switch"]:
+        target = self.midi_out["switch"].get(id)
+        if target is None:
             self.logger.warning(f"Button {id} not found in mapping")
             return
 
-        state_hex = self.mcu2midi["switch"]["outvalues"][state]
-        id_hex = self.mcu2midi["switch"][id]
-        message = f"{id_hex} {state_hex}"
+        device, id_bytes = target
+        message = id_bytes + bytes((self._led_states[state],))
         #self.logger.debug(f"setButtonLed: {message}")
-        self.send(message)
+        self.surfaces[device].set_led(id, message)
 
+    def setVpotRing(self, id, position, mode="dot"):
+        """
+        Set the LED ring of a V-Pot.
 
-    def load_midi2mcu_map(self):
+        Parameters:
+        - id: int. The V-Pot number, 1 to strips.
+        - position: float. The position shown, 0.0 to 1.0, None to turn the ring off.
+        - mode: str. The ring display mode, "dot", "boost", "wrap" or "spread". Defaults to "dot".
         """
-        Load the X-Touch MIDI mapping from a JSON file.
+        target = self.midi_out["Vpot-led"].get(str(id))
+        if target is None:
+            self.logger.warning(f"V-Pot {id} not found in mapping")
+            return
 
-        Returns:
-        - dict: A dictionary representing MIDI message to function mapping.
-        """
-        file_path = os.path.join("config", "xtouch_midi_map.json")
-        filetree = read_json(file_path)
-
-        # extract the mapping from the filetree
-        # from type->coding->name to coding->(name,type)
-        idmapping = {}
-        valuespace={}
-        for type, codname in filetree.items():
-            for coding, name in codname.items():
-                if coding == "values": 
-                    valuespace[type] = name
-                elif coding == "outvalues": 
-                    valuespace["{type}_out"] = name
-                else:
-                    idmapping[coding] = (name, type)
-
-        return (idmapping, valuespace)
-    
-    def load_mcu2midi_map(self):
+        device, id_bytes = target
+        value = 0 if position is None else VPOT_RING_MODES[mode] | 1 + round(min(max(position, 0.0), 1.0) * 10)
+        # Same LED buffer as the buttons, an unchanged ring position is not sent again
+        self.surfaces[device].set_led(f"Vpot-led {id}", id_bytes + bytes((value,)))
+
+
+    def _compile_command(self, command):
         """
-        Load the X-Touch MCU mapping from a JSON file.
-        xtouch_midi_map.json contains the mapping MIDI -> MCU, arranged by type of control element. 
-        Ex : {"fader": {"1": "E0"}}
-        Returns:
-        - dict: {"type": {"MCU": "MIDI"}}} for example dict["fader"]["1"]=="E0".
-        """
-        file_path = os.path.join("config", "xtouch_midi_map.json")
-        filetree = read_json(file_path)
-        mapping = {}
-        for type, midi2mcu in filetree.items():
-            mapping[type] = {}
-            for midi, mcu in midi2mcu.items():
-                if isinstance(mcu, dict):
-                    # Handle the case where mcu is a dictionary
-                    mapping[type][midi] = {}
-                    for key, value in mcu.items():
-                        mapping[type][midi][value] = key
-                else:
-                    mapping[type][mcu] = midi
-        return mapping
-
-
-    def load_mcu2semantic_map(self):
-        """
-        Load the X-Touch MCU mapping from a JSON file.
-        xtouch_cmds.json contains the mapping from MCU to commands.
-        Only pairs like "Rec/Rdy 1": "EOS_MACRO_1". 
-        
-        Returns:
-        - dict: A dictionary representing MCU message to function mapping.
+        Action of a semantic command in the command table: forwarded to the state manager as a key press.
         """
-        file_path = os.path.join("config", "xtouch_cmds.json")
-        return read_json(file_path)
+        return lambda value: self.state_manager.key_pressed(command, value)
 
-    def map_midi2mcu(self, message):
+    def map_midi2mcu(self, message, device=0):
         """
-        Maps a MIDI message to MCU (Mackie Control Universal) element identifiers using midi_id_map.
+        Maps a MIDI message to MCU (Mackie Control Universal) element identifiers using the decode table of the device.
         
         This function converts incoming MIDI messages into a format that identifies the type of control element
         (e.g., fader, knob, button), its identifier, and the value associated with the action on the control surface.
         
         Parameters:
         - message: mido.Message. The MIDI message received.
+        - device: int. The index of the device the message comes from. Defaults to 0.
         
         Returns:
         - tuple: (type, id, value) if the message is mapped, None otherwise.
         'type' is the type of the MCU element (e.g., fader, button),
         'id' is the identifier of the element, and
-        'value' is the value associated with the action (e.g., fader position, button press).
+        'value' is the value associated with the action: the label from the value map
+        (e.g. "Pressed"), a float between 0 and 1 for faders, or the raw data byte otherwise.
         """
-        
-        # Split the MIDI message into its hexadecimal components
-        id1Byte, *values = message.hex().split()
-        # Combine the first two bytes for cases where the identification requires two bytes
-        id2Bytes = " ".join([id1Byte, values[0]])
-
-        # First, try to match the message using the first byte (id1Byte)
-        if id1Byte in self.midi_id_map:
-            # If found, extract the (id, type) tuple and remaining values as hexvalue
-            (id, type), hexvalue = (self.midi_id_map[id1Byte], " ".join(values))
-        # If not found, try to match using the first two bytes (id2Bytes)
-        elif id2Bytes in self.midi_id_map:
-            # If found, extract the (id, type) tuple and remaining values (skipping the first) as hexvalue
-            (id, type), hexvalue = (self.midi_id_map[id2Bytes], " ".join(values[1:]))
-        else:
-            # If no match is found, log a warning and return None
-            self.logger.warning(f"No mapped MCU for MIDI message: {message}")
+        data = message.bytes()
+        table = self.midi_decode_tables[device]
+
+        # First, try to match the message using the status byte, then using the first two bytes
+        entry = table.get(data[0])
+        if entry is None and len(data) > 1:
+            entry = table.get((data[0] << 8) | data[1])
+        if entry is None:
+            self.logger.warning("No mapped MCU for MIDI message: %s", message)
             return None
-        
-        # If a value map exists for the identified type, use it to get a more meaningful value
-        if type in self.midi_value_map:
-            value = self.midi_value_map[type].get(hexvalue, None)
-        else:
-            # If no value map is defined for this type, log the available value maps and return the hexvalue
-            #self.logger.info(self.midi_value_map)
-            value = hexvalue
-        
-        # Return the identified type, id, and value as a tuple
-        return (type, id, value)
+
+        type, id, decoder, start = entry
+        return (type, id, decoder(data, start))
 
     def floatTo14bits(self, value):
         """
@@ -335,10 +397,40 @@ class XTouchMappingEngine(Observer):
                 hex_string += hex(ascii_code)[2:] + " "  # Convert ASCII code to hexadecimal and concatenate
         return hex_string.strip()  # Remove trailing space
     
-    def send(self, message):
-        self._midi_comm.send_midi_hex(message)
-        pass
+    def send_bytes(self, message, device=0):
+        """
+        Send a MIDI message to a device.
+
+        Parameters:
+        - message: bytes. The raw MIDI message.
+        - device: int. The index of the device. Defaults to 0.
+        """
+        self.midi_ports[device].send_midi_bytes(message)
+        tracker.mark("send")
+
+    def send_batch(self, messages, device=0):
+        """
+        Send MIDI messages to a device as one batch, e.g. a meter frame.
+
+        Parameters:
+        - messages: list of bytes. The raw MIDI messages.
+        - device: int. The index of the device. Defaults to 0.
+        """
+        self.midi_ports[device].send_midi_batch(messages)
+
+    def send_sysex_bytes(self, message, device=0):
+        """
+        Send a MCU sysex message to a device.
+
+        Parameters:
+        - message: bytes. The body of the sysex, after the device header.
+        - device: int. The index of the device. Defaults to 0.
+        """
+        self.send_bytes(self._sysex_headers[device] + message + b"\xf7", device)
+
+    # Hex string versions, for debugging
+    def send(self, message, device=0):
+        self.send_bytes(bytes.fromhex(message), device)
         
-    def send_sysex(self, message):
-        self.send(f"{self.hdr} {message} {self.ftr}")
-        pass
\ No newline at end of file
+    def send_sysex(self, message, device=0):
+        self.send_sysex_bytes(bytes.fromhex(message), device)
\ No newline at end of file
@@ -0,0 +1,118 @@
+"""
+Level meters of the X-Touch strips.
+
+Each strip meter rises at once to the level it is given and falls back at a fixed decay rate.
+The meters are refreshed at a fixed frame rate. A frame is one batch of channel pressure messages
+per device, holding only the strips whose meter segment changed since the last frame, and an
+idle frame sends nothing.
+
+Classes:
+- XTouchMeters: Decaying level per strip, sent to the X-Touch meters once per frame.
+"""
+
+import time
+from array import array
+
+# Channel pressure, strip in the high nibble and segment in the low nibble (0 off to 12 clip)
+METER_STATUS = 0xD0
+METER_SEGMENTS = 12
+
+
+class XTouchMeters:
+    """
+    Decaying level per strip, sent to the X-Touch meters once per frame.
+
+    Usage:
+        meters = XTouchMeters(xtouch_mapping.send_batch, strips=8)
+        reactor.call_every(1 / meters.rate, meters.frame)
+        meters.set_level(3, 0.8)
+    """
+
+    def __init__(self, send_batch, strips=8, strips_per_device=8, rate=20, decay=1.5, keepalive=0.25,
+                 clock=time.monotonic):
+        """
+        Parameters:
+        - send_batch: function(messages, device). Sends a list of MIDI messages given as bytes to a device.
+        - strips: int. The number of strips, 1 to strips. Defaults to 8.
+        - strips_per_device: int. The number of strips of each device. Defaults to 8.
+        - rate: float. The frame rate, in frames per second. Defaults to 20.
+        - decay: float. The fall of the meters, in full scale per second. Defaults to 1.5.
+        - keepalive: float. The time in seconds after which a lit meter is sent again even if unchanged,
+          as the X-Touch lets its meters fall on its own in MCU mode. None to never send it again.
+          Defaults to 0.25.
+        - clock: function() -> float. The monotonic clock in seconds. Defaults to time.monotonic.
+        """
+        self._send_batch = send_batch
+        self.strips = strips
+        self.strips_per_device = strips_per_device
+        self.rate = rate
+        self.decay = decay
+        self.keepalive = keepalive
+        self._clock = clock
+        # Indexed by strip number, index 0 unused
+        self.levels = array("d", bytes(8 * (strips + 1)))
+        self.targets = array("d", bytes(8 * (strips + 1)))
+        self._sent = array("b", [-1] * (strips + 1))
+        self._sent_at = array("d", bytes(8 * (strips + 1)))
+        self._last_frame = clock()
+        self.frames = 0
+        self.messages = 0
+
+    def set_level(self, strip, level):
+        """
+        Set the level of a strip, the meter rises at once and falls at the decay rate.
+
+        Parameters:
+        - strip: int. The strip number, levels of other faders are ignored.
+        - level: float. The level, 0.0 to 1.0.
+        """
+        if 0 < strip <= self.strips:
+            self.targets[strip] = level
+            if level > self.levels[strip]:
+                self.levels[strip] = level
+
+    def invalidate(self):
+        """
+        Forget the meters sent, so the next frame sends every strip. Used after a reset of the device.
+        """
+        self._sent = array("b", [-1] * (self.strips + 1))
+
+    def frame(self):
+        """
+        Apply the decay and send the strips whose meter changed, one batch per device.
+
+        Returns:
+        - int: The number of messages sent.
+        """
+        now = self._clock()
+        fall = self.decay * (now - self._last_frame)
+        self._last_frame = now
+        levels, targets, sent, sent_at = self.levels, self.targets, self._sent, self._sent_at
+        keepalive = self.keepalive
+        batches = {}
+        for strip in range(1, self.strips + 1):
+            level = levels[strip]
+            if level > targets[strip]:
+                level = levels[strip] = max(targets[strip], level - fall)
+            segment = round(level * METER_SEGMENTS)
+            if segment == sent[strip] and not (keepalive and segment and now - sent_at[strip] >= keepalive):
+                continue
+            sent[strip] = segment
+            sent_at[strip] = now
+            device, index = divmod(strip - 1, self.strips_per_device)
+            batches.setdefault(device, []).append(bytes((METER_STATUS, index << 4 | segment)))
+        count = 0
+        for device, messages in batches.items():
+            self._send_batch(messages, device)
+            count += len(messages)
+        if count:
+            self.frames += 1
+            self.messages += count
+        return count
+
+    def stats(self):
+        """
+        Returns:
+        - dict: {"frames": int, "messages": int}. The frames that sent something, and the messages they held.
+        """
+        return {"frames": self.frames, "messages": self.messages}
@@ -0,0 +1,187 @@
+"""
+In-memory model of the X-Touch surface (7-segment display, scribble strips and button LEDs).
+
+The mapping engine writes into the model, which keeps track of what was last sent to the
+X-Touch and only emits the digits, strips and LEDs that actually changed. Writes arriving
+within flush_delay of each other (e.g. fader names after a page change) go out in one flush.
+
+Classes:
+- XTouchSurface: Dirty-tracking frame buffer of the X-Touch surface.
+"""
+
+import threading
+
+SEGMENT_DIGITS = 13
+SCRIBBLE_ROWS = 2
+SCRIBBLE_WIDTH = 7
+
+
+def _timer_schedule(delay, callback):
+    timer = threading.Timer(delay, callback)
+    timer.daemon = True
+    timer.start()
+
+
+class XTouchSurface:
+    """
+    Dirty-tracking frame buffer of the X-Touch surface.
+
+    Attributes:
+    - strips: The number of channel strips of the surface.
+    - segment_display: Whether the surface has the 7-segment display (an X-Touch Extender has none).
+    - flush_delay: The time in seconds during which writes are grouped in a single flush.
+    """
+
+    def __init__(self, send, send_sysex, strips=8, flush_delay=0.01, schedule=_timer_schedule, segment_display=True):
+        """
+        Initializes the surface model.
+
+        Parameters:
+        - send: function. Sends a MIDI message given as bytes.
+        - send_sysex: function. Sends the body of a MCU sysex message given as bytes.
+        - strips: int. The number of channel strips. Defaults to 8.
+        - flush_delay: float. The grouping delay in seconds, 0 to flush on every write. Defaults to 0.01.
+        - schedule: function(delay, callback). Calls callback after delay seconds. Defaults to a threading.Timer.
+        - segment_display: bool. Whether the surface has the 7-segment display. Defaults to True.
+        """
+        self._send = send
+        self._send_sysex = send_sysex
+        self._schedule = schedule
+        self.strips = strips
+        self.segment_display = segment_display
+        self.flush_delay = flush_delay
+
+        self._lock = threading.RLock()
+        self._flush_scheduled = False
+
+        self.segments = [0x20] * SEGMENT_DIGITS
+        self.scribble_text = [[" " * SCRIBBLE_WIDTH] * strips for _ in range(SCRIBBLE_ROWS)]
+        self.scribble_colors = [0] * strips
+        self.leds = {}
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        Forget what was sent to the X-Touch, so the next flush repaints the whole surface.
+        Used after a reset of the device.
+        """
+        with self._lock:
+            self._sent_segments = [None] * SEGMENT_DIGITS
+            self._sent_scribble_text = [[None] * self.strips for _ in range(SCRIBBLE_ROWS)]
+            self._sent_scribble_colors = None
+            self._sent_leds = {}
+
+    def set_segments(self, codes):
+        """
+        Set the characters of the 7-segment display.
+
+        Parameters:
+        - codes: list of int. The MCU character codes, index 0 being the rightmost digit.
+        """
+        with self._lock:
+            self.segments[:] = codes
+        self._request_flush()
+
+    def set_scribble_text(self, row, col, text):
+        """
+        Set the text of a scribble strip row.
+
+        Parameters:
+        - row: int. The row number (0-1).
+        - col: int. The strip number (0-based).
+        - text: str. The text to display (max 7 char).
+        """
+        with self._lock:
+            self.scribble_text[row][col] = text.ljust(SCRIBBLE_WIDTH)
+        self._request_flush()
+
+    def set_scribble_color(self, col, color):
+        """
+        Set the color of a scribble strip.
+
+        Parameters:
+        - col: int. The strip number (0-based).
+        - color: int. The MCU color index.
+        """
+        with self._lock:
+            self.scribble_colors[col] = color
+        self._request_flush()
+
+    def set_led(self, id, message):
+        """
+        Set the state of a button LED.
+
+        Parameters:
+        - id: str. The button identifier.
+        - message: bytes. The MIDI message putting the LED in the requested state.
+        """
+        with self._lock:
+            self.leds[id] = message
+        self._request_flush()
+
+    def _request_flush(self):
+        if self.flush_delay <= 0:
+            self.flush()
+            return
+        with self._lock:
+            if self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+        self._schedule(self.flush_delay, self.flush)
+
+    def flush(self):
+        """
+        Send the parts of the surface that changed since the last flush.
+
+        Returns:
+        - int: The number of MIDI messages sent.
+        """
+        with self._lock:
+            self._flush_scheduled = False
+            count = self._flush_segments() + self._flush_scribble_text() + self._flush_scribble_colors() + self._flush_leds()
+        return count
+
+    def _flush_segments(self):
+        if not self.segment_display:
+            return 0
+        count = 0
+        # Same order as a full refresh: leftmost digit first
+        for col in range(SEGMENT_DIGITS - 1, -1, -1):
+            code = self.segments[col]
+            if self._sent_segments[col] != code:
+                self._send(bytes((0xB0, 0x40 | col, code)))
+                self._sent_segments[col] = code
+                count += 1
+        return count
+
+    def _flush_scribble_text(self):
+        count = 0
+        for row in range(SCRIBBLE_ROWS):
+            texts = self.scribble_text[row]
+            sent = self._sent_scribble_text[row]
+            dirty = [col for col in range(self.strips) if texts[col] != sent[col]]
+            if not dirty:
+                continue
+            # One sysex covering the changed strips, unchanged strips in between are rewritten
+            first, last = dirty[0], dirty[-1]
+            text = "".join(texts[first:last + 1]).encode("ascii", "replace")
+            self._send_sysex(bytes((0x12, row * 37 + first * SCRIBBLE_WIDTH)) + text)
+            sent[first:last + 1] = texts[first:last + 1]
+            count += 1
+        return count
+
+    def _flush_scribble_colors(self):
+        if self._sent_scribble_colors == self.scribble_colors:
+            return 0
+        self._send_sysex(bytes((0x72, *self.scribble_colors)))
+        self._sent_scribble_colors = list(self.scribble_colors)
+        return 1
+
+    def _flush_leds(self):
+        count = 0
+        for id, message in self.leds.items():
+            if self._sent_leds.get(id) != message:
+                self._send(message)
+                self._sent_leds[id] = message
+                count += 1
+        return count
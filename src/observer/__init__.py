@@ -2,4 +2,5 @@
 Observer pattern implementation for the X-EOS system.
 """
 
-from .observer import Observer, Subject
+from .observer import Observer, Subject, ObserverAdapter
+from .events import Event, KeyPress, GoLive, GoBlind
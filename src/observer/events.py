@@ -0,0 +1,57 @@
+"""
+Typed events published by the StateManager.
+
+Events are small slotted objects; observers subscribe to the event classes they handle.
+"""
+
+
+class Event:
+    """
+    Base class of the events. Subclasses declare their fields in __slots__.
+    """
+    __slots__ = ()
+    type = None
+
+    def to_dict(self):
+        """
+        Convert the event to the dict message format used by Observer.update.
+
+        Returns:
+        - dict: {"type": type, field: value, ...}.
+        """
+        message = {"type": self.type}
+        for field in self.__slots__:
+            message[field] = getattr(self, field)
+        return message
+
+    def __repr__(self):
+        fields = ", ".join(f"{field}={getattr(self, field)!r}" for field in self.__slots__)
+        return f"{self.__class__.__name__}({fields})"
+
+
+class KeyPress(Event):
+    """
+    A semantic key (e.g. "EOS_LIVE", "FADER_PAGE_2") was pressed (value 1) or released (value 0).
+    """
+    __slots__ = ("key", "value")
+    type = "key_press"
+
+    def __init__(self, key, value):
+        self.key = key
+        self.value = value
+
+
+class GoLive(Event):
+    """
+    EOS switched to Live.
+    """
+    __slots__ = ()
+    type = "goLive"
+
+
+class GoBlind(Event):
+    """
+    EOS switched to Blind.
+    """
+    __slots__ = ()
+    type = "goBlind"
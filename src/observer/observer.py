@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from .events import Event
 
 class Observer(ABC):
     """
@@ -16,23 +17,77 @@ class Observer(ABC):
         pass
 
 
+class ObserverAdapter:
+    """
+    Forwards typed events to a legacy Observer as dict messages.
+    """
+    __slots__ = ("observer",)
+
+    def __init__(self, observer):
+        self.observer = observer
+
+    def __call__(self, event):
+        self.observer.update(event.to_dict())
+
+
 class Subject:
     """
-    Subject to be observed. Manages and notifies its observers.
+    Subject to be observed. Publishes typed events to the handlers subscribed to their class.
+
+    Observers registered with add_observer receive every event as a dict through an ObserverAdapter.
     """
 
     def __init__(self):
         self._observers = []
+        self._adapters = ()
+        # event class -> tuple of handlers, replaced on (un)subscription so publish needs no lock
+        self._subscribers = {}
+
+    def subscribe(self, event_type, handler):
+        """
+        Subscribe a handler to an event class.
+
+        Args:
+        - event_type: The Event subclass to receive.
+        - handler: The function called with each published event of that class.
+        """
+        handlers = self._subscribers.get(event_type, ())
+        if handler not in handlers:
+            self._subscribers[event_type] = handlers + (handler,)
+
+    def unsubscribe(self, event_type, handler):
+        """
+        Unsubscribe a handler from an event class.
+
+        Args:
+        - event_type: The Event subclass.
+        - handler: The handler to be removed.
+        """
+        self._subscribers[event_type] = tuple(h for h in self._subscribers.get(event_type, ()) if h != handler)
+
+    def publish(self, event):
+        """
+        Call the handlers subscribed to the class of the event, then the legacy observers.
+
+        Args:
+        - event: The Event to publish.
+        """
+        for handler in self._subscribers.get(event.__class__, ()):
+            handler(event)
+        for adapter in self._adapters:
+            adapter(event)
 
     def add_observer(self, observer):
         """
         Add an observer to the subject's list of observers.
+        The observer receives all events as dict messages.
 
         Args:
         - observer: The observer to be added.
         """
         if observer not in self._observers:
             self._observers.append(observer)
+            self._adapters = self._adapters + (ObserverAdapter(observer),)
 
     def remove_observer(self, observer):
         """
@@ -42,13 +97,17 @@ class Subject:
         - observer: The observer to be removed.
         """
         self._observers.remove(observer)
+        self._adapters = tuple(adapter for adapter in self._adapters if adapter.observer is not observer)
 
     def notify_observers(self, message):
         """
         Notify all observers about an event.
 
         Args:
-        - message: Information to be passed to the observers.
+        - message: An Event, published to its subscribers, or a dict passed to the observers only.
         """
+        if isinstance(message, Event):
+            self.publish(message)
+            return
         for observer in self._observers:
             observer.update(message)
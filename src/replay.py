@@ -0,0 +1,160 @@
+"""
+Replays a session log recorded by main.py through the mapping engines.
+
+The MIDI messages received from the X-Touch and the OSC datagrams received from EOS are fed
+back to the engines, in real time or as fast as possible. The output goes nowhere unless
+--record is given, which logs all the output of the replay to a new session log, to be compared
+with the recorded one. A replay may press GO and move faders, so the OSC output is only sent
+to EOS with --send-to-eos (the configured EOS host) or --host.
+
+Usage (from the repository root):
+    python src/replay.py recordings/session-20240101-200000.xlog
+    python src/replay.py --asap --record replayed.xlog recordings/session-20240101-200000.xlog
+    python src/replay.py --host 10.101.100.101 recordings/session-20240101-200000.xlog
+"""
+
+import argparse
+import logging
+import mido
+from pythonosc.osc_packet import OscPacket, ParseError
+from communication.osc_comm import OSCClient
+from mapping.eos_mapping_engine import EOSMappingEngine
+from mapping.xtouch_mapping_engine import XTouchMappingEngine
+from state.state_manager import StateManager
+from utils import read_json
+from utils.session_log import SessionLog, SessionRecorder, SessionReplayer, MIDI_IN, MIDI_OUT, OSC_IN
+
+
+class ReplayMIDIOutput:
+    """
+    Stands in for the MIDIClient output during a replay, optionally logging the messages.
+    """
+
+    def __init__(self, recorder=None, port_index=0):
+        self.recorder = recorder
+        self.port_index = port_index
+        self.messages_sent = 0
+
+    def send_midi_bytes(self, data):
+        self.messages_sent += 1
+        if self.recorder:
+            self.recorder.record(MIDI_OUT, bytes(data), self.port_index)
+
+    def send_midi_batch(self, messages):
+        for data in messages:
+            self.send_midi_bytes(data)
+
+    def send_midi_message(self, message):
+        self.send_midi_bytes(message.bin())
+
+    def send_midi_hex(self, message):
+        self.send_midi_bytes(bytes.fromhex(message))
+
+
+class ReplayOSCOutput:
+    """
+    Stands in for the UDP sender of the OSCClient during a replay, discarding the datagrams.
+    """
+
+    def __init__(self):
+        self.datagrams = 0
+
+    def send(self, content):
+        self.datagrams += 1
+
+
+def replay(path, speed=1.0, record=None, logger=None, send_to=None):
+    """
+    Replay a session log through newly created mapping engines.
+
+    Args:
+    - path: The path of the session log.
+    - speed: The replay speed, 1.0 for real time, None as fast as possible. Defaults to 1.0.
+    - record: The path of a session log receiving the output of the replay. Defaults to None.
+    - logger: The logger object for logging messages. Defaults to the "X-EOS" logger.
+    - send_to: (host, port) of the EOS console the OSC output is sent to, host or port None for
+      the configured one. Defaults to None, the OSC output is discarded.
+
+    Returns:
+    - dict: {kind name: int}. The number of records replayed of each kind.
+    """
+    logger = logger or logging.getLogger("X-EOS")
+    settings = read_json("config/settings.json")
+    osc_settings = settings.get("OSC", {})
+    recorder = SessionRecorder(record) if record else None
+
+    state_manager = StateManager(logger)
+    if send_to is not None:
+        host, port = send_to
+        host = host or osc_settings.get("host", "127.0.0.1")
+        port = port or osc_settings.get("port", 8000)
+        logger.warning(f"Sending the replayed OSC output to EOS at {host}:{port}")
+        osc = OSCClient(logger, host, port, bundle=osc_settings.get("bundle", False), recorder=recorder)
+    else:
+        osc = OSCClient(logger, bundle=osc_settings.get("bundle", False), recorder=recorder)
+        osc._client = ReplayOSCOutput()
+    devices = [device["type"] for device in settings.get("MIDI", {}).get("devices", [{"type": "xtouch"}])]
+    # Timers are not replayed, the surfaces are flushed after each event instead
+    xtouch_mapping = XTouchMappingEngine(logger, state_manager, schedule=lambda delay, callback: None, devices=devices)
+    xtouch_mapping.midi_ports = [ReplayMIDIOutput(recorder, index) for index in range(len(devices))]
+    midi_handlers = [xtouch_mapping.midi_handler(index) for index in range(len(devices))]
+    eos_settings = settings.get("EOS", {})
+    fader_banks = [dict(bank) for bank in eos_settings.get("fader_banks", [{"id": 1, "width": 10}])]
+    fader_banks[0]["width"] = max(fader_banks[0]["width"], xtouch_mapping.strips)
+    eos_mapping = EOSMappingEngine(logger, osc_client=osc, state_manager=state_manager,
+                                   user=eos_settings.get("user", 1), fader_banks=fader_banks,
+                                   wheels=eos_settings.get("wheels"), schedule=lambda delay, callback: None,
+                                   encoders=eos_settings.get("encoders"))
+    eos_mapping.subscribe_to(state_manager)
+    eos_mapping.compile_key_actions(xtouch_mapping.commands.commands())
+    state_manager.eos = eos_mapping
+    state_manager.xtouch = xtouch_mapping
+
+    def flush():
+        for surface in xtouch_mapping.surfaces:
+            surface.flush()
+        eos_mapping.wheels.flush()
+
+    def midi_in(data, port):
+        if port >= len(midi_handlers):
+            logger.warning(f"MIDI message from device {port}, only {len(midi_handlers)} configured")
+            return
+        midi_handlers[port](mido.Message.from_bytes(data))
+        flush()
+
+    def osc_in(data, port):
+        try:
+            messages = OscPacket(data).messages
+        except ParseError as e:
+            logger.warning(f"Invalid OSC datagram: {e}")
+            return
+        for timed_message in messages:
+            eos_mapping.eos_osc_handler(timed_message.message.address, *timed_message.message.params)
+        flush()
+
+    try:
+        with SessionLog(path) as log:
+            logger.info(f"Replaying {path}: {log.stats()}")
+            counts = SessionReplayer(log, {MIDI_IN: midi_in, OSC_IN: osc_in}, speed=speed).replay()
+    finally:
+        if recorder:
+            recorder.close()
+    logger.info(f"Replayed {counts}, sent {sum(port.messages_sent for port in xtouch_mapping.midi_ports)} MIDI messages "
+                f"and {osc.datagrams_sent} OSC datagrams{'' if send_to is not None else ' (discarded)'}")
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay an X-EOS session log through the mapping engines")
+    parser.add_argument("log", help="The session log to replay")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed, 2 for twice as fast (default: 1)")
+    parser.add_argument("--asap", action="store_true", help="Replay as fast as possible")
+    parser.add_argument("--record", help="Log the output of the replay to this session log")
+    parser.add_argument("--send-to-eos", action="store_true", help="Send the OSC output to the configured EOS console")
+    parser.add_argument("--host", help="Send the OSC output to the EOS console at this address")
+    parser.add_argument("--port", type=int, help="The OSC port of the EOS console (default: the configured one)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    send_to = (args.host, args.port) if args.send_to_eos or args.host or args.port else None
+    replay(args.log, speed=None if args.asap else args.speed, record=args.record, send_to=send_to)
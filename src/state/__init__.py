@@ -3,3 +3,4 @@ Centralized state management for the X-EOS system.
 """
 
 from .state_manager import StateManager
+from .reactor import Reactor
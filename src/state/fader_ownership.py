@@ -0,0 +1,192 @@
+"""
+Ownership of the motor faders, to tell the echoes of our own moves from real moves.
+
+Each fader is owned by the user while touched, by the motor while it travels to a level sent
+by EOS, and idle otherwise. The levels sent to EOS get a sequence number per fader and wait
+in a pending list: the level EOS reports back is an echo when it matches a pending level,
+and the older pending levels were superseded (e.g. coalesced by the rate limiter). A position
+reported by an untouched fader is the echo of the motor move in progress, and unexpected when
+the fader is idle. No timing window is involved.
+
+Classes:
+- FaderOwnership: The owner, pending levels and echo counters of a set of faders.
+"""
+
+import collections
+from array import array
+
+from state.fader_store import LEVEL_TOLERANCE
+
+IDLE = 0   # Nobody moves the fader
+USER = 1   # Touched, the X-Touch position is sent to EOS
+MOTOR = 2  # Travelling to the level sent by EOS
+STATE_NAMES = ("idle", "user", "motor")
+
+
+class FaderOwnership:
+    """
+    The owner, pending levels and echo counters of a set of faders, indexed by fader id.
+
+    Usage:
+        ownership = FaderOwnership(9)
+        ownership.touch(3)
+        ownership.sent(3, 0.5)             # Level sent to EOS
+        ownership.eos_echo(3, 0.5)         # True, EOS reports our own level
+        ownership.release(3)
+        ownership.motor_move(3, 0.8)       # True, the motor may move
+        ownership.position_report(3, 0.8)  # True, the motor reached its target
+
+    Attributes:
+    - size: The number of faders, ids are 0 to size - 1.
+    - state: array('B'). IDLE, USER or MOTOR.
+    - target: array('d'). The level the motor travels to.
+    - sequence: array('L'). The sequence number of the last level sent to EOS.
+    """
+
+    __slots__ = ("size", "state", "target", "sequence", "_pending", "max_pending",
+                 "eos_echoes", "motor_echoes", "held", "superseded", "unexpected")
+
+    def __init__(self, size, max_pending=32):
+        """
+        Parameters:
+        - size: int. The number of faders.
+        - max_pending: int. The maximum number of levels awaiting their echo per fader, the oldest
+          are forgotten past it, e.g. when EOS does not report the levels. Defaults to 32.
+        """
+        self.size = size
+        self.state = array("B", bytes(size))
+        self.target = array("d", bytes(8 * size))
+        self.sequence = array("L", bytes(array("L").itemsize * size))
+        self._pending = [collections.deque() for _ in range(size)]
+        self.max_pending = max_pending
+        self.eos_echoes = 0
+        self.motor_echoes = 0
+        self.held = 0
+        self.superseded = 0
+        self.unexpected = 0
+
+    def reset(self):
+        """
+        Forget the motor moves in progress and the levels awaiting their echo, e.g. after a reset
+        of the device. Touched faders stay owned by the user.
+        """
+        for id in range(self.size):
+            if self.state[id] == MOTOR:
+                self.state[id] = IDLE
+            self.superseded += len(self._pending[id])
+            self._pending[id].clear()
+
+    def touch(self, id):
+        """
+        The user touches the fader, its position is the user's until released.
+        """
+        self.state[id] = USER
+
+    def release(self, id):
+        """
+        The user releases the fader.
+        """
+        self.state[id] = IDLE
+
+    def sent(self, id, value):
+        """
+        Record a level sent to EOS, awaiting its echo.
+
+        Parameters:
+        - id: int. The fader id.
+        - value: float. The level sent.
+
+        Returns:
+        - int: The sequence number of the level.
+        """
+        self.sequence[id] += 1
+        pending = self._pending[id]
+        if len(pending) >= self.max_pending:
+            pending.popleft()
+            self.superseded += 1
+        pending.append((self.sequence[id], value))
+        return self.sequence[id]
+
+    def eos_echo(self, id, value):
+        """
+        Check a level reported by EOS against the levels sent. The matching level and the older
+        ones are no longer pending. A level matching none of them was set on EOS, the levels sent
+        before are then stale and forgotten, unless the user still holds the fader.
+
+        Parameters:
+        - id: int. The fader id.
+        - value: float. The level reported.
+
+        Returns:
+        - bool: True if it is the echo of a level sent, to be ignored.
+        """
+        pending = self._pending[id]
+        for index, (_, level) in enumerate(pending):
+            if abs(level - value) <= LEVEL_TOLERANCE:
+                for _ in range(index + 1):
+                    pending.popleft()
+                self.superseded += index
+                self.eos_echoes += 1
+                return True
+        if self.state[id] != USER:
+            self.superseded += len(pending)
+            pending.clear()
+        return False
+
+    def motor_move(self, id, value):
+        """
+        Check whether the motor may move to a level sent by EOS.
+
+        Parameters:
+        - id: int. The fader id.
+        - value: float. The level.
+
+        Returns:
+        - bool: False while the user holds the fader, True otherwise and the fader is owned by the motor.
+        """
+        if self.state[id] == USER:
+            self.held += 1
+            return False
+        self.state[id] = MOTOR
+        self.target[id] = value
+        return True
+
+    def position_report(self, id, value):
+        """
+        Check a position reported by an untouched fader. The motor gives the fader back once on target.
+
+        Parameters:
+        - id: int. The fader id.
+        - value: float. The position.
+
+        Returns:
+        - bool: True if it is the echo of a motor move, False if the fader moved on its own.
+        """
+        if self.state[id] != MOTOR:
+            self.unexpected += 1
+            return False
+        self.motor_echoes += 1
+        if abs(value - self.target[id]) <= LEVEL_TOLERANCE:
+            self.state[id] = IDLE
+        return True
+
+    def pending(self, id):
+        """
+        Returns:
+        - list: The (sequence number, level) sent to EOS and not echoed yet, oldest first.
+        """
+        return list(self._pending[id])
+
+    def stats(self):
+        """
+        Returns:
+        - dict: {"eos_echoes", "motor_echoes", "held", "superseded", "unexpected", "pending"}. The echoes
+          suppressed from EOS and from the motors, the EOS levels held while touched, the levels sent
+          and never echoed, the untouched moves of idle faders, and the levels awaiting their echo.
+        """
+        return {"eos_echoes": self.eos_echoes, "motor_echoes": self.motor_echoes, "held": self.held,
+                "superseded": self.superseded, "unexpected": self.unexpected,
+                "pending": sum(len(pending) for pending in self._pending)}
+
+    def __len__(self):
+        return self.size
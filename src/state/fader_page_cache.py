@@ -0,0 +1,128 @@
+"""
+Last known names and levels of each page of a fader bank.
+
+When a page is opened again, the surface is drawn from the cache right away instead of
+waiting for EOS to send the names and levels, which then only correct what changed. The
+colours of the scribble strips follow from the names.
+
+Classes:
+- FaderPageCache: The names and levels of the pages of a fader bank, with hit and staleness counters.
+"""
+
+from array import array
+from state.fader_store import LEVEL_TOLERANCE
+
+# Bits of CachedPage.unconfirmed
+LEVEL = 1
+NAME = 2
+
+
+class CachedPage:
+    """
+    The names and levels of one page, indexed by fader id.
+
+    Attributes:
+    - levels: array('d'). The last level of each fader.
+    - known: array('B'). 1 if the level of the fader was received.
+    - names: list. The last name of each fader, None if not received.
+    - unconfirmed: array('B'). LEVEL and NAME bits of the values drawn from the cache and not yet confirmed by EOS.
+    """
+
+    __slots__ = ("levels", "known", "names", "unconfirmed")
+
+    def __init__(self, size):
+        self.levels = array("d", bytes(8 * size))
+        self.known = array("B", bytes(size))
+        self.names = [None] * size
+        self.unconfirmed = array("B", bytes(size))
+
+
+class FaderPageCache:
+    """
+    The names and levels of the pages of a fader bank, with hit and staleness counters.
+
+    Attributes:
+    - hits: The number of page changes drawn from the cache.
+    - misses: The number of page changes to a page never seen.
+    - stale: The number of names and levels drawn from the cache then corrected by EOS.
+    """
+
+    __slots__ = ("size", "_pages", "hits", "misses", "stale")
+
+    def __init__(self, width):
+        """
+        Parameters:
+        - width: int. The number of faders of the bank, ids are 1 to width.
+        """
+        self.size = width + 1
+        self._pages = {}
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def _page(self, page):
+        cached = self._pages.get(page)
+        if cached is None:
+            cached = self._pages[page] = CachedPage(self.size)
+        return cached
+
+    def store_level(self, page, id, value):
+        """
+        Remember the level of a fader, as sent by EOS.
+
+        Parameters:
+        - page: int. The page of the level.
+        - id: int. The fader id.
+        - value: float. The level.
+        """
+        cached = self._page(page)
+        if cached.unconfirmed[id] & LEVEL:
+            cached.unconfirmed[id] &= ~LEVEL
+            if abs(cached.levels[id] - value) > LEVEL_TOLERANCE:
+                self.stale += 1
+        cached.levels[id] = value
+        cached.known[id] = 1
+
+    def store_name(self, page, id, name):
+        """
+        Remember the name of a fader, as sent by EOS.
+
+        Parameters:
+        - page: int. The page of the name.
+        - id: int. The fader id.
+        - name: str. The name.
+        """
+        cached = self._page(page)
+        if cached.unconfirmed[id] & NAME:
+            cached.unconfirmed[id] &= ~NAME
+            if cached.names[id] != name:
+                self.stale += 1
+        cached.names[id] = name
+
+    def open(self, page):
+        """
+        Returns the cached names and levels of a page being opened, and count the hit or miss.
+
+        The values returned are marked unconfirmed, until EOS sends them again.
+
+        Parameters:
+        - page: int. The page.
+
+        Returns:
+        - CachedPage: The cached page, None if the page was never seen.
+        """
+        cached = self._pages.get(page)
+        if cached is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        cached.unconfirmed[:] = array("B", [known * LEVEL | (name is not None) * NAME
+                                            for known, name in zip(cached.known, cached.names)])
+        return cached
+
+    def stats(self):
+        """
+        Returns:
+        - dict: {"pages": int, "hits": int, "misses": int, "stale": int}.
+        """
+        return {"pages": len(self._pages), "hits": self.hits, "misses": self.misses, "stale": self.stale}
@@ -0,0 +1,99 @@
+"""
+Compact store of the fader state, one array per field.
+
+Faders are indexed by their integer id, and each field (level, touch, last motor move, last
+level sent, page) is a typed array instead of one Python object or dict entry per fader.
+Whole banks are compared in one pass over the arrays, so a page change or a resync only
+produces the motor and OSC updates of the faders that actually differ.
+
+Classes:
+- FaderStore: The state of a set of faders, indexed by fader id.
+"""
+
+from array import array
+
+# Levels closer than this are the same 8-bit EOS level, sending them would start a rounding loop
+LEVEL_TOLERANCE = 1 / 255.0
+
+
+class FaderStore:
+    """
+    The state of a set of faders, indexed by fader id.
+
+    Attributes:
+    - size: The number of faders, ids are 0 to size - 1.
+    - value: array('d'). The level of each fader, 0.0 to 1.0.
+    - touched: array('B'). 1 while the fader is touched.
+    - motor_time: array('d'). The time of the last motor move, 0.0 if never moved.
+    - sent: array('d'). The last level sent to or received from the other side.
+    - page: array('H'). The page the level belongs to, 0 if unknown.
+    """
+
+    __slots__ = ("size", "value", "touched", "motor_time", "sent", "page")
+
+    def __init__(self, size):
+        """
+        Parameters:
+        - size: int. The number of faders.
+        """
+        self.size = size
+        self.value = array("d", bytes(8 * size))
+        self.touched = array("B", bytes(size))
+        self.motor_time = array("d", bytes(8 * size))
+        self.sent = array("d", bytes(8 * size))
+        self.page = array("H", bytes(2 * size))
+
+    def diff(self, values, tolerance=LEVEL_TOLERANCE):
+        """
+        Compare the levels with other levels, in one pass.
+
+        Parameters:
+        - values: sequence of float. The other levels, indexed by fader id, e.g. the value array of another store.
+        - tolerance: float. Levels closer than this are equal. Defaults to LEVEL_TOLERANCE.
+
+        Returns:
+        - list: The ids of the faders whose level differs.
+        """
+        return [id for id, (a, b) in enumerate(zip(self.value, values)) if abs(a - b) > tolerance]
+
+    def unsent(self, tolerance=LEVEL_TOLERANCE):
+        """
+        Returns:
+        - list: The ids of the faders whose level differs from the last level sent.
+        """
+        return self.diff(self.sent, tolerance)
+
+    def update(self, values, page=0, tolerance=LEVEL_TOLERANCE):
+        """
+        Replace the levels of all the faders, e.g. with the levels of a new page.
+
+        Parameters:
+        - values: sequence of float. The new levels, indexed by fader id.
+        - page: int. The page the levels belong to. Defaults to 0.
+        - tolerance: float. Levels closer than this are left unchanged. Defaults to LEVEL_TOLERANCE.
+
+        Returns:
+        - list: The ids of the faders whose level changed.
+        """
+        changed = self.diff(values, tolerance)
+        current = self.value
+        for id in changed:
+            current[id] = values[id]
+        self.page[:] = array("H", [page]) * self.size
+        return changed
+
+    def snapshot(self):
+        """
+        Returns a copy of the store, unaffected by later changes.
+
+        Returns:
+        - FaderStore: The copy.
+        """
+        copy = FaderStore.__new__(FaderStore)
+        copy.size = self.size
+        for field in ("value", "touched", "motor_time", "sent", "page"):
+            setattr(copy, field, array(getattr(self, field).typecode, getattr(self, field)))
+        return copy
+
+    def __len__(self):
+        return self.size
@@ -0,0 +1,207 @@
+"""
+Single event-loop thread owning the state of the system.
+
+MIDI callbacks, OSC server threads and the GUI post their events to the reactor instead of
+calling the mapping engines directly. Posting never blocks, and the events are processed one
+at a time in arrival order on the reactor thread, so the StateManager, the mapping engines and
+the faders are only ever modified from that thread.
+
+Classes:
+- Reactor: Event loop processing posted events and timers on one thread.
+"""
+
+import heapq
+import itertools
+import queue
+import threading
+import time
+
+
+class _SourceMetrics:
+    __slots__ = ("events", "errors", "busy_ns", "max_busy_ns", "wait_ns", "max_wait_ns")
+
+    def __init__(self):
+        self.events = 0
+        self.errors = 0
+        self.busy_ns = 0
+        self.max_busy_ns = 0
+        self.wait_ns = 0
+        self.max_wait_ns = 0
+
+    def as_dict(self):
+        events = self.events or 1
+        return {"events": self.events, "errors": self.errors,
+                "avg_us": self.busy_ns / events / 1000, "max_us": self.max_busy_ns / 1000,
+                "avg_wait_us": self.wait_ns / events / 1000, "max_wait_us": self.max_wait_ns / 1000}
+
+
+class Reactor:
+    """
+    Event loop processing posted events and timers on one thread.
+
+    Attributes:
+    - logger: The logger object for logging messages.
+    - thread: The reactor thread, None until start() is called.
+    - event_posted_ns: The perf_counter_ns() timestamp at which the event being processed was posted.
+    """
+
+    def __init__(self, logger, name="x-eos-reactor"):
+        """
+        Initializes the reactor.
+
+        Args:
+        - logger: The logger object for logging messages.
+        - name: The name of the reactor thread. Defaults to "x-eos-reactor".
+        """
+        self.logger = logger
+        self.name = name
+        self.thread = None
+        # SimpleQueue.put never blocks and takes no Python level lock
+        self._queue = queue.SimpleQueue()
+        self._timers = []
+        self._timer_ids = itertools.count()
+        self._running = False
+        self._metrics = {}
+        self._max_depth = 0
+        self.event_posted_ns = 0
+
+    def post(self, source, callback, *args):
+        """
+        Queue a call to be run on the reactor thread. Can be called from any thread.
+
+        Args:
+        - source: The name of the event source, used for the metrics (e.g. "midi", "osc").
+        - callback: The function to call.
+        - args: The arguments of the call.
+        """
+        self._queue.put((source, callback, args, time.perf_counter_ns()))
+
+    def wrap(self, source, callback):
+        """
+        Returns a function posting its calls to the reactor, to be used as an I/O callback.
+
+        Args:
+        - source: The name of the event source.
+        - callback: The function to run on the reactor thread.
+        """
+        post = self._queue.put
+        perf_counter_ns = time.perf_counter_ns
+        def posted(*args):
+            post((source, callback, args, perf_counter_ns()))
+        return posted
+
+    def call_later(self, delay, callback, *args):
+        """
+        Run a call on the reactor thread after a delay. Can be called from any thread.
+
+        Args:
+        - delay: The delay in seconds.
+        - callback: The function to call.
+        - args: The arguments of the call.
+        """
+        deadline = time.monotonic() + delay
+        self.post(None, self._add_timer, deadline, None, callback, args)
+
+    def call_every(self, interval, callback, *args):
+        """
+        Run a call on the reactor thread periodically, until stop().
+
+        Args:
+        - interval: The period in seconds.
+        - callback: The function to call.
+        - args: The arguments of the call.
+        """
+        deadline = time.monotonic() + interval
+        self.post(None, self._add_timer, deadline, interval, callback, args)
+
+    def start(self):
+        """
+        Start the reactor thread.
+        """
+        self._running = True
+        self.thread = threading.Thread(target=self.run, name=self.name, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Stop the reactor thread once the events queued before the call are processed.
+
+        Args:
+        - timeout: The maximum time in seconds to wait for the thread. Defaults to None.
+        """
+        self.post(None, self._stop)
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout)
+
+    def run(self):
+        """
+        Process events and timers until stop(). Called by start() on the reactor thread.
+        """
+        self._running = True
+        get = self._queue.get
+        while self._running:
+            timeout = None
+            if self._timers:
+                timeout = max(self._timers[0][0] - time.monotonic(), 0)
+            try:
+                source, callback, args, posted = get(timeout=timeout)
+            except queue.Empty:
+                self._run_timers()
+                continue
+            if source is None:
+                callback(*args)
+            else:
+                self._process(source, callback, args, posted)
+            if self._timers and self._timers[0][0] <= time.monotonic():
+                self._run_timers()
+
+    def stats(self):
+        """
+        Returns the reactor metrics: queue depth and processing time per source.
+
+        Returns:
+        - dict: {"depth": int, "max_depth": int, "sources": {source: {...}}}.
+        """
+        return {"depth": self._queue.qsize(), "max_depth": self._max_depth,
+                "sources": {source: metrics.as_dict() for source, metrics in self._metrics.items()}}
+
+    def _process(self, source, callback, args, posted):
+        metrics = self._metrics.get(source)
+        if metrics is None:
+            metrics = self._metrics[source] = _SourceMetrics()
+        self.event_posted_ns = posted
+        start = time.perf_counter_ns()
+        try:
+            callback(*args)
+        except Exception as e:
+            metrics.errors += 1
+            self.logger.exception(f"Error processing {source} event: {e}")
+        end = time.perf_counter_ns()
+        busy = end - start
+        wait = start - posted
+        metrics.events += 1
+        metrics.busy_ns += busy
+        metrics.wait_ns += wait
+        if busy > metrics.max_busy_ns:
+            metrics.max_busy_ns = busy
+        if wait > metrics.max_wait_ns:
+            metrics.max_wait_ns = wait
+        depth = self._queue.qsize()
+        if depth > self._max_depth:
+            self._max_depth = depth
+
+    def _add_timer(self, deadline, interval, callback, args):
+        heapq.heappush(self._timers, (deadline, next(self._timer_ids), interval, callback, args))
+
+    def _run_timers(self):
+        now = time.monotonic()
+        while self._timers and self._timers[0][0] <= now:
+            deadline, _, interval, callback, args = heapq.heappop(self._timers)
+            self._process("timer", callback, args, time.perf_counter_ns())
+            if interval is not None:
+                # Keep the period without drifting, skipping missed ticks
+                deadline += interval * max(1, int((now - deadline) // interval) + 1)
+                heapq.heappush(self._timers, (deadline, next(self._timer_ids), interval, callback, args))
+
+    def _stop(self):
+        self._running = False
@@ -2,12 +2,16 @@
 Handles the central state of the system, acting as an intermediary between EOS and X-Touch mappings.
 """
 
-from observer import Subject 
+from observer import Subject, KeyPress, GoLive, GoBlind
+from utils.latency import tracker
+
+GO_LIVE = GoLive()
+GO_BLIND = GoBlind()
 
 class StateManager(Subject):
     """
-    Manages the internal state of the application and notifies observers of state changes.
-    Extends the Subject class to provide observer pattern functionality.
+    Manages the internal state of the application and publishes typed events on state changes.
+    Extends the Subject class to provide the event bus.
     """
 
     def __init__(self, logger=None):
@@ -15,8 +19,8 @@ class StateManager(Subject):
         Initializes the StateManager with default or initial state values.
         """
         super().__init__()  # Call the base class's constructor
+        # The fader state is kept in the FaderStore of the EOS fader banks and of the X-Touch
         self.state = {
-            'faders': {},
             'encoders': {},
             'keys': {},
             # ... any other initial state items based on EOS semantics
@@ -39,7 +43,7 @@ class StateManager(Subject):
         """
         #print("key pressed: ", key_name, value)
         self.state['keys'][key_name] = value
-        self.notify_observers({"type": "key_press", "key": key_name, "value": value})
+        self.publish(KeyPress(key_name, value))
 
     def goLive(self):
         """
@@ -48,7 +52,7 @@ class StateManager(Subject):
         if self.programmer_state == "LIVE":
             return
         self.programmer_state = "LIVE"
-        self.notify_observers({"type": "goLive"})
+        self.publish(GO_LIVE)
 
     def goBlind(self):
         """
@@ -57,16 +61,56 @@ class StateManager(Subject):
         if self.programmer_state == "BLIND":
             return
         self.programmer_state = "BLIND"
-        self.notify_observers({"type": "goBlind"})
+        self.publish(GO_BLIND)
 
     def eosMovesFader(self, fader):
         # self.logger.debug(f"EOS moves fader {fader.id} to {fader.value}")
+        tracker.mark("state")
+        self.xtouch.meters.set_level(fader.id, fader.value)
         if not fader.fired:
             self.xtouch.moveFader(fader.id, fader.value)
 
     def xtouchMovesFader(self, id, value):
         # self.logger.debug(f"X-Touch moves fader {id} to {value}")
-        self.eos.eos_fader_bank.get(id).setValue(value)
+        tracker.mark("state")
+        self.xtouch.meters.set_level(id, value)
+        if self.eos.eos_fader_bank.get(id).setValue(value):
+            # Awaiting its echo from EOS
+            self.xtouch.ownership.sent(id, value)
+
+    def isFaderEcho(self, id, value):
+        """
+        Check whether a level reported by EOS for an X-Touch fader is the echo of a level the X-Touch sent.
+
+        Args:
+        - id: The fader id.
+        - value: The level reported by EOS.
+
+        Returns:
+        - bool: True if it is an echo, to be ignored.
+        """
+        return id < len(self.xtouch.ownership) and self.xtouch.ownership.eos_echo(id, value)
+
+    def resyncFaders(self, all=False):
+        """
+        Move the X-Touch motors to the levels of the EOS fader bank, touched and fired faders excepted.
+
+        Args:
+        - all: Move every motor, e.g. when their positions are unknown. Defaults to False, only the
+          motors whose position differs from the EOS level are moved.
+
+        Returns:
+        - int: The number of motors moved.
+        """
+        bank = self.eos.eos_fader_bank
+        faders = self.xtouch.faders
+        ids = range(len(faders)) if all else bank.store.diff(faders.value)
+        moved = 0
+        for id in ids:
+            if 0 < id <= bank.width and id < len(faders) and not faders.touched[id] and not bank.faders[id - 1].fired:
+                self.xtouch.moveFader(id, bank.store.value[id])
+                moved += 1
+        return moved
 
     def namingfader(self,id,name): 
         #if id not in self.state['faders']:
@@ -74,8 +118,8 @@ class StateManager(Subject):
         #self.state['faders'][id]["name"] = name
         #self.state['faders'][id]["color"] = "yellow"
 
-        # fader out of range of the X-Touch
-        if id not in range(1,9):
+        # fader out of range of the X-Touch (and its Extenders)
+        if id not in range(1, self.xtouch.strips + 1):
             return
         
         split_name = name.split(" ")
@@ -107,8 +151,25 @@ class StateManager(Subject):
     def setFaderPage(self,page):
         self.eos.eos_fader_bank.setPage(page)
 
-    def jogWheel(self, value): 
-        self.eos.intens_wheel(value)
+    def jogWheel(self, detents):
+        self.eos.intens_wheel(detents)
+
+    def encoderTurned(self, encoder, detents):
+        self.eos.turn_encoder(encoder, detents)
+
+    def encoderValue(self, encoder, wheel, value, position, ring="dot"):
+        """
+        Show the value of the EOS wheel of an encoder, as sent by EOS.
+
+        Args:
+        - encoder: The encoder (V-Pot) number.
+        - wheel: The EOS wheel, e.g. "pan".
+        - value: The value of the wheel.
+        - position: The value in the range of the wheel, 0.0 to 1.0.
+        - ring: The ring display mode of the V-Pot. Defaults to "dot".
+        """
+        self.state['encoders'][encoder] = {"wheel": wheel, "value": value}
+        self.xtouch.setVpotRing(encoder, position, ring)
 
     def cue_playing(self, cueId, cueText, cueTime): 
         self.xtouch.set7segment(cueId+" "+cueTime)
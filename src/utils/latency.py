@@ -0,0 +1,218 @@
+"""
+Low overhead latency histograms for the MIDI -> OSC and OSC -> MIDI paths.
+
+An event is timestamped at ingress, then each stage it goes through (decode, state update,
+encode, send) records the time elapsed since the previous stage in a log-scale histogram.
+
+Classes:
+- LatencyHistogram: Log-scale histogram of durations in nanoseconds.
+- LatencyTracker: Per path and per stage histograms of the event being processed.
+
+The module level `tracker` is shared by the mapping engines and the communication clients.
+"""
+
+import threading
+import time
+
+SUB_BUCKETS = 4   # per power of two, i.e. about 19% resolution
+MAX_BUCKETS = 64 * SUB_BUCKETS
+STAGES = ("queue", "decode", "state", "encode", "send", "total")
+
+
+def _bucket(ns):
+    if ns < 2 * SUB_BUCKETS:
+        return max(ns, 0)
+    bits = ns.bit_length()
+    return min((bits - 2) * SUB_BUCKETS + ((ns >> (bits - 3)) & (SUB_BUCKETS - 1)), MAX_BUCKETS - 1)
+
+
+def _bucket_upper_bound(index):
+    if index < 2 * SUB_BUCKETS:
+        return index + 1
+    bits = index // SUB_BUCKETS + 2
+    return (SUB_BUCKETS + 1 + index % SUB_BUCKETS) << (bits - 3)
+
+
+class LatencyHistogram:
+    """
+    Log-scale histogram of durations in nanoseconds.
+
+    Attributes:
+    - count: The number of recorded durations.
+    - max: The largest recorded duration.
+    """
+    __slots__ = ("buckets", "count", "total", "max")
+
+    def __init__(self):
+        self.buckets = [0] * MAX_BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, ns):
+        """
+        Record a duration.
+
+        Args:
+        - ns: The duration in nanoseconds.
+        """
+        self.buckets[_bucket(ns)] += 1
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+
+    def percentile(self, p):
+        """
+        Returns the upper bound of the bucket holding the p-th percentile.
+
+        Args:
+        - p: The percentile, between 0 and 100.
+
+        Returns:
+        - int: The duration in nanoseconds, 0 if nothing was recorded.
+        """
+        if self.count == 0:
+            return 0
+        rank = max(1, int(self.count * p / 100.0 + 0.5))
+        seen = 0
+        for index, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(_bucket_upper_bound(index), self.max)
+        return self.max
+
+    def summary(self):
+        """
+        Returns:
+        - dict: {"count", "p50_us", "p99_us", "max_us", "avg_us"}.
+        """
+        return {"count": self.count,
+                "p50_us": self.percentile(50) / 1000, "p99_us": self.percentile(99) / 1000,
+                "max_us": self.max / 1000, "avg_us": self.total / self.count / 1000 if self.count else 0.0}
+
+
+class LatencyTracker:
+    """
+    Per path and per stage histograms of the event being processed.
+
+    Usage, on the thread processing the event:
+        tracker.begin("midi2osc")
+        tracker.mark("decode")
+        ...
+        tracker.end()
+
+    mark() calls outside of begin()/end(), or on another thread, are ignored.
+
+    Attributes:
+    - enabled: Whether events are traced at all.
+    - ingress: function() -> int. Returns the ingress timestamp of the event being processed.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.ingress = time.perf_counter_ns
+        self._histograms = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def begin(self, path):
+        """
+        Start tracing an event. The time elapsed since ingress is recorded as the "queue" stage.
+
+        Args:
+        - path: The name of the path, e.g. "midi2osc" or "osc2midi".
+        """
+        if not self.enabled:
+            return
+        local = self._local
+        local.path = path
+        local.start = self.ingress()
+        local.last = local.start
+        self.mark("queue")
+
+    def mark(self, stage):
+        """
+        Record the time elapsed since the previous stage of the current event.
+
+        Args:
+        - stage: The name of the stage that just finished, e.g. "decode", "state", "encode" or "send".
+        """
+        local = self._local
+        path = getattr(local, "path", None)
+        if path is None:
+            return
+        now = time.perf_counter_ns()
+        self._histogram(path, stage).record(now - local.last)
+        local.last = now
+
+    def end(self):
+        """
+        Stop tracing the current event and record its total latency.
+        """
+        local = self._local
+        path = getattr(local, "path", None)
+        if path is None:
+            return
+        self._histogram(path, "total").record(time.perf_counter_ns() - local.start)
+        local.path = None
+
+    def traced(self, path, callback):
+        """
+        Returns a function tracing each call of callback on the given path.
+
+        Args:
+        - path: The name of the path.
+        - callback: The function processing the event.
+        """
+        def traced_callback(*args):
+            self.begin(path)
+            try:
+                return callback(*args)
+            finally:
+                self.end()
+        return traced_callback
+
+    def summary(self):
+        """
+        Returns:
+        - dict: {path: {stage: LatencyHistogram.summary()}} for the stages seen so far.
+        """
+        with self._lock:
+            histograms = list(self._histograms.items())
+        order = {stage: i for i, stage in enumerate(STAGES)}
+        histograms.sort(key=lambda item: (item[0][0], order.get(item[0][1], len(STAGES))))
+        result = {}
+        for (path, stage), histogram in histograms:
+            result.setdefault(path, {})[stage] = histogram.summary()
+        return result
+
+    def log_summary(self, logger):
+        """
+        Log one line per path and stage with count, p50, p99 and max.
+
+        Args:
+        - logger: The logger object for logging messages.
+        """
+        for path, stages in self.summary().items():
+            for stage, s in stages.items():
+                logger.info(f"Latency {path}/{stage}: n={s['count']} p50={s['p50_us']:.0f}us "
+                            f"p99={s['p99_us']:.0f}us max={s['max_us']:.0f}us")
+
+    def reset(self):
+        """
+        Clear all histograms.
+        """
+        with self._lock:
+            self._histograms = {}
+
+    def _histogram(self, path, stage):
+        key = (path, stage)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, LatencyHistogram())
+        return histogram
+
+
+tracker = LatencyTracker()
@@ -0,0 +1,223 @@
+"""
+Non-blocking log pipeline.
+
+Loggers only put their records in a bounded queue, the console and GUI handlers run on a
+listener thread. The listener also aggregates repeated messages: a message logged again
+within `repeat_interval` seconds is counted instead of emitted, and a "repeated N times"
+record is emitted once the interval is over.
+
+Classes:
+- LogPipeline: Routes the records of a logger to its handlers through a listener thread.
+- RingBufferHandler: Keeps the last formatted lines for a consumer polling at its own rate (the GUI).
+"""
+
+import collections
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that never blocks: records are queued unformatted, and dropped when the queue is full.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # The record is handled by another thread of this process, nothing needs to be pickled,
+        # so formatting is left to the listener
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _AggregatingListener(logging.handlers.QueueListener):
+    """
+    QueueListener emitting repeated messages once per interval, with their repeat count.
+    """
+
+    def __init__(self, log_queue, handlers, repeat_interval, clock=time.monotonic):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.repeat_interval = repeat_interval
+        self._clock = clock
+        # (logger name, level, message) -> [time of the last emitted record, repeats since, last repeated record]
+        self._recent = {}
+        self._last_flush = clock()
+        self.suppressed = 0
+
+    def dequeue(self, block):
+        while True:
+            try:
+                return self.queue.get(block, timeout=self.repeat_interval if block else None)
+            except queue.Empty:
+                self.flush_repeats()
+                if not block:
+                    raise
+
+    def enqueue_sentinel(self):
+        # The queue may be full, wait for the listener to make room
+        self.queue.put(self._sentinel)
+
+    def handle(self, record):
+        if self.repeat_interval:
+            now = self._clock()
+            message = record.getMessage()
+            key = (record.name, record.levelno, message)
+            recent = self._recent.get(key)
+            if recent is not None and now - recent[0] < self.repeat_interval:
+                recent[1] += 1
+                recent[2] = record
+                self.suppressed += 1
+                return
+            if recent is not None and recent[1]:
+                self._emit_repeats(recent)
+            self._recent[key] = [now, 0, None]
+        super().handle(record)
+        if self.repeat_interval and now - self._last_flush >= self.repeat_interval:
+            self.flush_repeats()
+
+    def flush_repeats(self, force=False):
+        """
+        Emit the repeat count of the messages whose interval is over, or of all messages if force is True.
+        """
+        now = self._last_flush = self._clock()
+        for key, recent in list(self._recent.items()):
+            if force or now - recent[0] >= self.repeat_interval:
+                if recent[1]:
+                    self._emit_repeats(recent)
+                del self._recent[key]
+
+    def _emit_repeats(self, recent):
+        record = recent[2]
+        summary = logging.makeLogRecord(record.__dict__)
+        summary.msg = f"{record.getMessage()} (repeated {recent[1]} times)"
+        summary.args = None
+        summary.exc_info = None
+        summary.exc_text = None
+        super().handle(summary)
+
+
+class LogPipeline:
+    """
+    Routes the records of a logger to its handlers through a listener thread.
+
+    Usage:
+        pipeline = LogPipeline(logger, [console_handler])
+        pipeline.start()
+        ...
+        pipeline.stop()
+
+    Attributes:
+    - logger: The logger whose records are routed.
+    """
+
+    def __init__(self, logger, handlers=(), queue_size=10000, repeat_interval=1.0):
+        """
+        Args:
+        - logger: The logger whose records are routed. Its current handlers are kept as is.
+        - handlers: The handlers run on the listener thread.
+        - queue_size: The maximum number of records waiting for the listener, more are dropped. Defaults to 10000.
+        - repeat_interval: The time in seconds during which a repeated message is only counted,
+          0 to emit every record. Defaults to 1.0.
+        """
+        self.logger = logger
+        self._queue = queue.Queue(queue_size)
+        self._queue_handler = _DroppingQueueHandler(self._queue)
+        self._listener = _AggregatingListener(self._queue, handlers, repeat_interval)
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Start the listener thread and route the records of the logger to it.
+        """
+        self._listener.start()
+        self.logger.addHandler(self._queue_handler)
+
+    def stop(self):
+        """
+        Stop routing the records, and wait for the listener to handle the queued ones.
+        """
+        self.logger.removeHandler(self._queue_handler)
+        self._listener.stop()
+        self._listener.flush_repeats(force=True)
+
+    def add_handler(self, handler):
+        """
+        Add a handler to the listener thread. Can be called while the pipeline is running.
+
+        Args:
+        - handler: The logging.Handler.
+        """
+        with self._lock:
+            self._listener.handlers = self._listener.handlers + (handler,)
+
+    def remove_handler(self, handler):
+        """
+        Remove a handler added to the listener thread.
+
+        Args:
+        - handler: The logging.Handler.
+        """
+        with self._lock:
+            self._listener.handlers = tuple(h for h in self._listener.handlers if h is not handler)
+
+    def stats(self):
+        """
+        Returns:
+        - dict: {"queued": int, "dropped": int, "suppressed": int}. The records waiting, dropped
+          because the queue was full, and counted as repeats instead of emitted.
+        """
+        return {"queued": self._queue.qsize(), "dropped": self._queue_handler.dropped,
+                "suppressed": self._listener.suppressed}
+
+
+class RingBufferHandler(logging.Handler):
+    """
+    Keeps the last formatted lines for a consumer polling at its own rate (the GUI).
+
+    Attributes:
+    - dropped: The number of lines overwritten before being drained.
+    """
+
+    def __init__(self, capacity=1000):
+        """
+        Args:
+        - capacity: The maximum number of lines kept. Defaults to 1000.
+        """
+        super().__init__()
+        self._lines = collections.deque(maxlen=capacity)
+        self.dropped = 0
+
+    def emit(self, record):
+        try:
+            line = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        if len(self._lines) == self._lines.maxlen:
+            self.dropped += 1
+        self._lines.append(line)
+
+    def drain(self):
+        """
+        Returns the lines emitted since the previous call, oldest first.
+
+        Returns:
+        - list: The formatted lines.
+        """
+        lines = []
+        popleft = self._lines.popleft
+        try:
+            while True:
+                lines.append(popleft())
+        except IndexError:
+            return lines
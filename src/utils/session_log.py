@@ -0,0 +1,251 @@
+"""
+Compact append-only log of the MIDI and OSC traffic of a session, and its replayer.
+
+The file starts with a 24 byte header (magic, wall clock and monotonic time of creation),
+followed by records made of a 12 byte header (monotonic timestamp in nanoseconds, kind,
+port, payload length) and the raw MIDI bytes or OSC datagram. The port tells the MIDI
+devices apart when an X-Touch is chained with Extenders. Records are only ever appended, and
+the file is read through mmap so multi-hour captures can be scanned without loading them.
+
+Classes:
+- SessionRecorder: Appends MIDI messages and OSC datagrams to a session log.
+- SessionLog: Reads the records of a session log.
+- SessionReplayer: Feeds the records of a session log to handlers, in real time or as fast as possible.
+"""
+
+import mmap
+import os
+import struct
+import threading
+import time
+
+MAGIC = b"XEOSLOG2"  # 2: records carry the MIDI port
+FILE_HEADER = struct.Struct("<8sQQ")  # magic, time.time_ns(), time.monotonic_ns() at creation
+RECORD_HEADER = struct.Struct("<QBBH")  # monotonic timestamp ns, kind, port, payload length
+
+MIDI_IN = 1
+MIDI_OUT = 2
+OSC_IN = 3
+OSC_OUT = 4
+KIND_NAMES = {MIDI_IN: "midi_in", MIDI_OUT: "midi_out", OSC_IN: "osc_in", OSC_OUT: "osc_out"}
+
+MAX_PAYLOAD_SIZE = 0xFFFF
+
+
+class SessionRecorder:
+    """
+    Appends MIDI messages and OSC datagrams to a session log. Can be called from any thread.
+
+    Records are buffered, call flush() periodically to bound what a crash can lose.
+
+    Attributes:
+    - path: The path of the log file.
+    - records: The number of records written.
+    - truncated: The number of payloads cut to MAX_PAYLOAD_SIZE bytes.
+    """
+
+    def __init__(self, path, clock=time.monotonic_ns, buffer_size=64 * 1024):
+        """
+        Opens the log, creating it and its directory if needed.
+
+        Args:
+        - path: The path of the log file. An existing log is appended to.
+        - clock: function() -> int. The monotonic clock in nanoseconds. Defaults to time.monotonic_ns.
+        - buffer_size: The size of the write buffer in bytes. Defaults to 64 KiB.
+
+        Raises:
+        - ValueError: If the file exists and is not a session log.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._file = open(path, "ab", buffering=buffer_size)
+        if self._file.tell() == 0:
+            self._file.write(FILE_HEADER.pack(MAGIC, time.time_ns(), clock()))
+        else:
+            with open(path, "rb") as f:
+                if f.read(len(MAGIC)) != MAGIC:
+                    self._file.close()
+                    raise ValueError(f"Not a session log: {path}")
+        self.records = 0
+        self.truncated = 0
+
+    def record(self, kind, data, port=0):
+        """
+        Append a record timestamped now.
+
+        Args:
+        - kind: MIDI_IN, MIDI_OUT, OSC_IN or OSC_OUT.
+        - data: bytes. The raw MIDI message or OSC datagram.
+        - port: The index of the MIDI device (0-255). Defaults to 0.
+        """
+        timestamp = self._clock()
+        if len(data) > MAX_PAYLOAD_SIZE:
+            data = data[:MAX_PAYLOAD_SIZE]
+            self.truncated += 1
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(RECORD_HEADER.pack(timestamp, kind, port, len(data)) + data)
+            self.records += 1
+
+    def flush(self):
+        """
+        Write the buffered records to the file.
+        """
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+
+    def close(self):
+        """
+        Flush and close the log. Later records are ignored.
+        """
+        with self._lock:
+            self._file.close()
+
+
+class SessionLog:
+    """
+    Reads the records of a session log.
+
+    A record cut short by a crash at the end of the file is ignored.
+
+    Attributes:
+    - path: The path of the log file.
+    - created_ns: The wall clock time of creation, in nanoseconds since the epoch.
+    - created_monotonic_ns: The monotonic time of creation, the reference of the record timestamps.
+
+    Usage:
+        with SessionLog("session.xlog") as log:
+            for timestamp, kind, port, data in log.records(kinds=(OSC_IN,)):
+                ...
+    """
+
+    def __init__(self, path):
+        """
+        Maps the log in memory.
+
+        Args:
+        - path: The path of the log file.
+
+        Raises:
+        - ValueError: If the file is not a session log.
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < FILE_HEADER.size:
+                raise ValueError(f"Not a session log: {path}")
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.created_ns, self.created_monotonic_ns = FILE_HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self._map.close()
+            raise ValueError(f"Not a session log: {path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __iter__(self):
+        return self.records()
+
+    def records(self, kinds=None):
+        """
+        Iterates over the records in file order.
+
+        Args:
+        - kinds: The kinds of records to return, e.g. (MIDI_IN, OSC_IN). Defaults to all.
+
+        Yields:
+        - tuple: (timestamp ns, kind, port, payload bytes).
+        """
+        data = self._map
+        end = len(data)
+        offset = FILE_HEADER.size
+        unpack_from = RECORD_HEADER.unpack_from
+        header_size = RECORD_HEADER.size
+        while offset + header_size <= end:
+            timestamp, kind, port, length = unpack_from(data, offset)
+            start = offset + header_size
+            offset = start + length
+            if offset > end:
+                return
+            if kinds is None or kind in kinds:
+                yield timestamp, kind, port, data[start:offset]
+
+    def stats(self):
+        """
+        Returns the number of records of each kind and the time they span.
+
+        Returns:
+        - dict: {"records": {kind name: int}, "duration_s": float}.
+        """
+        counts = dict.fromkeys(KIND_NAMES.values(), 0)
+        first = last = None
+        for timestamp, kind, _, _ in self.records():
+            name = KIND_NAMES.get(kind, str(kind))
+            counts[name] = counts.get(name, 0) + 1
+            if first is None:
+                first = timestamp
+            last = timestamp
+        return {"records": counts, "duration_s": (last - first) / 1e9 if first is not None else 0.0}
+
+    def close(self):
+        """
+        Unmaps the log.
+        """
+        self._map.close()
+
+
+class SessionReplayer:
+    """
+    Feeds the records of a session log to handlers, in real time or as fast as possible.
+
+    Only the kinds with a handler are replayed, typically MIDI_IN and OSC_IN, so the mapping
+    engines produce the outputs again.
+    """
+
+    def __init__(self, log, handlers, speed=1.0, clock=time.monotonic_ns, sleep=time.sleep):
+        """
+        Args:
+        - log: SessionLog. The log to replay.
+        - handlers: {kind: function(bytes, port)}. The handler of each kind of record to replay.
+        - speed: The replay speed, 1.0 for real time, None as fast as possible. Defaults to 1.0.
+        - clock: function() -> int. The monotonic clock in nanoseconds. Defaults to time.monotonic_ns.
+        - sleep: function(seconds). Waits for the given time. Defaults to time.sleep.
+        """
+        if speed is not None and speed <= 0:
+            raise ValueError(f"Invalid replay speed: {speed}")
+        self.log = log
+        self.handlers = handlers
+        self.speed = speed
+        self._clock = clock
+        self._sleep = sleep
+
+    def replay(self):
+        """
+        Replay the log, blocking until its end.
+
+        Returns:
+        - dict: {kind name: int}. The number of records replayed of each kind.
+        """
+        counts = {KIND_NAMES.get(kind, str(kind)): 0 for kind in self.handlers}
+        handlers = self.handlers
+        speed = self.speed
+        first = start = None
+        for timestamp, kind, port, data in self.log.records(kinds=tuple(handlers)):
+            if speed is not None:
+                if first is None:
+                    first, start = timestamp, self._clock()
+                delay = start + (timestamp - first) / speed - self._clock()
+                if delay > 0:
+                    self._sleep(delay / 1e9)
+            handlers[kind](data, port)
+            counts[KIND_NAMES.get(kind, str(kind))] += 1
+        return counts
@@ -0,0 +1,65 @@
+import time
+from communication.midi_scheduler import MIDIOutputScheduler, classify_mcu, MOTOR, LED, SEGMENT, SCRIBBLE, SYSTEM, METER
+
+def submit_hex(scheduler, message):
+    data = bytes.fromhex(message)
+    priority, key = classify_mcu(data)
+    return scheduler.submit(message, len(data), priority, key)
+
+def test_classify_mcu():
+    assert classify_mcu(bytes.fromhex("E3 00 40")) == (MOTOR, 0xE3)
+    assert classify_mcu(bytes.fromhex("90 00 7F")) == (LED, (0x90, 0x00))
+    assert classify_mcu(bytes.fromhex("B0 4A 30")) == (SEGMENT, (0xB0, 0x4A))
+    assert classify_mcu(bytes.fromhex("F0 00 00 66 14 12 07 41 42 F7")) == (SCRIBBLE, (0x12, 0x07, 10))
+    assert classify_mcu(bytes.fromhex("F0 00 00 66 14 63 F7")) == (SYSTEM, None)
+    assert classify_mcu(bytes.fromhex("D0 2C")) == (METER, None)
+
+def test_priority_order_and_supersede():
+    written = []
+    scheduler = MIDIOutputScheduler(written.append)
+    for message in ["F0 00 00 66 14 12 00 41 F7", "B0 4A 30", "90 00 7F", "E0 00 00", "90 00 00", "E0 7F 7F"]:
+        submit_hex(scheduler, message)
+    scheduler.start()
+    scheduler.stop()
+    assert written == ["E0 7F 7F", "90 00 00", "B0 4A 30", "F0 00 00 66 14 12 00 41 F7"]
+    stats = scheduler.stats()
+    assert (stats["motor"]["sent"], stats["motor"]["merged"], stats["led"]["merged"]) == (1, 1, 1)
+
+def test_full_queue_drops_lower_classes_first():
+    written = []
+    scheduler = MIDIOutputScheduler(written.append, max_queued=2)
+    submit_hex(scheduler, "F0 00 00 66 14 12 00 41 F7")
+    submit_hex(scheduler, "90 00 7F")
+    assert submit_hex(scheduler, "E0 00 00")
+    assert not submit_hex(scheduler, "B0 4A 30")
+    scheduler.start()
+    scheduler.stop()
+    assert written == ["E0 00 00", "90 00 7F"]
+    stats = scheduler.stats()
+    assert (stats["scribble"]["dropped"], stats["segment"]["dropped"]) == (1, 1)
+
+def test_byte_rate_budget():
+    written = []
+    scheduler = MIDIOutputScheduler(written.append, byte_rate=3000, burst=0.001)
+    for led in range(30):
+        submit_hex(scheduler, f"90 {led:02X} 7F")
+    start = time.monotonic()
+    scheduler.start()
+    scheduler.stop(timeout=5)
+    # 90 bytes at 3000 bytes/s, 3 of them in the initial burst
+    assert len(written) == 30
+    assert time.monotonic() - start >= 0.025
+
+def test_stop_discards_what_is_left_after_the_timeout():
+    written = []
+    scheduler = MIDIOutputScheduler(written.append, byte_rate=300, burst=0.01)
+    for led in range(30):
+        submit_hex(scheduler, f"90 {led:02X} 7F")
+    scheduler.start()
+    writer = scheduler._thread
+    # 90 bytes at 300 bytes/s would take 0.3 s
+    discarded = scheduler.stop(timeout=0.05)
+    assert discarded > 0 and len(written) + discarded == 30
+    # Nothing is written once stop() returned, the port may be closed
+    assert not writer.is_alive()
+    assert scheduler.stats()["led"]["dropped"] == discarded
@@ -0,0 +1,44 @@
+import logging
+import socket
+from pythonosc.osc_bundle import OscBundle
+from pythonosc.osc_message import OscMessage
+from communication.osc_comm import OSCClient
+
+def make_client(**kwargs):
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(("127.0.0.1", 0))
+    receiver.settimeout(1)
+    client = OSCClient(logging.getLogger("X-EOS-test"), port=receiver.getsockname()[1], **kwargs)
+    return client, receiver
+
+def test_batch_is_sent_per_call_by_default():
+    client, receiver = make_client()
+    with client.batch():
+        client.send_message("/eos/user/1/key/live", 1)
+        client.send_message("/eos/user/1/key/live", 0)
+    assert client.datagrams_sent == 2
+    assert OscMessage(receiver.recv(2048)).params == [1]
+    receiver.close()
+
+def test_batch_is_sent_as_one_bundle():
+    client, receiver = make_client(bundle=True)
+    with client.batch():
+        client.send_message("/eos/user/1/key/live", 1)
+        with client.batch():
+            client.send_message("/eos/user/1/key/live", 0)
+        assert client.datagrams_sent == 0
+    assert client.datagrams_sent == 1
+    bundle = OscBundle(receiver.recv(2048))
+    assert [(m.address, m.params) for m in bundle] == [("/eos/user/1/key/live", [1]), ("/eos/user/1/key/live", [0])]
+    receiver.close()
+
+def test_bundles_stay_under_size_cap():
+    client, receiver = make_client(bundle=True, max_bundle_size=200)
+    with client.batch():
+        for i in range(20):
+            client.send_message(f"/eos/user/1/fader/1/{i}", 0.5)
+    assert client.messages_sent == 20
+    assert client.datagrams_sent > 1
+    for _ in range(client.datagrams_sent):
+        assert len(receiver.recv(2048)) <= 200
+    receiver.close()
@@ -0,0 +1,45 @@
+import threading
+from unittest.mock import MagicMock
+from communication.osc_rate_limiter import OSCRateLimiter
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_first_update_is_sent_immediately():
+    osc = MagicMock()
+    limiter = OSCRateLimiter(osc, rate=100, clock=FakeClock())
+    limiter.send_message("/eos/user/1/fader/1/1", 0.5)
+    osc.send_message.assert_called_once_with("/eos/user/1/fader/1/1", 0.5)
+    assert limiter.stats() == {"sent": 1, "coalesced": 0, "pending": 0}
+
+def test_burst_keeps_latest_value():
+    osc = MagicMock()
+    clock = FakeClock()
+    limiter = OSCRateLimiter(osc, rate=100, clock=clock)
+    limiter.send_message("/eos/user/1/fader/1/1", 0.1)
+    for value in (0.2, 0.3, 0.4):
+        clock.now += 0.001
+        limiter.send_message("/eos/user/1/fader/1/1", value)
+    # Another fader is not affected by the first one
+    limiter.send_message("/eos/user/1/fader/1/2", 0.9)
+    assert limiter.stats() == {"sent": 2, "coalesced": 2, "pending": 1}
+
+    limiter.flush()
+    assert osc.send_message.call_args_list[-1].args == ("/eos/user/1/fader/1/1", 0.4)
+    assert limiter.stats() == {"sent": 3, "coalesced": 2, "pending": 0}
+
+def test_final_value_is_sent_by_output_thread():
+    osc = MagicMock()
+    final_sent = threading.Event()
+    osc.send_message.side_effect = lambda address, value: value == 49 / 50 and final_sent.set()
+    limiter = OSCRateLimiter(osc, rate=200)
+    for i in range(50):
+        limiter.send_message("/eos/user/1/fader/1/1", i / 50)
+    # Sent by the output thread, not by stop() which flushes the pending values
+    assert final_sent.wait(5)
+    assert limiter.stats()["pending"] == 0
+    limiter.stop()
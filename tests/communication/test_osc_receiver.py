@@ -0,0 +1,121 @@
+import logging
+import socket
+import threading
+import time
+from pythonosc.osc_message_builder import OscMessageBuilder
+from communication import osc_receiver
+from communication.osc_receiver import OSCReceiver
+from communication.osc_comm import OSCClient
+
+def build(address, value):
+    builder = OscMessageBuilder(address=address)
+    builder.add_arg(value)
+    return builder.build().dgram
+
+def wait_for(condition, timeout=1.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+def test_messages_are_dispatched_in_order_on_one_thread():
+    received = []
+    threads = set()
+
+    def callback(address, *args):
+        received.append((address, args))
+        threads.add(threading.get_ident())
+
+    receiver = OSCReceiver(("127.0.0.1", 0), callback, logging.getLogger("X-EOS-test"))
+    server_thread = threading.Thread(target=receiver.serve_forever, kwargs={"poll_interval": 0.05})
+    server_thread.start()
+
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    for i in range(100):
+        sender.sendto(build("/eos/fader/1/1", i), receiver.server_address)
+    assert wait_for(lambda: len(received) == 100)
+
+    receiver.shutdown()
+    server_thread.join()
+    sender.close()
+    assert [args[0] for _, args in received] == list(range(100))
+    assert len(threads) == 1
+    stats = receiver.stats()
+    assert stats["received"] == 100 and stats["dropped"] == 0 and stats["dispatched"] == 100
+
+def test_full_queue_drops_oldest_datagrams():
+    release = threading.Event()
+    dispatched = []
+
+    def callback(address, *args):
+        release.wait()
+        dispatched.append(args[0])
+
+    receiver = OSCReceiver(("127.0.0.1", 0), callback, logging.getLogger("X-EOS-test"), queue_size=2)
+    server_thread = threading.Thread(target=receiver.serve_forever, kwargs={"poll_interval": 0.05})
+    server_thread.start()
+
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    for i in range(10):
+        sender.sendto(build("/eos/fader/1/1", i), receiver.server_address)
+    assert wait_for(lambda: receiver.received == 10)
+    release.set()
+    receiver.shutdown()
+    server_thread.join()
+    sender.close()
+    # At most one datagram being dispatched and two queued
+    assert receiver.dropped >= 7
+    assert receiver.dropped + receiver.dispatched == 10
+    # The latest level is kept
+    assert dispatched[-2:] == [8, 9]
+
+socket_class = socket.socket
+
+class FlakySocket:
+    """A socket whose first recv() fails as on Windows after an ICMP port unreachable."""
+
+    def __init__(self, *args):
+        self._socket = socket_class(*args)
+        self.failed = False
+
+    def recv(self, size):
+        if not self.failed:
+            self.failed = True
+            raise ConnectionResetError("An existing connection was forcibly closed by the remote host")
+        return self._socket.recv(size)
+
+    def __getattr__(self, name):
+        return getattr(self._socket, name)
+
+def test_receive_error_keeps_serving_on_the_same_port(monkeypatch):
+    free = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    free.bind(("127.0.0.1", 0))
+    port = free.getsockname()[1]
+    free.close()
+    received = []
+    monkeypatch.setattr(osc_receiver.socket, "socket", FlakySocket)
+    client = OSCClient(logging.getLogger("X-EOS-test"), server="single")
+    server_thread = threading.Thread(target=client.start_server,
+                                     args=("/eos", lambda address, *args: received.append(args[0]), port), daemon=True)
+    server_thread.start()
+    assert client.server_ready.wait(1)
+    monkeypatch.setattr(osc_receiver.socket, "socket", socket_class)
+
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sender.sendto(build("/eos/fader/1/1", 1), ("127.0.0.1", port))
+    assert wait_for(lambda: received == [1])
+    client.stop_server()
+    server_thread.join(2)
+    sender.close()
+    assert client._server.server_address[1] == port
+    assert client._server.stats()["errors"] == 1
+
+def test_shutdown_before_serving():
+    receiver = OSCReceiver(("127.0.0.1", 0), lambda address, *args: None, logging.getLogger("X-EOS-test"))
+    receiver.shutdown()
+    server_thread = threading.Thread(target=receiver.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    server_thread.start()
+    server_thread.join(1)
+    # Returns at once, without receiving on the closed socket
+    assert not server_thread.is_alive()
+    assert receiver.stats()["errors"] == 0
@@ -0,0 +1,31 @@
+from communication.osc_router import OSCRouter
+
+def test_exact_and_parameter_routes():
+    calls = []
+    router = OSCRouter()
+    router.add_route("/eos/out/cmd", lambda args: calls.append(("cmd", args)))
+    router.add_route("/eos/fader/{bank}/{n}", lambda bank, n, args: calls.append(("fader", bank, n, args)))
+    router.add_route("/eos/out/fader/{bank}/{n}/name", lambda bank, n, args: calls.append(("name", bank, n, args)))
+
+    assert router.dispatch("/eos/out/cmd", "LIVE: ")
+    assert router.dispatch("/eos/fader/1/10", 0.5)
+    assert router.dispatch("/eos/out/fader/2/3/name", "S 1 Wash")
+    assert calls == [("cmd", ("LIVE: ",)), ("fader", 1, 10, (0.5,)), ("name", 2, 3, ("S 1 Wash",))]
+
+def test_unsubscribed_addresses_are_rejected():
+    router = OSCRouter()
+    router.add_route("/eos/fader/{bank}/{n}", lambda bank, n, args: None)
+    assert not router.dispatch("/eos/out/active/chan", "1")
+    assert not router.dispatch("/eos/fader/1", 0.5)
+    assert not router.dispatch("/eos/fader/1/x", 0.5)
+    assert not router.dispatch("/eos/fader/1/2/3", 0.5)
+    assert router.stats() == {"hits": {"/eos/fader/{bank}/{n}": 0}, "misses": 4}
+
+def test_hit_counters():
+    router = OSCRouter()
+    router.add_route("/eos/out/cmd", lambda args: None)
+    router.add_route("/eos/fader/{bank}/{n}", lambda bank, n, args: None)
+    for n in range(1, 11):
+        router.dispatch(f"/eos/fader/1/{n}", 0.0)
+    router.dispatch("/eos/out/cmd", "")
+    assert router.stats()["hits"] == {"/eos/out/cmd": 1, "/eos/fader/{bank}/{n}": 10}
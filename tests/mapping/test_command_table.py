@@ -0,0 +1,42 @@
+import pytest
+from mapping.command_table import CommandTable
+
+COMMANDS = {
+    "Rec/Rdy 1": "FADER_PAGE_1",
+    "Fader Bank Left": "FADER_PAGE_PREV",
+    "Shift": "LAYER_SHIFT",
+    "F1": "",
+    "layers": {
+        "SHIFT": {"Fader Bank Left": "FADER_PAGE_1"},
+    },
+}
+
+def make_table():
+    calls = []
+    table = CommandTable(COMMANDS, lambda command: lambda value: calls.append((command, value)))
+    return table, calls
+
+def test_base_layer():
+    table, calls = make_table()
+    assert table.press("Rec/Rdy 1")
+    assert table.release("Rec/Rdy 1")
+    assert not table.press("F1")
+    assert not table.press("Unknown")
+    assert calls == [("FADER_PAGE_1", 1), ("FADER_PAGE_1", 0)]
+    assert table.commands() == ["FADER_PAGE_1", "FADER_PAGE_PREV"]
+
+def test_momentary_layer():
+    table, calls = make_table()
+    table.press("Shift")
+    assert table.layer == "SHIFT"
+    table.press("Fader Bank Left")
+    # Releasing shift first does not change the action released
+    table.release("Shift")
+    assert table.layer == "BASE"
+    table.release("Fader Bank Left")
+    table.press("Fader Bank Left")
+    assert calls == [("FADER_PAGE_1", 1), ("FADER_PAGE_1", 0), ("FADER_PAGE_PREV", 1)]
+
+def test_unknown_layer():
+    with pytest.raises(ValueError):
+        CommandTable({"Shift": "LAYER_FLIP"}, lambda command: None)
@@ -0,0 +1,186 @@
+import logging
+from unittest.mock import MagicMock
+from mapping.eos_mapping_engine import EOSMappingEngine
+from state.state_manager import StateManager
+from state.fader_store import FaderStore
+from state.fader_ownership import FaderOwnership
+
+def make_engine():
+    state_manager = MagicMock()
+    state_manager.isFaderEcho.return_value = False
+    engine = EOSMappingEngine(logging.getLogger("X-EOS-test"), osc_client=MagicMock(), state_manager=state_manager)
+    return engine, state_manager
+
+def test_fader_level_moves_xtouch_fader():
+    engine, state_manager = make_engine()
+    engine.eos_osc_handler("/eos/fader/1/3", 0.75)
+    fader = engine.eos_fader_bank.get(3)
+    assert fader.value == 0.75
+    state_manager.eosMovesFader.assert_called_once_with(fader)
+
+    # Same level within rounding is not sent back
+    engine.eos_osc_handler("/eos/fader/1/3", 0.751)
+    state_manager.eosMovesFader.assert_called_once()
+
+def test_fader_name_and_cmd():
+    engine, state_manager = make_engine()
+    engine.eos_osc_handler("/eos/out/fader/1/2/name", "S 12 Wash")
+    assert engine.eos_fader_bank.get(2).name == "S 12 Wash"
+    state_manager.namingfader.assert_called_once_with(2, "S 12 Wash")
+
+    engine.eos_osc_handler("/eos/out/cmd", "BLIND: Chan 1")
+    state_manager.goBlind.assert_called_once()
+
+def test_ignored_addresses():
+    engine, state_manager = make_engine()
+    engine.eos_osc_handler("/eos/out/active/chan", "1")
+    engine.eos_osc_handler("/eos/fader/2/1", 0.5)
+    state_manager.eosMovesFader.assert_not_called()
+    assert engine.osc_router.stats()["misses"] == 1
+
+def test_key_press_events():
+    engine, state_manager = make_engine()
+    osc = engine._osc_client
+    bus = StateManager(logging.getLogger("X-EOS-test"))
+    engine.subscribe_to(bus)
+    bus.key_pressed("EOS_LIVE", 1)
+    osc.send_message.assert_called_with("/eos/user/1/key/LIVE", 1)
+    bus.key_pressed("FADER_PAGE_3", 0)
+    assert engine.eos_fader_bank.active_page == 3
+
+def test_compiled_fader_actions():
+    engine, state_manager = make_engine()
+    bus = StateManager(logging.getLogger("X-EOS-test"))
+    engine.subscribe_to(bus)
+    bus.key_pressed("FADERB_3_FIRE", 1)
+    engine._osc_client.send_message.assert_called_with("/eos/user/1/fader/1/3/fire", 1)
+    assert engine.eos_fader_bank.get(3).fired == 1
+    bus.key_pressed("FADERB_2_LOAD", 0)
+    engine._osc_client.send_message.assert_called_with("/eos/user/1/fader/1/2/load", 0)
+    assert set(engine.key_actions) == {"FADERB_3_FIRE", "FADERB_2_LOAD"}
+
+def test_several_fader_banks():
+    state_manager = MagicMock()
+    engine = EOSMappingEngine(logging.getLogger("X-EOS-test"), osc_client=MagicMock(), state_manager=state_manager,
+                              user=3, fader_banks=[{"id": 1, "width": 10}, {"id": 4, "width": 20}])
+    subs = engine.fader_banks[4]
+    engine.eos_osc_handler("/eos/fader/4/15", 0.5)
+    engine.eos_osc_handler("/eos/out/fader/4/15/name", "S 15")
+    engine.eos_osc_handler("/eos/fader/4/21", 0.5)  # Out of the bank
+    assert (subs.get(15).value, subs.get(15).name) == (0.5, "S 15")
+    assert engine.eos_fader_bank.get(5).value == 0.0
+    # Only the first bank follows the X-Touch
+    state_manager.eosMovesFader.assert_not_called()
+    state_manager.namingfader.assert_not_called()
+
+    engine.compile_key_action("FADERB4_15_FIRE")(1)
+    engine._osc_client.send_message.assert_called_with("/eos/user/3/fader/4/15/fire", 1)
+    engine.compile_key_action("FADERB4_PAGE_2")(0)
+    engine._osc_client.send_message.assert_called_with("/eos/user/3/fader/4/config/2/20", 1)
+    assert (subs.active_page, engine.eos_fader_bank.active_page) == (2, 0)
+
+def test_resync_moves_only_differing_motors():
+    engine, _ = make_engine()
+    bus = StateManager(logging.getLogger("X-EOS-test"))
+    xtouch = MagicMock()
+    xtouch.faders = FaderStore(9)
+    xtouch.faders.value[4] = 0.5
+    xtouch.faders.touched[3] = 1
+    bus.eos, bus.xtouch = engine, xtouch
+    engine.eos_fader_bank.get(2).value = 0.25
+    engine.eos_fader_bank.get(3).value = 0.25
+    engine.eos_fader_bank.get(4).value = 0.5
+    assert bus.resyncFaders() == 1
+    xtouch.moveFader.assert_called_once_with(2, 0.25)
+    assert bus.resyncFaders(all=True) == 7
+
+def test_page_change_draws_cached_page():
+    engine, state_manager = make_engine()
+    for page in (1, 2):
+        engine.eos_fader_bank.setPage(page)
+        engine.eos_osc_handler("/eos/out/fader/1", str(page))
+        engine.eos_osc_handler("/eos/out/fader/1/1/name", f"S {page}")
+        engine.eos_osc_handler("/eos/fader/1/1", page / 4)
+        engine.eos_osc_handler("/eos/fader/1/2", 0.5)
+    state_manager.reset_mock()
+
+    engine.eos_fader_bank.setPage(1)
+    # Drawn before EOS answers, fader 2 is at the same level on both pages
+    state_manager.faderPageChanged.assert_called_once_with(1)
+    state_manager.namingfader.assert_called_once_with(1, "S 1")
+    state_manager.eosMovesFader.assert_called_once_with(engine.eos_fader_bank.get(1))
+    assert engine.eos_fader_bank.get(1).value == 0.25
+
+    # EOS answers with the same page, nothing else to draw
+    engine.eos_osc_handler("/eos/out/fader/1", "1")
+    engine.eos_osc_handler("/eos/fader/1/1", 0.25)
+    state_manager.eosMovesFader.assert_called_once()
+    assert engine.eos_fader_bank.page_cache.stats() == {"pages": 2, "hits": 1, "misses": 2, "stale": 0}
+
+def test_jog_wheel_is_sent_per_tick():
+    scheduled = []
+    osc = MagicMock()
+    engine = EOSMappingEngine(logging.getLogger("X-EOS-test"), osc_client=osc, state_manager=MagicMock(), user=2,
+                              schedule=lambda delay, callback: scheduled.append(callback))
+    engine.intens_wheel(1)
+    engine.intens_wheel(1)
+    osc.send_message.assert_not_called()
+    scheduled[0]()
+    # Two detents in a row are accelerated, in one message
+    address, value = osc.send_message.call_args[0]
+    osc.send_message.assert_called_once()
+    assert address == "/eos/user/2/wheel/intens" and value >= 2.0
+
+def test_encoders_turn_wheels_and_follow_feedback():
+    scheduled = []
+    osc = MagicMock()
+    state_manager = MagicMock()
+    engine = EOSMappingEngine(logging.getLogger("X-EOS-test"), osc_client=osc, state_manager=state_manager,
+                              schedule=lambda delay, callback: scheduled.append(callback),
+                              encoders=[{"wheel": "pan", "min": -270, "max": 270}, None, {"wheel": "red", "ring": "wrap"}])
+    engine.turn_encoder(1, -1)
+    engine.turn_encoder(3, 1)
+    engine.turn_encoder(2, 1)  # Unused encoder
+    scheduled[0]()
+    assert sorted(c.args[0] for c in osc.send_message.call_args_list) == ["/eos/user/1/wheel/pan", "/eos/user/1/wheel/red"]
+
+    osc.reset_mock()
+    engine.eos_osc_handler("/eos/out/active/wheel/3", "Pan  [135.00]", 2, 135.0)
+    engine.eos_osc_handler("/eos/out/active/wheel/7", "Red  [50]")
+    engine.eos_osc_handler("/eos/out/active/wheel/8", "Tilt  [10]", 2, 10.0)
+    assert [c.args for c in state_manager.encoderValue.call_args_list] == [
+        (1, "pan", 135.0, 0.75, "dot"), (3, "red", 50.0, 0.5, "wrap")]
+    # The feedback is never sent back to EOS
+    osc.send_message.assert_not_called()
+
+def test_echoes_of_xtouch_levels_never_move_the_motor():
+    bus = StateManager(logging.getLogger("X-EOS-test"))
+    engine = EOSMappingEngine(logging.getLogger("X-EOS-test"), osc_client=MagicMock(), state_manager=bus)
+    xtouch = MagicMock()
+    xtouch.ownership = FaderOwnership(9)
+    bus.eos, bus.xtouch = engine, xtouch
+    xtouch.ownership.touch(2)
+    bus.xtouchMovesFader(2, 0.5)
+    bus.xtouchMovesFader(2, 0.6)
+    # The late echo of the first level is not a move back to 0.5
+    engine.eos_osc_handler("/eos/fader/1/2", 0.5)
+    engine.eos_osc_handler("/eos/fader/1/2", 0.6)
+    xtouch.moveFader.assert_not_called()
+    assert engine.eos_fader_bank.get(2).value == 0.6
+    engine.eos_osc_handler("/eos/fader/1/2", 0.2)  # Moved on the console
+    xtouch.moveFader.assert_called_once_with(2, 0.2)
+    assert xtouch.ownership.stats()["eos_echoes"] == 2
+
+def test_console_move_back_to_an_old_level_moves_the_motor():
+    bus = StateManager(logging.getLogger("X-EOS-test"))
+    engine = EOSMappingEngine(logging.getLogger("X-EOS-test"), osc_client=MagicMock(), state_manager=bus)
+    xtouch = MagicMock()
+    xtouch.ownership = FaderOwnership(9)
+    bus.eos, bus.xtouch = engine, xtouch
+    xtouch.ownership.touch(2)
+    for value in (0.3, 0.5, 0.7):
+        bus.xtouchMovesFader(2, value)
+    xtouch.ownership.release(2)
+    engine.eos_osc_handler("/eos/fader/1/2", 0.69)
+    engine.eos_osc_handler("/eos/fader/1/2", 0.3)
+    assert [c.args for c in xtouch.moveFader.call_args_list] == [(2, 0.69), (2, 0.3)]
@@ -0,0 +1,56 @@
+import pytest
+from unittest.mock import MagicMock
+from mapping.wheel_engine import WheelEngine, AccelerationCurve
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def make_engine(curve=None):
+    clock = FakeClock()
+    scheduled = []
+    osc = MagicMock()
+    engine = WheelEngine(osc, schedule=lambda delay, callback: scheduled.append(callback), clock=clock)
+    engine.add_wheel("intens", "/eos/user/1/wheel/intens", curve)
+    return engine, osc, clock, scheduled
+
+def test_curve():
+    curve = AccelerationCurve()
+    assert curve(5) == 1.0
+    assert curve(110) == pytest.approx(2.0)
+    assert curve(10000) == 20.0
+    assert AccelerationCurve.from_settings({"exponent": 2})(20) == pytest.approx(2.0)
+
+def test_turns_are_sent_once_per_tick():
+    engine, osc, clock, scheduled = make_engine()
+    for _ in range(5):
+        engine.turn("intens", 1)
+        clock.now += 0.5
+    engine.turn("intens", -2)
+    assert len(scheduled) == 1
+    osc.send_message.assert_not_called()
+
+    assert scheduled[0]() == 1
+    osc.send_message.assert_called_once_with("/eos/user/1/wheel/intens", 3.0)
+    # Nothing turned, nothing sent, and the next turn schedules a new tick
+    assert engine.flush() == 0
+    engine.turn("intens", 1)
+    assert len(scheduled) == 2
+    assert engine.stats() == {"intens": {"events": 7, "sent": 1}}
+
+def test_fast_spin_is_accelerated_and_reversal_resets():
+    engine, osc, clock, _ = make_engine(AccelerationCurve())
+    for _ in range(20):
+        clock.now += 0.002  # 500 detents/s
+        engine.turn("intens", 1)
+    engine.flush()
+    sent = osc.send_message.call_args[0][1]
+    assert 20 < sent < 20 * 5.9
+
+    clock.now += 0.002
+    engine.turn("intens", -1)
+    engine.flush()
+    assert osc.send_message.call_args[0][1] == -1.0
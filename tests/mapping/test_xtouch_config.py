@@ -0,0 +1,78 @@
+import json
+import logging
+import os
+import shutil
+import pytest
+from mapping import xtouch_config
+from mapping.xtouch_config import load_config, ConfigWatcher, XTouchConfig
+
+REPO_CONFIG = os.path.join(os.path.dirname(__file__), "..", "..", "config")
+json_loads = json.loads
+
+@pytest.fixture
+def config_dir(tmp_path):
+    for name in ("xtouch_midi_map.json", "xtouch_cmds.json"):
+        shutil.copy(os.path.join(REPO_CONFIG, name), tmp_path / name)
+    return tmp_path
+
+@pytest.fixture
+def parses(monkeypatch):
+    # Counts the JSON files parsed, i.e. the configurations not loaded from the cache
+    parsed = []
+    monkeypatch.setattr(xtouch_config.json, "loads", lambda data: parsed.append(1) or json_loads(data))
+    return parsed
+
+def rewrite(path, change):
+    content = json_loads(path.read_text())
+    change(content)
+    stat = path.stat()
+    path.write_text(json.dumps(content))
+    # The new content may be written within the same mtime tick
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+def test_cache_is_used_until_the_content_changes(config_dir, parses):
+    config = load_config(("xtouch",), str(config_dir))
+    assert config.midi_out["switch"]["Play"] == (0, bytes.fromhex("90 5E"))
+    assert (config_dir / ".xtouch_config.cache").exists()
+    assert len(parses) == 2
+
+    # Same files, or only touched: from the cache
+    load_config(("xtouch",), str(config_dir))
+    os.utime(config_dir / "xtouch_cmds.json")
+    assert load_config(("xtouch",), str(config_dir)).digest == config.digest
+    assert len(parses) == 2
+
+    rewrite(config_dir / "xtouch_cmds.json", lambda commands: commands.update({"Play": "EOS_STOP"}))
+    assert load_config(("xtouch",), str(config_dir)).commands["Play"] == "EOS_STOP"
+    assert len(parses) == 4
+    # Other devices, other tables
+    assert load_config(("xtouch", "extender"), str(config_dir)).strips == 16
+
+def test_invalid_files_are_rejected():
+    with pytest.raises(ValueError):
+        XTouchConfig(("xtouch",), {"switch": {"5E": "Play"}}, {})
+    with pytest.raises(ValueError):
+        XTouchConfig(("xtouch",), {"switch": {"90 5E": "Play", "90 5F": "Record"}, "fader": {"90 5E": "1"}}, {})
+    config = XTouchConfig(("xtouch",), {"switch": {"90 5E": "Play", "90 00": "Rec/Rdy 1"}},
+                          {"Play": "EOS_GO", "Stop": "EOS_STOP", "Rec/Rdy 12": "EOS_MACRO_12"})
+    assert config.commands == {"Play": "EOS_GO", "Stop": "EOS_STOP"}
+    assert config.warnings == [f"{os.path.join('config', 'xtouch_cmds.json')}: unknown X-Touch control 'Stop'"]
+
+def test_watcher_rebuilds_changed_files(config_dir):
+    changes = []
+    config = load_config(("xtouch",), str(config_dir))
+    watcher = ConfigWatcher(("xtouch",), changes.append, logging.getLogger("X-EOS-test"), directory=str(config_dir),
+                            digest=config.digest)
+    assert watcher.check() is None
+    os.utime(config_dir / "xtouch_cmds.json", ns=(0, 1))  # Same content
+    assert watcher.check() is None
+
+    rewrite(config_dir / "xtouch_cmds.json", lambda commands: commands.update({"Play": "EOS_STOP"}))
+    assert watcher.check() is changes[0]
+    assert changes[0].commands["Play"] == "EOS_STOP"
+
+    # An invalid file keeps the current configuration
+    (config_dir / "xtouch_midi_map.json").write_text("{\"switch\": ")
+    os.utime(config_dir / "xtouch_midi_map.json", ns=(0, 1))
+    assert watcher.check() is None
+    assert (len(changes), watcher.reloads, watcher.errors) == (1, 1, 1)
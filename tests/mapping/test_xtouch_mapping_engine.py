@@ -0,0 +1,169 @@
+import logging
+import os
+import pytest
+import mido
+from unittest.mock import MagicMock
+from mapping.xtouch_mapping_engine import XTouchMappingEngine
+from mapping.xtouch_config import XTouchConfig
+from utils.json_handler import read_json
+
+REPO_ROOT = os.path.join(os.path.dirname(__file__), "..", "..")
+
+@pytest.fixture
+def engine(monkeypatch):
+    # The mapping files are loaded relative to the repository root
+    monkeypatch.chdir(REPO_ROOT)
+    return XTouchMappingEngine(logging.getLogger("X-EOS-test"), state_manager=None)
+
+def test_map_switch(engine):
+    assert engine.map_midi2mcu(mido.Message.from_hex("90 00 7F")) == ("switch", "Rec/Rdy 1", "Pressed")
+    assert engine.map_midi2mcu(mido.Message.from_hex("90 0A 00")) == ("switch", "Solo 3", "Released")
+
+def test_map_fader_touch(engine):
+    assert engine.map_midi2mcu(mido.Message.from_hex("90 68 7F")) == ("fader_touch", "1", "Pressed")
+    assert engine.map_midi2mcu(mido.Message.from_hex("90 70 00")) == ("fader_touch", "Master", "Released")
+
+def test_map_fader_matches_hex_decoding(engine):
+    for hexvalue in ["00 00", "7F 7F", "12 34", "00 40"]:
+        type, id, value = engine.map_midi2mcu(mido.Message.from_hex(f"E2 {hexvalue}"))
+        assert (type, id) == ("fader", "3")
+        assert value == engine.f14bitsToFloat(hexvalue)
+
+def test_map_jog_wheel_raw_value(engine):
+    assert engine.map_midi2mcu(mido.Message.from_hex("B0 3C 41")) == ("Jog-wheel", "Jog wheel", 0x41)
+
+def test_map_unknown_message(engine):
+    assert engine.map_midi2mcu(mido.Message.from_hex("B0 7F 01")) is None
+
+def test_switch_runs_compiled_command(engine):
+    engine.state_manager = MagicMock()
+    engine.handle_midi_message(mido.Message.from_hex("90 46 7F"))  # Shift
+    engine.handle_midi_message(mido.Message.from_hex("90 2E 7F"))  # Fader Bank Left
+    engine.handle_midi_message(mido.Message.from_hex("90 2E 00"))
+    engine.handle_midi_message(mido.Message.from_hex("90 46 00"))
+    engine.handle_midi_message(mido.Message.from_hex("90 00 00"))  # Rec/Rdy 1
+    assert [c.args for c in engine.state_manager.key_pressed.call_args_list] == [
+        ("FADER_PAGE_1", 1), ("FADER_PAGE_1", 0), ("FADER_PAGE_1", 0)]
+
+class RecordingPort:
+    def __init__(self):
+        self.sent = []
+
+    def send_midi_bytes(self, message):
+        self.sent.append(message.hex(" ").upper())
+
+    def send_midi_batch(self, messages):
+        self.sent.append([message.hex(" ").upper() for message in messages])
+
+@pytest.fixture
+def chained(monkeypatch):
+    monkeypatch.chdir(REPO_ROOT)
+    engine = XTouchMappingEngine(logging.getLogger("X-EOS-test"), state_manager=None,
+                                 schedule=lambda delay, callback: None, devices=("xtouch", "extender"))
+    engine.midi_ports = [RecordingPort(), RecordingPort()]
+    return engine
+
+def test_extender_strips_follow_the_xtouch(chained):
+    assert chained.strips == 16
+    assert chained.map_midi2mcu(mido.Message.from_hex("E0 00 40"), device=1)[:2] == ("fader", "9")
+    assert chained.map_midi2mcu(mido.Message.from_hex("90 0A 7F"), device=1) == ("switch", "Solo 11", "Pressed")
+    assert chained.map_midi2mcu(mido.Message.from_hex("90 69 7F"), device=1) == ("fader_touch", "10", "Pressed")
+    assert chained.map_midi2mcu(mido.Message.from_hex("90 0A 7F")) == ("switch", "Solo 3", "Pressed")
+
+def test_extender_output_routing(chained):
+    for surface in chained.surfaces:
+        surface.flush()  # Initial state
+    for port in chained.midi_ports:
+        port.sent.clear()
+    chained.moveFader(10, 0.0)
+    chained.setScribbleText(0, 12, "Spot")
+    for surface in chained.surfaces:
+        surface.flush()
+    xtouch, extender = (port.sent for port in chained.midi_ports)
+    assert xtouch == []
+    assert extender[0] == "E1 00 00"
+    assert any(message.startswith("F0 00 00 66 15 12") for message in extender)
+
+def test_vpot_turns_and_ring(chained):
+    chained.state_manager = MagicMock()
+    chained.handle_midi_message(mido.Message.from_hex("B0 12 03"))
+    chained.handle_midi_message(mido.Message.from_hex("B0 10 41"), device=1)
+    assert [c.args for c in chained.state_manager.encoderTurned.call_args_list] == [(3, 3), (9, -1)]
+
+    for surface in chained.surfaces:
+        surface.flush()
+    for port in chained.midi_ports:
+        port.sent.clear()
+    chained.setVpotRing(2, 0.5, "boost")
+    chained.setVpotRing(2, 0.51, "boost")  # Same ring position
+    chained.setVpotRing(9, None)
+    for surface in chained.surfaces:
+        surface.flush()
+    assert [port.sent for port in chained.midi_ports] == [["B0 31 16"], ["B0 30 00"]]
+
+def test_meter_frames_per_device(chained):
+    chained.meters.frame()  # Initial state
+    chained.meters.set_level(2, 1.0)
+    chained.meters.set_level(12, 0.5)
+    chained.meters.set_level(17, 1.0)  # No such strip
+    assert chained.meters.frame() == 2
+    assert chained.midi_ports[0].sent[-1] == ["D0 1C"]
+    assert chained.midi_ports[1].sent[-1] == ["D0 36"]
+
+def test_reloaded_config_keeps_held_buttons(engine):
+    engine.state_manager = MagicMock()
+    engine.handle_midi_message(mido.Message.from_hex("90 5E 7F"))  # Play
+    commands = {**engine.config.commands, "Play": "EOS_GO_0"}
+    engine.apply_config(XTouchConfig(engine.devices, read_json("config/xtouch_midi_map.json"), commands))
+    engine.handle_midi_message(mido.Message.from_hex("90 5E 00"))
+    engine.handle_midi_message(mido.Message.from_hex("90 5E 7F"))
+    assert [c.args for c in engine.state_manager.key_pressed.call_args_list] == [
+        ("GO", 1), ("GO", 0), ("EOS_GO_0", 1)]
+
+def test_unknown_device_type(monkeypatch):
+    monkeypatch.chdir(REPO_ROOT)
+    with pytest.raises(ValueError):
+        XTouchMappingEngine(logging.getLogger("X-EOS-test"), state_manager=None, devices=("xtouch", "motu"))
+
+def test_touched_fader_moves_eos_fader(engine):
+    engine.state_manager = MagicMock()
+    engine.midi_ports = [RecordingPort()]
+    engine.handle_midi_message(mido.Message.from_hex("E1 00 40"))  # Not touched
+    engine.handle_midi_message(mido.Message.from_hex("90 69 7F"))
+    engine.handle_midi_message(mido.Message.from_hex("E1 00 40"))
+    engine.handle_midi_message(mido.Message.from_hex("90 69 00"))
+    value = engine.f14bitsToFloat("00 40")
+    engine.state_manager.xtouchMovesFader.assert_called_once_with(2, value)
+    assert engine.faders.value[2] == value and not engine.faders.touched[2]
+    assert engine.midi_ports[0].sent == ["E1 " + engine.floatTo14bits(value)]
+
+def test_byte_templates_match_hex_encoding(engine):
+    engine.midi_ports = [RecordingPort()]
+    engine.surface.flush()  # Initial state
+    engine.midi_ports[0].sent.clear()
+    values = [0.0, 0.25, 0.5, 1.0]
+    for value in values:
+        engine.moveFader(3, value)
+    engine.setButtonLed("Solo 2", "On")
+    engine.surface.flush()
+    switch = engine.mcu2midi["switch"]
+    assert engine.midi_ports[0].sent == [f"E2 {engine.floatTo14bits(value)}" for value in values] + [
+        f"{switch['Solo 2']} {switch['outvalues']['On']}".upper()]
+
+def test_motor_never_fights_a_touched_fader(engine, caplog):
+    engine.state_manager = MagicMock()
+    engine.midi_ports = [RecordingPort()]
+    engine.handle_midi_message(mido.Message.from_hex("90 69 7F"))
+    engine.moveFader(2, 0.5)  # EOS level while touched
+    assert engine.midi_ports[0].sent == []
+    engine.handle_midi_message(mido.Message.from_hex("90 69 00"))
+    engine.moveFader(2, 0.5)
+    # Positions reported while the motor travels are its echo, not a move
+    with caplog.at_level(logging.WARNING):
+        engine.handle_midi_message(mido.Message.from_hex("E1 00 20"))
+        engine.handle_midi_message(mido.Message.from_hex("E1 " + engine.floatTo14bits(0.5)))
+        assert not caplog.records
+        engine.handle_midi_message(mido.Message.from_hex("E1 00 20"))  # Idle again
+        assert "without being touched" in caplog.text
+    engine.state_manager.xtouchMovesFader.assert_not_called()
+    assert engine.ownership.stats()["motor_echoes"] == 2
@@ -0,0 +1,62 @@
+import pytest
+from mapping.xtouch_meters import XTouchMeters
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def make_meters(**options):
+    clock = FakeClock()
+    batches = []
+    meters = XTouchMeters(lambda messages, device: batches.append((device, [m.hex(" ").upper() for m in messages])),
+                          strips=8, rate=10, decay=1.2, clock=clock, **options)
+    meters.frame()  # Every strip off
+    batches.clear()
+    return meters, clock, batches
+
+def test_only_changed_strips_are_sent_in_one_batch():
+    meters, clock, batches = make_meters()
+    meters.set_level(1, 1.0)
+    meters.set_level(8, 0.5)
+    assert meters.frame() == 2
+    assert batches == [(0, ["D0 0C", "D0 76"])]
+
+    # Idle frames send nothing
+    meters.set_level(8, 0.5)
+    assert meters.frame() == 0
+    assert len(batches) == 1
+    assert meters.stats() == {"frames": 2, "messages": 10}  # With the initial frame
+
+def test_meters_decay_to_the_level():
+    meters, clock, batches = make_meters()
+    meters.set_level(3, 1.0)
+    meters.frame()
+    meters.set_level(3, 0.25)
+    clock.now += 0.25  # 0.3 of full scale
+    meters.frame()
+    assert meters.levels[3] == pytest.approx(0.7)
+    clock.now += 1.0
+    meters.frame()
+    assert meters.levels[3] == 0.25
+    assert [messages for _, messages in batches] == [["D0 2C"], ["D0 28"], ["D0 23"]]
+
+def test_keepalive_resends_lit_meters():
+    meters, clock, batches = make_meters(keepalive=0.5)
+    meters.set_level(1, 0.5)
+    meters.frame()
+    clock.now += 0.1
+    assert meters.frame() == 0
+    clock.now += 0.5
+    assert meters.frame() == 1
+
+def test_steady_level_stays_lit_by_default():
+    meters, clock, batches = make_meters()
+    meters.set_level(2, 0.75)
+    meters.frame()
+    for _ in range(3):
+        clock.now += 0.3
+        meters.frame()
+    assert [messages for _, messages in batches] == [["D0 19"]] * 4
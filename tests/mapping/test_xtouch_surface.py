@@ -0,0 +1,58 @@
+from mapping.xtouch_surface import XTouchSurface
+
+class Recorder:
+    def __init__(self):
+        self.messages = []
+        self.scheduled = []
+
+    def send(self, message):
+        self.messages.append(message.hex(" ").upper())
+
+    def send_sysex(self, message):
+        self.messages.append(f"sysex {message.hex(' ').upper()}")
+
+    def schedule(self, delay, callback):
+        self.scheduled.append(callback)
+
+def make_surface(**kwargs):
+    recorder = Recorder()
+    surface = XTouchSurface(recorder.send, recorder.send_sysex, schedule=recorder.schedule, **kwargs)
+    # Start from a blank surface already painted on the device
+    surface.flush()
+    recorder.messages.clear()
+    return surface, recorder
+
+def test_burst_is_grouped_in_one_flush():
+    surface, recorder = make_surface()
+    for col in range(8):
+        surface.set_scribble_text(0, col, f"S {col + 1}")
+        surface.set_scribble_color(col, 3)
+    assert len(recorder.scheduled) == 1
+    assert recorder.messages == []
+
+    recorder.scheduled[0]()
+    # One sysex for the text row and one for the colors
+    assert len(recorder.messages) == 2
+    assert recorder.messages[0].startswith("sysex 12 00 53 20 31")
+    assert recorder.messages[1] == "sysex 72 03 03 03 03 03 03 03 03"
+
+def test_only_changes_are_sent():
+    surface, recorder = make_surface(flush_delay=0)
+    surface.set_segments([0x20] * 13)
+    assert recorder.messages == []
+
+    surface.set_segments([0x31] + [0x20] * 12)
+    assert recorder.messages == ["B0 40 31"]
+
+    recorder.messages.clear()
+    surface.set_led("Rec/Rdy 1", bytes.fromhex("90 00 7F"))
+    surface.set_led("Rec/Rdy 1", bytes.fromhex("90 00 7F"))
+    surface.set_scribble_text(1, 3, "abc")
+    assert recorder.messages == ["90 00 7F", f"sysex 12 {37 + 21:02X} 61 62 63 20 20 20 20"]
+
+def test_invalidate_repaints_everything():
+    surface, recorder = make_surface(flush_delay=0)
+    surface.set_led("Mute 1", bytes.fromhex("90 10 00"))
+    recorder.messages.clear()
+    surface.invalidate()
+    assert surface.flush() == 13 + 2 + 1 + 1
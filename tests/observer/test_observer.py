@@ -0,0 +1,38 @@
+from observer import Observer, Subject, KeyPress, GoLive
+
+class RecordingObserver(Observer):
+    def __init__(self):
+        self.messages = []
+
+    def update(self, message):
+        self.messages.append(message)
+
+def test_handlers_receive_only_subscribed_events():
+    bus = Subject()
+    key_presses = []
+    bus.subscribe(KeyPress, key_presses.append)
+    bus.publish(GoLive())
+    bus.publish(KeyPress("EOS_LIVE", 1))
+    assert [(e.key, e.value) for e in key_presses] == [("EOS_LIVE", 1)]
+
+    bus.unsubscribe(KeyPress, key_presses.append)
+    bus.publish(KeyPress("EOS_LIVE", 0))
+    assert len(key_presses) == 1
+
+def test_add_observer_receives_dict_messages():
+    bus = Subject()
+    observer = RecordingObserver()
+    bus.add_observer(observer)
+    bus.publish(KeyPress("FADER_PAGE_2", 0))
+    bus.notify_observers(GoLive())
+    bus.notify_observers({"type": "custom"})
+    assert observer.messages == [{"type": "key_press", "key": "FADER_PAGE_2", "value": 0},
+                                 {"type": "goLive"}, {"type": "custom"}]
+
+    bus.remove_observer(observer)
+    bus.publish(GoLive())
+    assert len(observer.messages) == 3
+
+def test_events_are_slotted():
+    event = KeyPress("EOS_LIVE", 1)
+    assert not hasattr(event, "__dict__")
@@ -0,0 +1,55 @@
+from state.fader_ownership import FaderOwnership, IDLE, USER, MOTOR
+
+def test_echoes_of_levels_sent():
+    ownership = FaderOwnership(4)
+    ownership.touch(2)
+    assert [ownership.sent(2, value) for value in (0.25, 0.5, 0.75)] == [1, 2, 3]
+    # EOS only reports the latest level, the older ones were superseded
+    assert ownership.eos_echo(2, 0.5 + 0.001)
+    assert ownership.pending(2) == [(3, 0.75)]
+    assert not ownership.eos_echo(2, 0.25)
+    assert not ownership.eos_echo(1, 0.75)
+    assert ownership.stats() == {"eos_echoes": 1, "motor_echoes": 0, "held": 0, "superseded": 1,
+                                 "unexpected": 0, "pending": 1}
+
+def test_motor_moves_and_position_reports():
+    ownership = FaderOwnership(4)
+    assert not ownership.position_report(1, 0.1)
+    ownership.touch(1)
+    assert not ownership.motor_move(1, 0.5)
+    ownership.release(1)
+    assert ownership.motor_move(1, 0.5) and ownership.state[1] == MOTOR
+    assert ownership.position_report(1, 0.3)
+    assert ownership.position_report(1, 0.5) and ownership.state[1] == IDLE
+    ownership.motor_move(3, 1.0)
+    ownership.touch(2)
+    ownership.reset()
+    assert (ownership.state[3], ownership.state[2]) == (IDLE, USER)
+    stats = ownership.stats()
+    assert (stats["motor_echoes"], stats["held"], stats["unexpected"]) == (2, 1, 1)
+
+def test_pending_is_bounded():
+    ownership = FaderOwnership(2, max_pending=4)
+    for value in range(10):
+        ownership.sent(1, value / 10)
+    assert [seq for seq, _ in ownership.pending(1)] == [7, 8, 9, 10]
+    assert ownership.stats()["superseded"] == 6
+
+def test_level_set_on_eos_forgets_the_stale_levels():
+    ownership = FaderOwnership(4)
+    ownership.touch(1)
+    for value in (0.3, 0.5, 0.7):
+        ownership.sent(1, value)
+    ownership.release(1)
+    # Set on the console, not an echo, the levels sent before are stale
+    assert not ownership.eos_echo(1, 0.69)
+    assert ownership.pending(1) == []
+    assert not ownership.eos_echo(1, 0.3)
+    # While touched, the levels sent stay pending
+    ownership.touch(2)
+    ownership.sent(2, 0.3)
+    assert not ownership.eos_echo(2, 0.8)
+    assert ownership.eos_echo(2, 0.3)
+    ownership.sent(3, 0.5)
+    ownership.reset()
+    assert ownership.pending(3) == []
@@ -0,0 +1,17 @@
+from state.fader_page_cache import FaderPageCache
+
+def test_hits_misses_and_stale():
+    cache = FaderPageCache(10)
+    assert cache.open(2) is None
+    cache.store_level(2, 1, 0.5)
+    cache.store_name(2, 1, "S 21")
+    cache.store_name(2, 2, "S 22")
+    cached = cache.open(2)
+    assert (cached.levels[1], cached.names[1], cached.known[2]) == (0.5, "S 21", 0)
+    # EOS confirms the level, renamed fader 2
+    cache.store_level(2, 1, 0.5)
+    cache.store_name(2, 2, "S 23")
+    cache.store_name(2, 1, "S 21")
+    # Later changes are not staleness
+    cache.store_level(2, 1, 0.9)
+    assert cache.stats() == {"pages": 1, "hits": 1, "misses": 1, "stale": 1}
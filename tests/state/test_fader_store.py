@@ -0,0 +1,29 @@
+import sys
+from state.fader_store import FaderStore
+
+def test_diff_and_update():
+    store = FaderStore(5)
+    other = FaderStore(5)
+    other.value[1] = 0.5
+    other.value[3] = 0.001  # Same 8-bit level
+    assert store.diff(other.value) == [1]
+    assert store.update(other.value, page=2) == [1]
+    assert list(store.value) == [0.0, 0.5, 0.0, 0.0, 0.0]
+    assert list(store.page) == [2] * 5
+    assert store.diff(other.value) == []
+
+def test_unsent_and_snapshot():
+    store = FaderStore(3)
+    store.value[2] = 0.75
+    assert store.unsent() == [2]
+    snapshot = store.snapshot()
+    store.sent[2] = 0.75
+    store.value[2] = 1.0
+    assert store.unsent() == [2]
+    assert (snapshot.value[2], snapshot.sent[2]) == (0.75, 0.0)
+
+def test_compact():
+    store = FaderStore(33)
+    assert not hasattr(store, "__dict__")
+    # 8 + 1 + 8 + 8 + 2 bytes per fader
+    assert sum(sys.getsizeof(getattr(store, field)) for field in ("value", "touched", "motor_time", "sent", "page")) < 2000
@@ -0,0 +1,47 @@
+import logging
+import threading
+import time
+from state.reactor import Reactor
+
+def make_reactor():
+    reactor = Reactor(logging.getLogger("X-EOS-test"))
+    reactor.start()
+    return reactor
+
+def test_events_run_in_order_on_reactor_thread():
+    reactor = make_reactor()
+    calls = []
+    handler = reactor.wrap("midi", lambda poster, i: calls.append((poster, i, threading.current_thread().name)))
+    posters = [threading.Thread(target=lambda p=p: [handler(p, i) for i in range(100)]) for p in range(2)]
+    for thread in posters:
+        thread.start()
+    for thread in posters:
+        thread.join()
+    reactor.stop(timeout=1)
+    assert len(calls) == 200
+    assert {name for _, _, name in calls} == {"x-eos-reactor"}
+    # Events from one source keep their order
+    for p in range(2):
+        assert [i for poster, i, _ in calls if poster == p] == list(range(100))
+    stats = reactor.stats()
+    assert stats["sources"]["midi"]["events"] == 200
+    assert stats["depth"] == 0
+
+def test_errors_are_counted_and_loop_continues():
+    reactor = make_reactor()
+    calls = []
+    reactor.post("osc", lambda: 1 / 0)
+    reactor.post("osc", calls.append, 1)
+    reactor.stop(timeout=1)
+    assert calls == [1]
+    assert reactor.stats()["sources"]["osc"]["errors"] == 1
+
+def test_timers():
+    reactor = make_reactor()
+    calls = []
+    reactor.call_later(0.02, calls.append, "later")
+    reactor.call_every(0.01, calls.append, "tick")
+    time.sleep(0.1)
+    reactor.stop(timeout=1)
+    assert "later" in calls
+    assert 5 <= calls.count("tick") <= 11
@@ -0,0 +1,34 @@
+from utils.latency import LatencyHistogram, LatencyTracker
+
+def test_histogram_percentiles():
+    histogram = LatencyHistogram()
+    for ns in range(1, 1001):
+        histogram.record(ns * 1000)
+    assert histogram.count == 1000
+    assert histogram.max == 1_000_000
+    # Bucket upper bounds are within 25% of the exact value
+    assert 500_000 <= histogram.percentile(50) <= 625_000
+    assert 990_000 <= histogram.percentile(99) <= 1_000_000
+    assert histogram.percentile(100) == 1_000_000
+
+def test_empty_histogram():
+    assert LatencyHistogram().summary() == {"count": 0, "p50_us": 0.0, "p99_us": 0.0, "max_us": 0.0, "avg_us": 0.0}
+
+def test_tracker_records_stages_of_traced_events():
+    tracker = LatencyTracker()
+    def handler():
+        tracker.mark("decode")
+        tracker.mark("send")
+    traced = tracker.traced("midi2osc", handler)
+    traced()
+    traced()
+    # Outside of a traced event, marks are ignored
+    tracker.mark("decode")
+    summary = tracker.summary()
+    assert list(summary["midi2osc"]) == ["queue", "decode", "send", "total"]
+    assert summary["midi2osc"]["decode"]["count"] == 2
+
+def test_disabled_tracker():
+    tracker = LatencyTracker(enabled=False)
+    tracker.traced("osc2midi", lambda: tracker.mark("decode"))()
+    assert tracker.summary() == {}
@@ -0,0 +1,48 @@
+import logging
+from utils.log_pipeline import LogPipeline, RingBufferHandler
+
+def make_pipeline(name, **kwargs):
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    handler = RingBufferHandler(capacity=100)
+    handler.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+    pipeline = LogPipeline(logger, [handler], **kwargs)
+    return logger, handler, pipeline
+
+def test_records_reach_the_handlers_through_the_listener():
+    logger, handler, pipeline = make_pipeline("X-EOS-test-pipeline", repeat_interval=0)
+    pipeline.start()
+    logger.info("Fader %s moved", 3)
+    logger.warning("X-Touch initialized")
+    pipeline.stop()
+    assert handler.drain() == ["INFO Fader 3 moved", "WARNING X-Touch initialized"]
+    assert handler.drain() == []
+
+def test_repeated_messages_are_aggregated():
+    logger, handler, pipeline = make_pipeline("X-EOS-test-repeats", repeat_interval=60)
+    pipeline.start()
+    for _ in range(5):
+        logger.warning("Fader %s moved without being touched. Ignoring.", 2)
+    logger.info("received cmd")
+    pipeline.stop()
+    assert handler.drain() == ["WARNING Fader 2 moved without being touched. Ignoring.",
+                               "INFO received cmd",
+                               "WARNING Fader 2 moved without being touched. Ignoring. (repeated 4 times)"]
+    assert pipeline.stats()["suppressed"] == 4
+
+def test_full_queue_drops_records_without_blocking():
+    logger, handler, pipeline = make_pipeline("X-EOS-test-full", queue_size=2, repeat_interval=0)
+    # Not started: nothing drains the queue
+    logger.addHandler(pipeline._queue_handler)
+    for i in range(5):
+        logger.info("message %d", i)
+    logger.removeHandler(pipeline._queue_handler)
+    assert pipeline.stats()["dropped"] == 3
+
+def test_ring_buffer_keeps_the_last_lines():
+    handler = RingBufferHandler(capacity=3)
+    for i in range(5):
+        handler.handle(logging.makeLogRecord({"msg": f"line {i}"}))
+    assert handler.drain() == ["line 2", "line 3", "line 4"]
+    assert handler.dropped == 2
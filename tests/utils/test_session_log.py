@@ -0,0 +1,94 @@
+import logging
+import socket
+import pytest
+from pythonosc.osc_message import OscMessage
+from communication.osc_comm import OSCClient
+from utils.session_log import SessionLog, SessionRecorder, SessionReplayer, MIDI_IN, MIDI_OUT, OSC_IN, OSC_OUT
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000_000
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += int(seconds * 1e9)
+
+def record_session(path, clock):
+    recorder = SessionRecorder(str(path), clock=clock)
+    recorder.record(MIDI_IN, bytes([0x90, 0x5E, 0x7F]))
+    clock.now += 10_000_000
+    recorder.record(OSC_OUT, b"/eos/key/go_0\0\0\0,\0\0\0")
+    clock.now += 20_000_000
+    recorder.record(MIDI_IN, bytes([0x90, 0x5E, 0x00]), port=1)
+    recorder.close()
+
+def test_records_are_read_back_in_order(tmp_path):
+    path = tmp_path / "session.xlog"
+    record_session(path, FakeClock())
+    with SessionLog(str(path)) as log:
+        records = list(log)
+        assert [(kind, port, data) for _, kind, port, data in records] == [
+            (MIDI_IN, 0, b"\x90\x5e\x7f"), (OSC_OUT, 0, b"/eos/key/go_0\0\0\0,\0\0\0"), (MIDI_IN, 1, b"\x90\x5e\x00")]
+        assert records[2][0] - records[0][0] == 30_000_000
+        assert [data for _, _, _, data in log.records(kinds=(OSC_OUT,))] == [b"/eos/key/go_0\0\0\0,\0\0\0"]
+        assert log.stats() == {"records": {"midi_in": 2, "midi_out": 0, "osc_in": 0, "osc_out": 1}, "duration_s": 0.03}
+
+def test_appending_and_truncated_tail(tmp_path):
+    path = tmp_path / "session.xlog"
+    record_session(path, FakeClock())
+    recorder = SessionRecorder(str(path))
+    recorder.record(MIDI_OUT, bytes([0xB0, 0x30, 0x01]))
+    recorder.close()
+    with open(path, "ab") as f:
+        f.write(b"\x00" * 7)  # A record cut by a crash
+    with SessionLog(str(path)) as log:
+        assert [kind for _, kind, _, _ in log] == [MIDI_IN, OSC_OUT, MIDI_IN, MIDI_OUT]
+
+def test_not_a_session_log(tmp_path):
+    path = tmp_path / "settings.json"
+    path.write_text("{\"OSC\": {\"host\": \"localhost\", \"port\": 8000}}")
+    with pytest.raises(ValueError):
+        SessionLog(str(path))
+    with pytest.raises(ValueError):
+        SessionRecorder(str(path))
+
+def test_replay_in_real_time(tmp_path):
+    path = tmp_path / "session.xlog"
+    record_session(path, FakeClock())
+    clock = FakeClock()
+    received = []
+    with SessionLog(str(path)) as log:
+        counts = SessionReplayer(log, {MIDI_IN: lambda data, port: received.append((data, port))},
+                                 speed=2.0, clock=clock, sleep=clock.sleep).replay()
+    assert counts == {"midi_in": 2}
+    assert received == [(b"\x90\x5e\x7f", 0), (b"\x90\x5e\x00", 1)]
+    assert clock.sleeps == [pytest.approx(0.015)]
+
+def test_replay_as_fast_as_possible(tmp_path):
+    path = tmp_path / "session.xlog"
+    record_session(path, FakeClock())
+    clock = FakeClock()
+    received = []
+    with SessionLog(str(path)) as log:
+        SessionReplayer(log, {MIDI_IN: lambda data, port: received.append(data),
+                              OSC_OUT: lambda data, port: received.append(data)}, speed=None,
+                        clock=clock, sleep=clock.sleep).replay()
+    assert len(received) == 3
+    assert clock.sleeps == []
+
+def test_osc_client_records_sent_datagrams(tmp_path):
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(("127.0.0.1", 0))
+    recorder = SessionRecorder(str(tmp_path / "session.xlog"))
+    client = OSCClient(logging.getLogger("X-EOS-test"), port=receiver.getsockname()[1], recorder=recorder)
+    client.send_message("/eos/user/1/key/live", 1)
+    recorder.close()
+    receiver.close()
+    with SessionLog(str(tmp_path / "session.xlog")) as log:
+        (_, kind, _, data), = list(log)
+    assert kind == OSC_OUT
+    assert OscMessage(data).address == "/eos/user/1/key/live"